@@ -11,7 +11,7 @@ from . import (
     cards, card_functions,
     care_quality,
     config_versions, mappings,
-    export_api, websocket
+    export_api, websocket, realtime
 )
 
 __all__ = [
@@ -23,5 +23,5 @@ __all__ = [
     "cards", "card_functions",
     "care_quality",
     "config_versions", "mappings",
-    "export_api", "websocket"
+    "export_api", "websocket", "realtime"
 ]
@@ -19,6 +19,7 @@ from fastapi import APIRouter, HTTPException, Query, Depends
 
 from app.models.alert import CloudAlertPolicy, CloudAlertPolicyCreate, CloudAlertPolicyUpdate
 from app.services.storage import StorageService
+from app.services.policy_cache import get_policy_cache
 from app.dependencies.auth import get_current_user_from_token, require_role
 from app.middleware.permissions import check_tenant_access
 
@@ -187,6 +188,7 @@ async def create_alert_policy(
         }
     
     policy_storage.create(policy_dict)
+    get_policy_cache().refresh(policy_data.tenant_id)
     return policy_dict
 
 
@@ -215,11 +217,12 @@ async def update_alert_policy(
         raise HTTPException(status_code=404, detail="Alert policy not found for this tenant")
     
     # 更新字段
-    update_data = policy_data.model_dump(exclude_unset=True)
+    update_data = policy_update.model_dump(exclude_unset=True)
     update_data["updated_at"] = datetime.now().isoformat()
     
     # 保存更新
     updated = policy_storage.update("tenant_id", tenant_id, update_data)
+    get_policy_cache().refresh(tenant_id)
     return updated
 
 
@@ -243,6 +246,7 @@ async def delete_alert_policy(
     
     # 删除策略
     policy_storage.delete("tenant_id", tenant_id)
+    get_policy_cache().refresh(tenant_id)
     return None
 
 
@@ -366,4 +370,5 @@ async def initialize_tenant_alert_policy(
     }
     
     policy_storage.create(default_policy)
+    get_policy_cache().refresh(tenant_id)
     return default_policy
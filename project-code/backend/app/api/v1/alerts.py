@@ -18,13 +18,17 @@ from uuid import UUID
 from datetime import datetime, timedelta
 from loguru import logger
 
-from app.services.storage import StorageService
+from app.services.alert_store import get_alert_store
+from app.services.alert_suppression import get_alert_suppressor
+from app.services.alert_coalescer import get_alert_coalescer
+from app.services.alert_correlator import get_alert_correlator
+from app.services.alert_scheduler import get_alert_scheduler
 from app.models.alert import Alert, AlertCreate, AlertUpdate
 from app.dependencies.auth import get_current_user_from_token
 from app.middleware.permissions import check_tenant_access
 
 router = APIRouter()
-alert_storage = StorageService("alerts")
+alert_store = get_alert_store()
 
 
 @router.get("/", summary="获取告警列表", response_model=List[Alert])
@@ -56,39 +60,20 @@ async def list_alerts(
         check_tenant_access(current_user, tenant_id)
         
         if end_time is None:
-            end_time = datetime.now()
+            end_time = datetime.utcnow()
         if start_time is None:
             start_time = end_time - timedelta(hours=24)
         
-        def filter_func(a):
-            if str(a.get("tenant_id")) != str(tenant_id):
-                return False
-            if alert_level and a.get("alert_level") != alert_level:
-                return False
-            if alert_type and a.get("alert_type") != alert_type:
-                return False
-            if status and a.get("status") != status:
-                return False
-            
-            # 时间筛选
-            alert_time = a.get("timestamp")
-            if alert_time:
-                if isinstance(alert_time, str):
-                    alert_time = datetime.fromisoformat(alert_time.replace('Z', '+00:00'))
-                if alert_time < start_time or alert_time > end_time:
-                    return False
-            
-            return True
-        
-        alerts = alert_storage.find_all(filter_func)
-        
-        # 按时间倒序排序
-        alerts.sort(
-            key=lambda x: x.get("timestamp", "1970-01-01"),
-            reverse=True
+        # 按索引查询，结果已按时间倒序
+        return alert_store.query(
+            tenant_id,
+            status=status,
+            alert_level=alert_level,
+            alert_type=alert_type,
+            start=start_time,
+            end=end_time,
+            limit=limit
         )
-        
-        return alerts[:limit]
     except Exception as e:
         logger.error(f"Error listing alerts: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -101,7 +86,7 @@ async def get_alert(
 ) -> Alert:
     """获取单个告警详情（需要认证）"""
     try:
-        alert = alert_storage.get(alert_id)
+        alert = alert_store.get(alert_id)
         if not alert:
             raise HTTPException(status_code=404, detail="Alert not found")
         
@@ -130,7 +115,7 @@ async def acknowledge_alert(
     - 可添加备注
     """
     try:
-        alert = alert_storage.get(alert_id)
+        alert = alert_store.get(alert_id)
         if not alert:
             raise HTTPException(status_code=404, detail="Alert not found")
         
@@ -140,11 +125,13 @@ async def acknowledge_alert(
         update_data = {
             "status": "acknowledged",
             "acknowledged_by": str(user_id),
-            "acknowledged_at": datetime.now().isoformat(),
+            "acknowledged_at": datetime.utcnow().isoformat(),
             "note": note
         }
         
-        result = alert_storage.update(alert_id, update_data)
+        result = alert_store.update(alert_id, update_data)
+        # 取消升级/重复通知计时器
+        get_alert_scheduler().cancel(alert_id)
         logger.info(f"Alert acknowledged: {alert_id} by {current_user.get('username')}")
         return result
     except HTTPException:
@@ -169,7 +156,7 @@ async def resolve_alert(
     - 可添加解决说明
     """
     try:
-        alert = alert_storage.get(alert_id)
+        alert = alert_store.get(alert_id)
         if not alert:
             raise HTTPException(status_code=404, detail="Alert not found")
         
@@ -179,11 +166,13 @@ async def resolve_alert(
         update_data = {
             "status": "resolved",
             "resolved_by": str(user_id),
-            "resolved_at": datetime.now().isoformat(),
+            "resolved_at": datetime.utcnow().isoformat(),
             "resolution": resolution
         }
         
-        result = alert_storage.update(alert_id, update_data)
+        result = alert_store.update(alert_id, update_data)
+        # 取消升级/重复通知计时器
+        get_alert_scheduler().cancel(alert_id)
         logger.info(f"Alert resolved: {alert_id} by {current_user.get('username')}")
         return result
     except HTTPException:
@@ -207,43 +196,104 @@ async def get_alert_statistics(
     - 各级别告警数量
     - 各类型告警数量
     - 各状态告警数量
-    - 平均响应时间
+    - 平均响应时间（时间范围内确认的告警，告警发生到确认的平均耗时）
     """
     try:
         check_tenant_access(current_user, tenant_id)
         
-        end_time = datetime.now()
+        end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
         
-        alerts = alert_storage.find_all(
-            lambda a: (
-                str(a.get("tenant_id")) == str(tenant_id) and
-                datetime.fromisoformat(a.get("timestamp", "1970-01-01").replace('Z', '+00:00')) >= start_time
-            )
-        )
-        
-        # 统计
+        # 统计（只读索引）
+        counts = alert_store.count(tenant_id, start=start_time, end=end_time)
         stats = {
-            "total_count": len(alerts),
+            "total_count": counts["total_count"],
             "time_range_hours": hours,
-            "by_level": {},
-            "by_type": {},
-            "by_status": {},
-            "avg_response_time_seconds": 0
+            "by_level": counts["by_level"],
+            "by_type": counts["by_type"],
+            "by_status": counts["by_status"],
+            "avg_response_time_seconds": alert_store.latency(tenant_id, "ack", hours=hours)["mean_sec"]
         }
         
-        # 按级别统计
-        for alert in alerts:
-            level = alert.get("alert_level", "UNKNOWN")
-            stats["by_level"][level] = stats["by_level"].get(level, 0) + 1
-            
-            alert_type = alert.get("alert_type", "UNKNOWN")
-            stats["by_type"][alert_type] = stats["by_type"].get(alert_type, 0) + 1
-            
-            status = alert.get("status", "UNKNOWN")
-            stats["by_status"][status] = stats["by_status"].get(status, 0) + 1
-        
         return stats
     except Exception as e:
         logger.error(f"Error getting alert statistics: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/statistics/latency", summary="告警确认/解决耗时分布")
+async def get_latency_statistics(
+    tenant_id: UUID = Query(..., description="租户ID"),
+    kind: str = Query("ack", pattern="^(ack|resolve)$", description="ack=确认耗时，resolve=解决耗时"),
+    team: Optional[str] = Query(None, description="护士组标签"),
+    caregiver_id: Optional[UUID] = Query(None, description="操作人用户ID"),
+    hours: Optional[int] = Query(None, ge=1, le=168, description="统计时间范围（小时，为空时统计全部）"),
+    current_user: Dict[str, Any] = Depends(get_current_user_from_token)
+):
+    """
+    获取告警确认/解决耗时分布（需要认证）
+    
+    ## 统计项
+    - count: 样本数
+    - mean_sec: 平均耗时（秒）
+    - p50_sec / p90_sec / p99_sec: 分位数（秒，相对误差约±9%）
+    - max_sec: 最大耗时（秒）
+    """
+    check_tenant_access(current_user, tenant_id)
+    return {
+        "tenant_id": str(tenant_id),
+        "kind": kind,
+        "team": team,
+        "caregiver_id": str(caregiver_id) if caregiver_id else None,
+        "time_range_hours": hours,
+        **alert_store.latency(tenant_id, kind, team=team, caregiver=caregiver_id, hours=hours)
+    }
+
+
+@router.get("/statistics/suppression", summary="告警抑制统计")
+async def get_suppression_statistics(
+    current_user: Dict[str, Any] = Depends(get_current_user_from_token)
+):
+    """
+    获取告警抑制统计（需要认证）
+    
+    ## 统计项
+    - delivered: 放行的告警数
+    - suppressed_duplicate: 重复抑制期内被抑制的告警数
+    - suppressed_rate_limited: 超过每小时上限被抑制的告警数
+    - tracked_keys: 当前跟踪的抑制键数量
+    """
+    return get_alert_suppressor().get_stats()
+
+
+@router.get("/statistics/coalescing", summary="告警风暴合并统计")
+async def get_coalescing_statistics(
+    current_user: Dict[str, Any] = Depends(get_current_user_from_token)
+):
+    """
+    获取告警风暴合并统计（需要认证）
+    
+    ## 统计项
+    - immediate: 立即发送的告警数（打开新合并窗口）
+    - coalesced: 记入合并窗口的告警接收者数
+    - digests: 已发送的摘要通知数
+    - bypassed: 不参与合并的告警数（L1或合并关闭）
+    - open_windows: 当前打开的合并窗口数
+    """
+    return get_alert_coalescer().get_stats()
+
+
+@router.get("/statistics/correlation", summary="跨设备告警关联统计")
+async def get_correlation_statistics(
+    current_user: Dict[str, Any] = Depends(get_current_user_from_token)
+):
+    """
+    获取跨设备告警关联统计（需要认证）
+    
+    ## 统计项
+    - incidents: 新建的事件数
+    - merged: 合并到已打开事件的告警数
+    - expired: 窗口到期关闭的事件数
+    - open_incidents: 当前窗口仍打开的事件数
+    """
+    return get_alert_correlator().get_stats()
@@ -9,9 +9,13 @@ from loguru import logger
 
 from app.models.location import Bed, BedCreate, BedUpdate
 from app.services.storage import StorageService
+from app.services.binding_index import get_binding_index
+from app.services.alert_routing import get_alert_routing_index
+from app.services.realtime_bus import get_realtime_bus
 
 router = APIRouter()
 bed_storage = StorageService[Bed]("beds")
+resident_storage = StorageService("residents")
 
 
 @router.get("/", response_model=List[Bed], summary="获取床位列表")
@@ -54,6 +58,9 @@ async def create_bed(bed_data: BedCreate):
     try:
         bed_dict = bed_data.model_dump()
         bed = bed_storage.create(bed_dict)
+        get_binding_index().invalidate()
+        get_alert_routing_index().invalidate(bed.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(bed.get("tenant_id"))
         return bed
     except Exception as e:
         logger.error(f"Error creating bed: {e}")
@@ -70,6 +77,19 @@ async def update_bed(bed_id: UUID, bed_data: BedUpdate):
         
         update_dict = bed_data.model_dump(exclude_unset=True)
         updated = bed_storage.update(bed_id, update_dict)
+        # 床位换住户时结束原住户在该床位的入住区间
+        previous_resident_id = existing.get("resident_id")
+        if (previous_resident_id and "resident_id" in update_dict
+                and str(update_dict["resident_id"]) != str(previous_resident_id)):
+            previous_resident = resident_storage.find_by_id("resident_id", previous_resident_id) or {
+                "resident_id": previous_resident_id, "tenant_id": existing.get("tenant_id")
+            }
+            get_binding_index().record_placement_end(
+                previous_resident, bed_id=bed_id, location_id=existing.get("location_id")
+            )
+        get_binding_index().invalidate()
+        get_alert_routing_index().invalidate(existing.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(existing.get("tenant_id"))
         return updated
     except HTTPException:
         raise
@@ -87,6 +107,9 @@ async def delete_bed(bed_id: UUID):
             raise HTTPException(status_code=404, detail="Bed not found")
         
         bed_storage.delete(bed_id)
+        get_binding_index().invalidate()
+        get_alert_routing_index().invalidate(existing.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(existing.get("tenant_id"))
         return None
     except HTTPException:
         raise
@@ -9,6 +9,8 @@ from fastapi import APIRouter, HTTPException, Query
 
 from app.services.card_service import CardService
 from app.services.storage import StorageService
+from app.services.alert_routing import get_alert_routing_index
+from app.services.realtime_bus import get_realtime_bus
 
 router = APIRouter()
 
@@ -66,6 +68,8 @@ async def regenerate_cards_for_location(
             card_devices_storage,
             card_residents_storage
         )
+        get_alert_routing_index().invalidate(tenant_id)
+        get_realtime_bus().refresh_sessions(tenant_id)
         
         return {
             "success": True,
@@ -123,6 +127,8 @@ async def regenerate_all_cards(
                         "error": str(e)
                     })
         
+        get_alert_routing_index().invalidate(tenant_id)
+        get_realtime_bus().refresh_sessions(tenant_id)
         total_cards = sum(len(r.get("cards_created", [])) for r in results if "error" not in r)
         
         return {
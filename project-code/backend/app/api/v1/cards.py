@@ -10,6 +10,8 @@ from loguru import logger
 
 from app.models.card import Card, CardCreate, CardType
 from app.services.card_manager import get_card_manager
+from app.services.alert_routing import get_alert_routing_index
+from app.services.realtime_bus import push_card_update, get_realtime_bus
 from app.services.storage import StorageService
 from app.services.permission_service import get_permission_service
 from app.dependencies.auth import get_current_user_from_token
@@ -219,6 +221,9 @@ async def create_card(card: CardCreate):
         if not result:
             raise HTTPException(status_code=500, detail="Failed to create card")
         
+        get_alert_routing_index().invalidate(card.tenant_id)
+        get_realtime_bus().refresh_sessions(card.tenant_id)
+        push_card_update(result, "created")
         return result
     except HTTPException:
         raise
@@ -255,6 +260,9 @@ async def batch_create_cards(
             create_for_beds=create_for_beds,
             create_for_locations=create_for_locations
         )
+        get_alert_routing_index().invalidate(tenant_id)
+        get_realtime_bus().refresh_sessions(tenant_id)
+        push_card_update({"tenant_id": tenant_id, **result}, "batch_created")
         return result
     except Exception as e:
         logger.error(f"Error batch creating cards: {e}")
@@ -288,6 +296,9 @@ async def update_card_status(
         if not success:
             raise HTTPException(status_code=404, detail="Card not found or update failed")
         
+        get_alert_routing_index().invalidate(tenant_id)
+        get_realtime_bus().refresh_sessions(tenant_id)
+        push_card_update({"tenant_id": tenant_id, "card_id": card_id, "is_active": is_active})
         return {"status": "success", "card_id": str(card_id), "is_active": is_active}
     except HTTPException:
         raise
@@ -323,6 +334,9 @@ async def delete_card(
         # 删除卡片
         card = cards[0]
         card_storage.delete(UUID(card["id"]))
+        get_alert_routing_index().invalidate(tenant_id)
+        get_realtime_bus().refresh_sessions(tenant_id)
+        push_card_update(card, "deleted")
         
         logger.info(f"Deleted card: {card_id}")
         return {"status": "success", "card_id": str(card_id)}
@@ -10,11 +10,21 @@ from fastapi import APIRouter, HTTPException, Query
 
 from app.models.config import ConfigVersion, ConfigVersionCreate, ConfigVersionUpdate
 from app.services.storage import StorageService
+from app.services.zone_index import get_zone_service
+from app.services.binding_index import get_binding_index
 
 router = APIRouter()
 config_storage = StorageService[ConfigVersion]("config_versions")
 
 
+def _invalidate_config_caches(version: dict) -> None:
+    """配置变更后使相关索引失效（房间布局 → 区域索引，设备安装/住户床位 → 绑定索引）"""
+    if version.get("config_type") == "room_layout":
+        get_zone_service().invalidate(version.get("entity_id"))
+    elif version.get("config_type") in ("device_installation", "resident_placement"):
+        get_binding_index().invalidate()
+
+
 @router.get("", response_model=List[ConfigVersion])
 async def list_config_versions(
     tenant_id: UUID = Query(..., description="租户ID"),
@@ -125,6 +135,7 @@ async def create_config_version(version_data: ConfigVersionCreate):
     - cloud_alert_policy: 云端告警策略
     - iot_monitor_alert: IoT设备报警配置
     - device_installation: 设备安装/绑定
+    - resident_placement: 住户入住床位/位置
     """
     from app.models.base import generate_uuid
     version_dict = version_data.model_dump()
@@ -157,6 +168,7 @@ async def create_config_version(version_data: ConfigVersionCreate):
         )
     
     config_storage.create(version_dict)
+    _invalidate_config_caches(version_dict)
     return version_dict
 
 
@@ -177,6 +189,7 @@ async def update_config_version(version_id: UUID, version_data: ConfigVersionUpd
     update_data["updated_at"] = datetime.now().isoformat()
     
     updated = config_storage.update("version_id", version_id, update_data)
+    _invalidate_config_caches(existing_version)
     return updated
 
 
@@ -192,6 +205,7 @@ async def delete_config_version(version_id: UUID):
         raise HTTPException(status_code=404, detail="Config version not found")
     
     config_storage.delete("version_id", version_id)
+    _invalidate_config_caches(version)
     return None
 
 
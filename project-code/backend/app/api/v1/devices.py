@@ -10,6 +10,9 @@ from loguru import logger
 
 from app.models.device import Device, DeviceCreate, DeviceUpdate
 from app.services.storage import StorageService
+from app.services.zone_index import get_zone_service
+from app.services.binding_index import get_binding_index
+from app.services.realtime_bus import push_device_status, get_realtime_bus
 from app.dependencies.auth import get_current_user_from_token, require_role
 from app.middleware.permissions import check_tenant_access, check_manage_permission
 
@@ -103,6 +106,8 @@ async def create_device(
         device_dict = device.model_dump()
         device_dict["device_id"] = str(uuid.uuid4())
         result = device_storage.create(device_dict)
+        get_binding_index().invalidate()
+        get_realtime_bus().refresh_sessions(device.tenant_id)
         logger.info(f"User {current_user.get('username')} created device: {result.get('device_id')}")
         return result
     except Exception as e:
@@ -139,6 +144,11 @@ async def update_device(
             device_id,
             device.model_dump(exclude_unset=True)
         )
+        # 房间/床位绑定可能变化，重新编译区域索引和绑定索引
+        get_zone_service().invalidate(device_id)
+        get_binding_index().invalidate()
+        get_realtime_bus().refresh_sessions(existing_device.get("tenant_id"))
+        push_device_status({**existing_device, **device.model_dump(exclude_unset=True)})
         logger.info(f"User {current_user.get('username')} updated device: {device_id}")
         return result
     except HTTPException:
@@ -169,6 +179,9 @@ async def delete_device(
         check_tenant_access(current_user, existing_device.get("tenant_id"))
         
         success = device_storage.delete("device_id", device_id)
+        get_zone_service().invalidate(device_id)
+        get_binding_index().invalidate()
+        get_realtime_bus().refresh_sessions(existing_device.get("tenant_id"))
         logger.info(f"User {current_user.get('username')} deleted device: {device_id}")
         return {"status": "success", "device_id": str(device_id)}
     except HTTPException:
@@ -212,6 +225,7 @@ async def update_device_status(
             )
         
         result = device_storage.update(device_id, {"status": status})
+        push_device_status({**device, "status": status})
         logger.info(f"Updated device status: {device_id} -> {status}")
         return result
     except HTTPException:
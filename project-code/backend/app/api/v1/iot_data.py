@@ -13,14 +13,22 @@ from app.models.tdp import TDPEvent
 from app.models.iot_data import IOTTimeseries, IOTTimeseriesCreate
 from app.services.tdp_processor import TDPProcessor
 from app.services.storage import StorageService
-from app.services.alert_engine import AlertEngine
+from app.services.alert_engine import get_alert_engine
+from app.services.ingest_dedup import get_ingest_deduplicator
+from app.services.timeseries_store import get_timeseries_store
+from app.services.binding_index import get_binding_index
+from app.services.fall_capture import get_fall_capture_service
+from app.services.realtime_bus import push_iot_data
 
 router = APIRouter()
 
 # 初始化服务
 tdp_processor = TDPProcessor()
-iot_storage = StorageService[IOTTimeseries]("iot_timeseries")
-alert_engine = AlertEngine()
+iot_storage = get_timeseries_store()
+device_storage = StorageService("devices")
+alert_engine = get_alert_engine()
+deduplicator = get_ingest_deduplicator()
+binding_index = get_binding_index()
 
 
 @router.post("/tdp/upload", response_model=dict, summary="接收TDP协议数据")
@@ -32,9 +40,10 @@ async def upload_tdp_data(
     接收IoT设备上报的TDP协议数据
     
     ## 功能
+    - 重复帧/重传抑制（按 device_id + timestamp + tracking_id 去重）
     - 解析TDP事件数据
     - 提取Person/Object Matrix
-    - 生成IoT时序数据
+    - 生成IoT时序数据（区域进入/离开事件单独成记录，目标消失时生成离开事件）
     - 触发告警检测
     - 异步持久化存储
     
@@ -45,17 +54,37 @@ async def upload_tdp_data(
     - 处理状态和生成的数据记录数量
     """
     try:
-        logger.info(f"Received TDP event from device: {event.device_id}")
-        
-        # 处理TDP事件，生成IoT时序数据
-        iot_records = await tdp_processor.process_tdp_event(event)
+        tenant_id, device_id = _resolve_event_ids(event)
+        logger.info(f"Received TDP event from device: {device_id}")
+        
+        # 丢弃重传的目标帧（重复帧不再生成时序数据和告警）
+        duplicates = 0
+        track_ids = None
+        if event.person_matrices:
+            track_ids = [person.tracking_id for person in event.person_matrices]
+            header_ts = event.header.timestamp
+            frame_time = header_ts.seconds + header_ts.nanos / 1e9
+            fresh = [
+                person for person in event.person_matrices
+                if not deduplicator.is_duplicate(device_id, frame_time, person.tracking_id)
+            ]
+            duplicates = len(event.person_matrices) - len(fresh)
+            event.person_matrices = fresh
+        
+        result = tdp_processor.process_event(event, tenant_id, device_id, track_ids)
+        
+        # 处理成功后才登记幂等键：处理失败（500）时客户端的重试不会被当作重复
+        for person in event.person_matrices or []:
+            deduplicator.add(device_id, frame_time, person.tracking_id)
+        iot_records = result["iot_records"]
         
         if not iot_records:
-            logger.warning(f"No IoT records generated from device: {event.device_id}")
+            logger.warning(f"No IoT records generated from device: {device_id}")
             return {
                 "status": "success",
                 "message": "No data to process",
-                "records_created": 0
+                "records_created": 0,
+                "duplicates_dropped": duplicates
             }
         
         # 异步保存数据（不阻塞响应）
@@ -64,30 +93,35 @@ async def upload_tdp_data(
             iot_records
         )
         
-        # 检查是否有告警
-        alert_count = 0
+        # 实时推送（只入队，不等待WebSocket发送）
         for record in iot_records:
-            if record.alert_triggered:
-                alert_count += 1
-                # 异步处理告警
-                background_tasks.add_task(
-                    _process_alert,
-                    record
-                )
+            push_iot_data(record)
+        
+        # 异步处理告警
+        for alert in result["alerts"]:
+            background_tasks.add_task(
+                _process_alert,
+                {**alert, "device_id": device_id},
+                tenant_id
+            )
         
         logger.success(
-            f"Processed TDP event: {len(iot_records)} records, {alert_count} alerts"
+            f"Processed TDP event: {len(iot_records)} records, {len(result['alerts'])} alerts"
         )
         
         return {
             "status": "success",
             "message": "TDP data processed successfully",
             "records_created": len(iot_records),
-            "alerts_triggered": alert_count,
-            "device_id": str(event.device_id),
-            "timestamp": event.timestamp.iso_timestamp if event.timestamp else None
+            "alerts_triggered": len(result["alerts"]),
+            "zone_events": len(result["zone_events"]),
+            "duplicates_dropped": duplicates,
+            "device_id": device_id,
+            "timestamp": iot_records[0]["timestamp"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing TDP data: {e}")
         raise HTTPException(
@@ -107,7 +141,8 @@ async def upload_batch_data(
     ## 功能
     - 批量接收IoT数据
     - 数据验证
-    - 异步批量写入
+    - 与已接收数据去重
+    - 异步批量写入（允许乱序，迟到数据写入分区增量段后在后台有序合并）
     
     ## 参数
     - **records**: IoT时序数据列表
@@ -127,22 +162,26 @@ async def upload_batch_data(
         
         logger.info(f"Received batch upload: {len(records)} records")
         
-        # 转换为完整模型
-        iot_records = [
-            IOTTimeseries(**record.model_dump())
-            for record in records
-        ]
+        # 离线补传可能与已接收的实时数据重叠，先去重
+        iot_records = deduplicator.filter_records(
+            [record.model_dump() for record in records]
+        )
+        # 按数据时间的设备绑定关系填充床位/住户
+        for record in iot_records:
+            binding_index.stamp(record)
         
         # 异步保存
-        background_tasks.add_task(
-            _save_iot_records_batch,
-            iot_records
-        )
+        if iot_records:
+            background_tasks.add_task(
+                _save_iot_records_batch,
+                iot_records
+            )
         
         return {
             "status": "success",
             "message": "Batch data queued for processing",
-            "records_received": len(records)
+            "records_received": len(records),
+            "duplicates_dropped": len(records) - len(iot_records)
         }
         
     except HTTPException:
@@ -197,48 +236,21 @@ async def query_iot_data(
             f"resident={resident_id}, time_range={start_time} to {end_time}"
         )
         
-        # 构建查询条件
-        def filter_func(record: dict) -> bool:
-            # 租户ID必须匹配
-            if str(record.get("tenant_id")) != str(tenant_id):
-                return False
-            
-            # 设备ID筛选
-            if device_id and str(record.get("device_id")) != str(device_id):
-                return False
-            
-            # 住户ID筛选
-            if resident_id and str(record.get("resident_id")) != str(resident_id):
-                return False
-            
-            # 位置ID筛选
-            if location_id and str(record.get("location_id")) != str(location_id):
-                return False
-            
-            # 时间范围筛选
-            timestamp_str = record.get("timestamp")
-            if timestamp_str:
-                try:
-                    record_time = datetime.fromisoformat(timestamp_str)
-                    if not (start_time <= record_time <= end_time):
-                        return False
-                except (ValueError, TypeError):
-                    return False
-            
-            return True
-        
-        # 查询数据
-        records = iot_storage.find_all(filter_func)
-        
-        # 按时间倒序排序
-        records.sort(
-            key=lambda x: datetime.fromisoformat(x.get("timestamp", "1970-01-01")),
-            reverse=True
+        # 查询数据（存储按时间有序，倒序遍历取满limit即停止；
+        # 设备/住户/位置条件走分区倒排索引）
+        records = iot_storage.query(
+            start=start_time,
+            end=end_time,
+            filter_func=lambda r: str(r.get("tenant_id")) == str(tenant_id),
+            reverse=True,
+            limit=limit,
+            match={
+                "device_id": device_id,
+                "resident_id": resident_id,
+                "location_id": location_id
+            }
         )
         
-        # 限制返回数量
-        records = records[:limit]
-        
         logger.info(f"Found {len(records)} IoT records")
         
         return records
@@ -269,25 +281,12 @@ async def get_latest_data(
     try:
         logger.info(f"Getting latest data for device: {device_id}")
         
-        # 查询该设备的所有数据
-        records = iot_storage.find_all(
-            lambda r: (
-                str(r.get("device_id")) == str(device_id) and
-                str(r.get("tenant_id")) == str(tenant_id)
-            )
+        # 从最新数据倒序查找该设备的第一条记录
+        return iot_storage.latest(
+            lambda r: str(r.get("tenant_id")) == str(tenant_id),
+            match={"device_id": device_id}
         )
         
-        if not records:
-            return None
-        
-        # 找到最新的记录
-        latest = max(
-            records,
-            key=lambda x: datetime.fromisoformat(x.get("timestamp", "1970-01-01"))
-        )
-        
-        return latest
-        
     except Exception as e:
         logger.error(f"Error getting latest data: {e}")
         raise HTTPException(
@@ -315,11 +314,9 @@ async def get_statistics(
         start_time = datetime.now() - timedelta(hours=hours)
         
         # 查询时间范围内的数据
-        records = iot_storage.find_all(
-            lambda r: (
-                str(r.get("tenant_id")) == str(tenant_id) and
-                datetime.fromisoformat(r.get("timestamp", "1970-01-01")) >= start_time
-            )
+        records = iot_storage.query(
+            start=start_time,
+            filter_func=lambda r: str(r.get("tenant_id")) == str(tenant_id)
         )
         
         # 统计设备数
@@ -350,6 +347,50 @@ async def get_statistics(
         )
 
 
+@router.get("/storage/stats", response_model=dict, summary="获取时序存储统计")
+async def get_storage_stats():
+    """
+    获取IoT时序存储统计
+    
+    ## 返回
+    - late: 已接收的迟到（乱序）记录数
+    - rejected: 超出迟到窗口被拒绝的记录数
+    - delta_records: 等待后台合并的增量记录数
+    - merges: 已完成的有序合并次数
+    """
+    return iot_storage.get_stats()
+
+
+@router.get("/fall-clips/{clip_id}", response_model=dict, summary="获取跌倒片段")
+async def get_fall_clip(clip_id: UUID):
+    """
+    获取跌倒告警关联的前后轨迹片段（告警数据中的 fall_clip_id）
+    
+    ## 返回
+    - fields: 帧字段名（offset_ms为相对跌倒时刻的毫秒偏移）
+    - frames: 按时间顺序的帧数据
+    - status: recording（仍在收集后置帧）/ complete
+    """
+    clip = get_fall_capture_service().get_clip(clip_id)
+    if not clip:
+        raise HTTPException(status_code=404, detail="Fall clip not found")
+    return clip
+
+
+@router.get("/dedup/stats", response_model=dict, summary="获取接入去重统计")
+async def get_dedup_stats():
+    """
+    获取IoT数据接入去重统计
+    
+    ## 返回
+    - checked: 已检查的目标帧数
+    - duplicates: 被丢弃的重复帧数（热窗口命中 + 分区Bloom过滤器命中）
+    - hit_rate: 去重命中率
+    - unchecked: 早于保留分区、未能判重的帧数
+    """
+    return deduplicator.get_stats()
+
+
 @router.delete("/cleanup", response_model=dict, summary="清理历史数据")
 async def cleanup_old_data(
     tenant_id: UUID = Query(..., description="租户ID"),
@@ -395,58 +436,57 @@ async def cleanup_old_data(
 
 # ==================== 后台任务函数 ====================
 
-async def _save_iot_records_batch(records: List[IOTTimeseries]):
+async def _save_iot_records_batch(records: List[dict]):
     """批量保存IoT记录（后台任务）"""
     try:
-        for record in records:
-            iot_storage.create(record)
-        logger.success(f"Saved {len(records)} IoT records")
+        result = iot_storage.append(records)
+        logger.success(
+            f"Saved {result['appended'] + result['late']} IoT records "
+            f"({result['late']} late, {result['rejected']} rejected)"
+        )
     except Exception as e:
         logger.error(f"Error saving IoT records batch: {e}")
 
 
-async def _process_alert(record: IOTTimeseries):
+async def _process_alert(alert: dict, tenant_id: str):
     """处理告警（后台任务）"""
     try:
-        if record.alert_type and record.alert_level:
-            await alert_engine.process_alert(
-                tenant_id=record.tenant_id,
-                alert_type=record.alert_type,
-                alert_level=record.alert_level,
-                resident_id=record.resident_id,
-                device_id=record.device_id,
-                location_id=record.location_id,
-                alert_data={
-                    "timestamp": record.timestamp,
-                    "snomed_codes": record.snomed_codes,
-                    "danger_level": record.danger_level,
-                    "raw_data": record.raw_record
-                }
-            )
-            logger.info(f"Processed alert: {record.alert_type} - {record.alert_level}")
+        result = alert_engine.process_alert(alert, tenant_id)
+        if result.get("status") == "suppressed":
+            logger.debug(f"Suppressed alert: {alert.get('type')} ({result['reason']})")
+        else:
+            logger.info(f"Processed alert: {alert.get('type')} - {result.get('alert_level')}")
     except Exception as e:
         logger.error(f"Error processing alert: {e}")
 
 
+def _resolve_event_ids(event: TDPEvent) -> tuple:
+    """
+    解析TDP事件的租户ID和设备ID
+    
+    EXTEND模式从事件头读取tenant_id；LITE模式根据设备注册信息查找所属租户
+    """
+    device_id = str(event.header.device_id)
+    tenant_id = getattr(event.header, "tenant_id", None)
+    if not tenant_id:
+        device = device_storage.find_by_id("device_id", device_id)
+        tenant_id = device.get("tenant_id") if device else None
+    if not tenant_id:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unable to resolve tenant for device {device_id}"
+        )
+    return str(tenant_id), device_id
+
+
 async def _cleanup_old_records(tenant_id: UUID, cutoff_time: datetime):
     """清理旧记录（后台任务）"""
     try:
-        all_records = iot_storage.find_all(
+        deleted_count = iot_storage.delete_before(
+            cutoff_time,
             lambda r: str(r.get("tenant_id")) == str(tenant_id)
         )
         
-        deleted_count = 0
-        for record in all_records:
-            try:
-                timestamp = datetime.fromisoformat(record.get("timestamp", "1970-01-01"))
-                if timestamp < cutoff_time:
-                    record_id = record.get("id")
-                    if record_id:
-                        iot_storage.delete(UUID(record_id))
-                        deleted_count += 1
-            except (ValueError, TypeError):
-                continue
-        
         logger.success(f"Cleaned up {deleted_count} old IoT records for tenant {tenant_id}")
     except Exception as e:
         logger.error(f"Error cleaning up old records: {e}")
@@ -10,6 +10,8 @@ from loguru import logger
 
 from app.models.location import Location, LocationCreate, LocationUpdate
 from app.services.storage import StorageService
+from app.services.alert_routing import get_alert_routing_index
+from app.services.realtime_bus import get_realtime_bus
 from app.dependencies.auth import get_current_user_from_token, require_role
 from app.middleware.permissions import check_tenant_access
 
@@ -92,6 +94,8 @@ async def update_location(
         
         update_dict = location_data.model_dump(exclude_unset=True)
         updated = location_storage.update("location_id", location_id, update_dict)
+        get_alert_routing_index().invalidate(existing.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(existing.get("tenant_id"))
         logger.info(f"User {current_user.get('username')} updated location {location_id}")
         return updated
     except HTTPException:
@@ -113,6 +117,8 @@ async def delete_location(
             raise HTTPException(status_code=404, detail="Location not found")
         
         location_storage.delete("location_id", location_id)
+        get_alert_routing_index().invalidate(existing.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(existing.get("tenant_id"))
         return None
     except HTTPException:
         raise
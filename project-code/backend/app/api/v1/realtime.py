@@ -1,166 +1,77 @@
 """
 实时数据WebSocket API
 实时推送IoT数据、告警和系统事件
+
+按租户连接，可订阅设备/住户/卡片/位置；本模块只负责连接和订阅，
+消息由各生产者发布到实时推送总线（services/realtime_bus）；
+卡片/设备订阅收到快照 + 按节拍合并的增量（services/realtime_delta）；
+握手时请求子协议 owlrd.msgpack.v1 的客户端使用二进制帧（services/realtime_binary）；
+可靠消息带各主题序号，重连时带 last_seq 补发断线期间的消息（services/realtime_replay）；
+连接需携带JWT（?token= 或 Authorization 头），只订阅用户可见的主题（services/realtime_session）；
+心跳与失联检测由总线统一调度（services/realtime_heartbeat）
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from typing import Set, Dict
+from typing import Dict, Optional
 from uuid import UUID
-import asyncio
 import json
 from loguru import logger
 from datetime import datetime
 
-router = APIRouter()
+from app.config import settings
+from app.dependencies.auth import decode_websocket_token
+from app.services.realtime_session import RealtimeSession, build_session
+from app.services.realtime_topics import make_topic, TENANT, DEVICE, RESIDENT, CARD, LOCATION
+from app.services import realtime_bus
+from app.services.realtime_bus import get_realtime_bus
+from app.services.realtime_binary import SUBPROTOCOL_MSGPACK, binary_available, decode_client_message
 
-# WebSocket连接管理器
-class ConnectionManager:
-    """WebSocket连接管理器"""
-    
-    def __init__(self):
-        # 按租户ID组织的连接池
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
-        # 按设备ID订阅
-        self.device_subscriptions: Dict[str, Set[WebSocket]] = {}
-        # 按住户ID订阅
-        self.resident_subscriptions: Dict[str, Set[WebSocket]] = {}
-    
-    async def connect(self, websocket: WebSocket, tenant_id: str):
-        """接受新连接"""
-        await websocket.accept()
-        if tenant_id not in self.active_connections:
-            self.active_connections[tenant_id] = set()
-        self.active_connections[tenant_id].add(websocket)
-        logger.info(f"WebSocket connected: tenant={tenant_id}, total={len(self.active_connections[tenant_id])}")
-    
-    def disconnect(self, websocket: WebSocket, tenant_id: str):
-        """断开连接"""
-        if tenant_id in self.active_connections:
-            self.active_connections[tenant_id].discard(websocket)
-            if not self.active_connections[tenant_id]:
-                del self.active_connections[tenant_id]
-        
-        # 清理订阅
-        for device_id in list(self.device_subscriptions.keys()):
-            self.device_subscriptions[device_id].discard(websocket)
-            if not self.device_subscriptions[device_id]:
-                del self.device_subscriptions[device_id]
-        
-        for resident_id in list(self.resident_subscriptions.keys()):
-            self.resident_subscriptions[resident_id].discard(websocket)
-            if not self.resident_subscriptions[resident_id]:
-                del self.resident_subscriptions[resident_id]
-        
-        logger.info(f"WebSocket disconnected: tenant={tenant_id}")
-    
-    def subscribe_device(self, websocket: WebSocket, device_id: str):
-        """订阅设备数据"""
-        if device_id not in self.device_subscriptions:
-            self.device_subscriptions[device_id] = set()
-        self.device_subscriptions[device_id].add(websocket)
-        logger.info(f"Subscribed to device: {device_id}")
-    
-    def subscribe_resident(self, websocket: WebSocket, resident_id: str):
-        """订阅住户数据"""
-        if resident_id not in self.resident_subscriptions:
-            self.resident_subscriptions[resident_id] = set()
-        self.resident_subscriptions[resident_id].add(websocket)
-        logger.info(f"Subscribed to resident: {resident_id}")
-    
-    def unsubscribe_device(self, websocket: WebSocket, device_id: str):
-        """取消订阅设备数据"""
-        if device_id in self.device_subscriptions:
-            self.device_subscriptions[device_id].discard(websocket)
-            if not self.device_subscriptions[device_id]:
-                del self.device_subscriptions[device_id]
-            logger.info(f"Unsubscribed from device: {device_id}")
-    
-    def unsubscribe_resident(self, websocket: WebSocket, resident_id: str):
-        """取消订阅住户数据"""
-        if resident_id in self.resident_subscriptions:
-            self.resident_subscriptions[resident_id].discard(websocket)
-            if not self.resident_subscriptions[resident_id]:
-                del self.resident_subscriptions[resident_id]
-            logger.info(f"Unsubscribed from resident: {resident_id}")
-    
-    async def broadcast_to_tenant(self, tenant_id: str, message: dict):
-        """向租户的所有连接广播消息"""
-        if tenant_id not in self.active_connections:
-            return
-        
-        disconnected = set()
-        for connection in self.active_connections[tenant_id]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending to connection: {e}")
-                disconnected.add(connection)
-        
-        # 清理断开的连接
-        for connection in disconnected:
-            self.active_connections[tenant_id].discard(connection)
-    
-    async def send_to_device_subscribers(self, device_id: str, message: dict):
-        """向设备订阅者发送消息"""
-        if device_id not in self.device_subscriptions:
-            return
-        
-        disconnected = set()
-        for connection in self.device_subscriptions[device_id]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending to device subscriber: {e}")
-                disconnected.add(connection)
-        
-        # 清理断开的连接
-        for connection in disconnected:
-            self.device_subscriptions[device_id].discard(connection)
-    
-    async def send_to_resident_subscribers(self, resident_id: str, message: dict):
-        """向住户订阅者发送消息"""
-        if resident_id not in self.resident_subscriptions:
-            return
-        
-        disconnected = set()
-        for connection in self.resident_subscriptions[resident_id]:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error sending to resident subscriber: {e}")
-                disconnected.add(connection)
-        
-        # 清理断开的连接
-        for connection in disconnected:
-            self.resident_subscriptions[resident_id].discard(connection)
-    
-    def get_stats(self) -> dict:
-        """获取连接统计信息"""
-        total_connections = sum(len(conns) for conns in self.active_connections.values())
-        return {
-            "total_connections": total_connections,
-            "tenants": len(self.active_connections),
-            "device_subscriptions": len(self.device_subscriptions),
-            "resident_subscriptions": len(self.resident_subscriptions)
-        }
+router = APIRouter()
 
+# 客户端可以订阅的主题类型（租户主题在连接时自动订阅）
+SUBSCRIBABLE_KINDS = (DEVICE, RESIDENT, CARD, LOCATION)
 
-# 全局连接管理器
-manager = ConnectionManager()
+# 实时推送总线（连接、订阅索引和分发都在总线中，见 services/realtime_bus）
+bus = get_realtime_bus()
 
 
 @router.websocket("/ws/{tenant_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     tenant_id: str,
+    last_seq: Optional[int] = Query(None, description="重连时租户主题最后收到的序号"),
+    epoch: Optional[str] = Query(None, description="重连时记录的epoch"),
+    token: Optional[str] = Query(None, description="JWT访问令牌（浏览器WebSocket无法设置Authorization头）"),
 ):
     """
     WebSocket实时数据推送
     
     ## 连接
     ```javascript
-    const ws = new WebSocket('ws://localhost:8000/api/v1/realtime/ws/{tenant_id}');
+    const ws = new WebSocket('ws://localhost:8000/api/v1/realtime/ws/{tenant_id}?token={jwt}');
+    // 二进制协议（MessagePack，对象键/实体ID驻留为编号，时间为毫秒时间戳）
+    const ws = new WebSocket(url, ['owlrd.msgpack.v1']);
     ```
+    二进制消息为 [0, {编号: 字符串}]（字典定义）或 [1, 消息体]；客户端命令可发送JSON文本或MessagePack
+    
+    ## 断线重连
+    告警、设备/住户/卡片变更等可靠消息带有各主题的序号：
+    `{"seq": {"tenant:T": 42, "resident:R": 7}, "epoch": "...", "type": "alert", ...}`；
+    重连时带上租户主题最后收到的序号 `/ws/{tenant_id}?last_seq=42&epoch=...`，
+    订阅其他主题时在subscribe消息中带 `last_seq` / `epoch`，服务端补发缺口；
+    缺口超出重放缓冲时收到 `{"type": "resync_required", "topic": ..., "seq": ...}`，
+    客户端只需通过REST重新拉取该主题，并从返回的seq继续
+    
+    ## 认证与可见范围
+    握手时校验JWT（?token= 或 Authorization: Bearer），用户必须属于该租户，否则拒绝连接（403）；
+    Admin / alert_scope=ALL 的用户接收租户全部事件，其他用户只接收可见住户/位置的事件，
+    订阅不可见的对象时返回 forbidden 错误；护理分配等变更后自动调整订阅
+    （REALTIME_REQUIRE_AUTH=false 时允许不带令牌的连接，按租户接收全部事件）
+    
+    ## 心跳
+    服务端每 WS_HEARTBEAT_INTERVAL_SEC 秒发送 `{"type": "heartbeat", "timestamp": ...}`，
+    客户端应回复 `{"action": "pong"}`（任何客户端消息都视为存活）；
+    连续 WS_HEARTBEAT_MAX_MISSED 个周期没有收到任何消息时服务端以1001关闭连接
     
     ## 消息格式
     
@@ -169,11 +80,25 @@ async def websocket_endpoint(
     {
         "action": "subscribe",
         "type": "device",
-        "id": "device_uuid"
+        "id": "device_uuid",
+        "last_seq": 7,
+        "epoch": "..."
     }
     ```
+    type 可为 device / resident / card / location；连接后自动订阅所在租户
     
-    ### 服务端推送（IoT数据）
+    ### 客户端发送（重新同步卡片/设备快照，不带type/id时为全部）
+    ```json
+    {"action": "resync", "type": "card", "id": "card_uuid"}
+    ```
+    
+    ### 服务端推送（卡片/设备：订阅或resync时的快照，之后每个节拍一帧增量）
+    ```json
+    {"type": "live_snapshot", "states": {"card:card_uuid": {"heart_rate": 72, "presence": true}}}
+    {"type": "live_delta", "patches": {"card:card_uuid": {"heart_rate": 75}}}
+    ```
+    
+    ### 服务端推送（住户/位置：逐帧IoT数据）
     ```json
     {
         "type": "iot_data",
@@ -191,71 +116,81 @@ async def websocket_endpoint(
         "data": {...}
     }
     ```
+    同一住户的后续告警合并到已打开的事件时推送 `{"type": "alert_update", ...}`（data为更新后的事件记录，
+    包含 event_count / source_events），客户端按 data.alert_id 替换已有告警
     """
-    await manager.connect(websocket, tenant_id)
+    session = None
+    if settings.realtime_require_auth or token or websocket.headers.get("authorization"):
+        session = _authenticate(websocket, tenant_id, token)
+        if session is None:
+            # accept之前关闭：握手以403拒绝
+            await websocket.close(code=1008)
+            return
     
+    requested = websocket.scope.get("subprotocols") or []
+    subprotocol = SUBPROTOCOL_MSGPACK if SUBPROTOCOL_MSGPACK in requested and binary_available() else None
+    connection = await bus.connect(websocket, tenant_id, subprotocol=subprotocol, session=session)
     try:
         # 发送欢迎消息
-        await websocket.send_json({
+        connection.send({
             "type": "connected",
             "message": "WebSocket connection established",
             "tenant_id": tenant_id,
+            "protocol": subprotocol or "json",
+            "user_id": session.user_id if session else None,
+            "epoch": bus.replay.epoch,
+            "seq": bus.replay.current(make_topic(TENANT, tenant_id)),
             "timestamp": datetime.now().isoformat()
         })
-        
-        # 启动心跳任务
-        heartbeat_task = asyncio.create_task(_send_heartbeat(websocket))
+        if last_seq is not None and bus.authorized(connection, make_topic(TENANT, tenant_id)):
+            bus.resume(connection, make_topic(TENANT, tenant_id), last_seq, epoch)
         
         # 消息处理循环
         while True:
             # 接收客户端消息
-            data = await websocket.receive_json()
+            data = await _receive(websocket)
+            connection.touch()
             
-            # 处理订阅请求
-            if data.get("action") == "subscribe":
+            # 处理订阅/取消订阅请求
+            action = data.get("action")
+            if action in ("subscribe", "unsubscribe"):
                 sub_type = data.get("type")
                 sub_id = data.get("id")
-                
-                if sub_type == "device" and sub_id:
-                    manager.subscribe_device(websocket, sub_id)
-                    await websocket.send_json({
-                        "type": "subscribed",
-                        "subscription_type": "device",
-                        "id": sub_id
-                    })
-                
-                elif sub_type == "resident" and sub_id:
-                    manager.subscribe_resident(websocket, sub_id)
-                    await websocket.send_json({
-                        "type": "subscribed",
-                        "subscription_type": "resident",
-                        "id": sub_id
-                    })
+                if sub_id and sub_type in SUBSCRIBABLE_KINDS:
+                    topic = make_topic(sub_type, sub_id)
+                    if action == "subscribe" and not bus.authorized(connection, topic):
+                        connection.send({
+                            "type": "error",
+                            "code": "forbidden",
+                            "message": f"Subscription not permitted: {topic}",
+                            "subscription_type": sub_type,
+                            "id": sub_id
+                        })
+                        continue
+                    connection.send({
+                            "type": f"{action}d",
+                            "subscription_type": sub_type,
+                            "id": sub_id,
+                            "seq": bus.replay.current(topic)
+                        })
+                    # 确认消息先入队，卡片/设备快照和补发的消息随后
+                    if action == "subscribe":
+                        bus.subscribe(connection, topic)
+                        if data.get("last_seq") is not None:
+                            bus.resume(connection, topic, int(data["last_seq"]), data.get("epoch"))
+                    else:
+                        bus.unsubscribe(connection, topic)
             
-            # 处理取消订阅
-            elif data.get("action") == "unsubscribe":
-                unsub_type = data.get("type")
-                unsub_id = data.get("id")
-                
-                if unsub_type == "device" and unsub_id:
-                    manager.unsubscribe_device(websocket, unsub_id)
-                    await websocket.send_json({
-                        "type": "unsubscribed",
-                        "subscription_type": "device",
-                        "id": unsub_id
-                    })
-                
-                elif unsub_type == "resident" and unsub_id:
-                    manager.unsubscribe_resident(websocket, unsub_id)
-                    await websocket.send_json({
-                        "type": "unsubscribed",
-                        "subscription_type": "resident",
-                        "id": unsub_id
-                    })
+            # 重新同步快照
+            elif action == "resync":
+                sub_type = data.get("type")
+                sub_id = data.get("id")
+                topic = make_topic(sub_type, sub_id) if sub_id and sub_type in SUBSCRIBABLE_KINDS else None
+                bus.resync(connection, topic)
             
             # 处理ping
-            elif data.get("action") == "ping":
-                await websocket.send_json({
+            elif action == "ping":
+                connection.send({
                     "type": "pong",
                     "timestamp": datetime.now().isoformat()
                 })
@@ -265,8 +200,7 @@ async def websocket_endpoint(
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        heartbeat_task.cancel()
-        manager.disconnect(websocket, tenant_id)
+        await bus.disconnect(connection)
 
 
 @router.get("/stats", summary="获取WebSocket连接统计")
@@ -279,56 +213,47 @@ async def get_websocket_stats():
     - 租户数量
     - 设备订阅数
     - 住户订阅数
+    - 卡片/位置/数据流订阅数
+    - 待发送消息数、丢弃消息数、慢消费者断开次数
     """
-    return manager.get_stats()
+    return bus.get_stats()
 
 
 # ==================== 辅助函数 ====================
 
-async def _send_heartbeat(websocket: WebSocket, interval: int = 30):
-    """发送心跳包"""
-    try:
-        while True:
-            await asyncio.sleep(interval)
-            await websocket.send_json({
-                "type": "heartbeat",
-                "timestamp": datetime.now().isoformat()
-            })
-    except asyncio.CancelledError:
-        pass
-    except Exception as e:
-        logger.error(f"Heartbeat error: {e}")
+def _authenticate(websocket: WebSocket, tenant_id: str, token: Optional[str]) -> Optional[RealtimeSession]:
+    """校验JWT并预先计算用户在该租户的可见范围（失败返回None）"""
+    payload = decode_websocket_token(websocket, token)
+    if payload is None:
+        logger.warning(f"Rejected realtime connection without valid token: tenant={tenant_id}")
+        return None
+    session = build_session(payload["user_id"], tenant_id)
+    if session is None:
+        logger.warning(f"Rejected realtime connection: user={payload['user_id']} cannot access tenant={tenant_id}")
+    return session
+
+
+async def _receive(websocket: WebSocket) -> Dict:
+    """接收客户端命令（JSON文本帧或MessagePack二进制帧）"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return decode_client_message(message["bytes"])
+    return json.loads(message["text"])
 
 
 # ==================== 公共接口（供其他模块调用）====================
 
 async def push_iot_data(tenant_id: str, device_id: str, resident_id: str, data: dict):
-    """推送IoT数据到WebSocket客户端"""
-    message = {
-        "type": "iot_data",
-        "data": data,
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    # 推送给租户
-    await manager.broadcast_to_tenant(tenant_id, message)
-    
-    # 推送给设备订阅者
-    await manager.send_to_device_subscribers(device_id, message)
-    
-    # 推送给住户订阅者
-    if resident_id:
-        await manager.send_to_resident_subscribers(resident_id, message)
+    """推送IoT数据到WebSocket客户端（发布到实时推送总线）"""
+    realtime_bus.push_iot_data({
+        **data, "tenant_id": tenant_id, "device_id": device_id, "resident_id": resident_id
+    })
 
 
 async def push_alert(tenant_id: str, alert_type: str, alert_level: str, data: dict):
-    """推送告警到WebSocket客户端"""
-    message = {
-        "type": "alert",
-        "alert_type": alert_type,
-        "alert_level": alert_level,
-        "data": data,
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    await manager.broadcast_to_tenant(tenant_id, message)
+    """推送告警到WebSocket客户端（发布到实时推送总线）"""
+    realtime_bus.push_alert({
+        **data, "tenant_id": tenant_id, "alert_type": alert_type, "alert_level": alert_level
+    })
@@ -13,6 +13,8 @@ from app.models.resident import (
     ResidentCaregiverUpdate
 )
 from app.services.storage import StorageService
+from app.services.alert_routing import get_alert_routing_index
+from app.services.realtime_bus import get_realtime_bus
 
 router = APIRouter(prefix="/resident_caregivers", tags=["Resident Caregivers"])
 caregiver_storage = StorageService(collection="resident_caregivers")
@@ -82,7 +84,10 @@ async def create_assignment(assignment: ResidentCaregiverCreate):
             detail="Caregiver assignment already exists for this resident. Use PUT to update."
         )
     
-    return caregiver_storage.create(assignment_dict)
+    result = caregiver_storage.create(assignment_dict)
+    get_alert_routing_index().invalidate(assignment.tenant_id)
+    get_realtime_bus().refresh_sessions(assignment.tenant_id)
+    return result
 
 
 @router.put("/{assignment_id}", response_model=ResidentCaregiver)
@@ -93,7 +98,10 @@ async def update_assignment(assignment_id: UUID, assignment_update: ResidentCare
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     update_dict = assignment_update.model_dump(exclude_unset=True)
-    return caregiver_storage.update(assignment_id, update_dict, id_field="id")
+    result = caregiver_storage.update(assignment_id, update_dict, id_field="id")
+    get_alert_routing_index().invalidate(existing.get("tenant_id"))
+    get_realtime_bus().refresh_sessions(existing.get("tenant_id"))
+    return result
 
 
 @router.delete("/{assignment_id}", status_code=204)
@@ -104,4 +112,6 @@ async def delete_assignment(assignment_id: UUID):
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     caregiver_storage.delete(assignment_id, id_field="id")
+    get_alert_routing_index().invalidate(existing.get("tenant_id"))
+    get_realtime_bus().refresh_sessions(existing.get("tenant_id"))
     return None
@@ -10,6 +10,9 @@ from loguru import logger
 
 from app.models.resident import Resident, ResidentCreate, ResidentUpdate
 from app.services.storage import StorageService
+from app.services.binding_index import get_binding_index
+from app.services.alert_routing import get_alert_routing_index
+from app.services.realtime_bus import push_resident_update, get_realtime_bus
 from app.dependencies.auth import get_current_user_from_token, require_role
 from app.middleware.permissions import check_tenant_access, check_manage_permission
 
@@ -98,6 +101,9 @@ async def create_resident(
         if 'anonymous_name' not in resident_dict or not resident_dict['anonymous_name']:
             resident_dict['anonymous_name'] = resident_dict['last_name']
         result = resident_storage.create(resident_dict)
+        get_binding_index().invalidate()
+        get_alert_routing_index().invalidate(result.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(result.get("tenant_id"))
         logger.info(f"User {current_user.get('username')} created resident: {result.get('resident_id')}")
         return result
     except Exception as e:
@@ -133,6 +139,7 @@ async def update_resident(
         
         # 更新字段
         from datetime import datetime
+        previous = dict(existing)
         update_dict = resident.model_dump(exclude_unset=True)
         for key, value in update_dict.items():
             existing[key] = value
@@ -143,6 +150,15 @@ async def update_resident(
         import json
         with open(resident_storage._get_file_path(), 'w', encoding='utf-8') as f:
             json.dump(all_residents, f, indent=2, ensure_ascii=False)
+        # 换床、改位置或不再在住时，结束原入住区间（补传数据按当时的住户归属）
+        if previous.get("status", "active") == "active" and any(
+            str(previous.get(field)) != str(existing.get(field)) for field in ("bed_id", "location_id", "status")
+        ):
+            get_binding_index().record_placement_end(previous)
+        get_binding_index().invalidate()
+        get_alert_routing_index().invalidate(existing.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(existing.get("tenant_id"))
+        push_resident_update(existing)
         result = existing
         logger.info(f"User {current_user.get('username')} updated resident: {resident_id}")
         return result
@@ -177,6 +193,11 @@ async def delete_resident(
         import json
         with open(resident_storage._get_file_path(), 'w', encoding='utf-8') as f:
             json.dump(filtered, f, indent=2, ensure_ascii=False)
+        if existing.get("status", "active") == "active":
+            get_binding_index().record_placement_end(existing)
+        get_binding_index().invalidate()
+        get_alert_routing_index().invalidate(existing.get("tenant_id") if existing else None)
+        get_realtime_bus().refresh_sessions(existing.get("tenant_id") if existing else None)
         
         logger.info(f"Deleted resident: {resident_id}")
         return {"message": "Resident deleted successfully", "resident_id": str(resident_id)}
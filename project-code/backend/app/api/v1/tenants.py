@@ -10,6 +10,7 @@ from loguru import logger
 
 from app.models.tenant import Tenant, TenantCreate, TenantUpdate
 from app.services.storage import StorageService
+from app.services.silence_calendar import get_silence_calendar
 
 router = APIRouter()
 tenant_storage = StorageService[Tenant]("tenants")
@@ -64,6 +65,7 @@ async def update_tenant(tenant_id: UUID, tenant: TenantUpdate):
         result = tenant_storage.update(tenant_id, tenant.model_dump(exclude_unset=True))
         if not result:
             raise HTTPException(status_code=404, detail="Tenant not found")
+        get_silence_calendar().invalidate(tenant_id)
         logger.info(f"Updated tenant: {tenant_id}")
         return result
     except HTTPException:
@@ -10,6 +10,9 @@ from loguru import logger
 
 from app.models.user import User, UserCreate, UserUpdate
 from app.services.storage import StorageService
+from app.services.alert_routing import get_alert_routing_index
+from app.services.realtime_bus import get_realtime_bus
+from app.services.silence_calendar import get_silence_calendar
 from app.dependencies.auth import get_current_user_from_token, require_role
 
 router = APIRouter()
@@ -83,6 +86,9 @@ async def create_user(
         user_data = user.model_dump()
         user_data["user_id"] = str(uuid.uuid4())
         result = user_storage.create(user_data)
+        get_alert_routing_index().invalidate(result.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(result.get("tenant_id"))
+        get_silence_calendar().invalidate(result.get("tenant_id"))
         logger.info(f"User {current_user.get('username')} created user {result.get('user_id')}")
         return result
     except HTTPException:
@@ -113,6 +119,9 @@ async def update_user(
                 raise HTTPException(status_code=403, detail="需要Admin或Director权限")
         
         result = user_storage.update("user_id", user_id, user.model_dump(exclude_unset=True))
+        get_alert_routing_index().invalidate(existing_user.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(existing_user.get("tenant_id"))
+        get_silence_calendar().invalidate(existing_user.get("tenant_id"))
         logger.info(f"User {current_user.get('username')} updated user {user_id}")
         return result
     except HTTPException:
@@ -140,6 +149,9 @@ async def delete_user(
         success = user_storage.delete("user_id", user_id)
         if not success:
             raise HTTPException(status_code=404, detail="User not found")
+        get_alert_routing_index().invalidate(existing_user.get("tenant_id"))
+        get_realtime_bus().refresh_sessions(existing_user.get("tenant_id"))
+        get_silence_calendar().invalidate(existing_user.get("tenant_id"))
         return {"status": "success", "user_id": str(user_id)}
     except HTTPException:
         raise
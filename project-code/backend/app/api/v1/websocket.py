@@ -1,202 +1,175 @@
 """
 WebSocket实时数据推送
 支持告警、设备状态、IoT数据的实时更新
+
+按数据流订阅（alerts/devices/iot_data/residents/cards，可按租户过滤）；
+本模块只负责连接和订阅，消息由各生产者发布到实时推送总线（services/realtime_bus）；
+重连后订阅时带 last_seq / epoch 可补发断线期间的可靠消息（services/realtime_replay）；
+连接需携带JWT（?token= 或 Authorization 头），数据流只对租户全部可见的用户开放，且只能订阅本租户；
+服务端心跳 {"type": "heartbeat"} 需回复 {"type": "pong"}，长时间无消息的连接被关闭（services/realtime_heartbeat）
 """
 
-from typing import List, Dict
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Dict, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
 from loguru import logger
 import json
-import asyncio
 from datetime import datetime
 
+from app.config import settings
+from app.dependencies.auth import decode_websocket_token
+from app.services import realtime_bus
+from app.services.realtime_bus import get_realtime_bus, stream_topic, STREAMS
+from app.services.realtime_session import build_session
+
 router = APIRouter()
 
+# 实时推送总线
+bus = get_realtime_bus()
 
-class ConnectionManager:
-    """WebSocket连接管理器"""
-    
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.subscriptions: Dict[str, List[WebSocket]] = {}
-    
-    async def connect(self, websocket: WebSocket):
-        """接受新连接"""
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"New WebSocket connection. Total: {len(self.active_connections)}")
-    
-    def disconnect(self, websocket: WebSocket):
-        """断开连接"""
-        self.active_connections.remove(websocket)
-        # 清理订阅
-        for topic in list(self.subscriptions.keys()):
-            if websocket in self.subscriptions[topic]:
-                self.subscriptions[topic].remove(websocket)
-        logger.info(f"WebSocket disconnected. Total: {len(self.active_connections)}")
-    
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        """发送个人消息"""
-        await websocket.send_json(message)
-    
-    async def broadcast(self, message: dict):
-        """广播消息给所有连接"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting message: {e}")
-    
-    async def broadcast_to_topic(self, topic: str, message: dict):
-        """向特定主题订阅者广播"""
-        if topic in self.subscriptions:
-            for connection in self.subscriptions[topic]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to topic {topic}: {e}")
-    
-    def subscribe(self, topic: str, websocket: WebSocket):
-        """订阅主题"""
-        if topic not in self.subscriptions:
-            self.subscriptions[topic] = []
-        if websocket not in self.subscriptions[topic]:
-            self.subscriptions[topic].append(websocket)
-        logger.info(f"WebSocket subscribed to topic: {topic}")
-    
-    def unsubscribe(self, topic: str, websocket: WebSocket):
-        """取消订阅"""
-        if topic in self.subscriptions and websocket in self.subscriptions[topic]:
-            self.subscriptions[topic].remove(websocket)
-        logger.info(f"WebSocket unsubscribed from topic: {topic}")
-
-
-manager = ConnectionManager()
+
+def _topic(message: Dict, default_tenant_id: Optional[str] = None) -> Optional[str]:
+    """订阅消息对应的数据流主题（未知数据流返回None；已认证连接缺省按本租户过滤）"""
+    stream = message.get("topic")
+    if stream not in STREAMS:
+        return None
+    tenant_id = (message.get("filters") or {}).get("tenant_id") or default_tenant_id
+    return stream_topic(stream, tenant_id)
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None, description="JWT访问令牌"),
+):
     """
     WebSocket主端点
-    
+
     **消息格式**：
     ```json
     {
-        "type": "subscribe|unsubscribe|ping",
-        "topic": "alerts|devices|iot_data|residents",
-        "filters": {"tenant_id": "xxx"}
+        "type": "subscribe|unsubscribe|ping|pong",
+        "topic": "alerts|devices|iot_data|residents|cards",
+        "filters": {"tenant_id": "xxx"},
+        "last_seq": 42,
+        "epoch": "..."
     }
     ```
-    
+
     **推送格式**：
     ```json
     {
-        "type": "alert|device_status|iot_data|resident_update",
+        "type": "alert|device_status|iot_data|resident_update|card_update",
         "data": {...},
         "timestamp": "2025-11-21T11:38:00Z"
     }
     ```
     """
-    await manager.connect(websocket)
-    
+    session = None
+    if settings.realtime_require_auth or token or websocket.headers.get("authorization"):
+        payload = decode_websocket_token(websocket, token)
+        session = build_session(payload["user_id"], payload.get("tenant_id")) if payload else None
+        if session is None:
+            logger.warning("Rejected stream WebSocket connection without valid token")
+            await websocket.close(code=1008)
+            return
+
+    connection = await bus.connect(websocket, session=session)
+    tenant_id = session.tenant_id if session else None
+
     try:
         # 发送连接成功消息
-        await manager.send_personal_message({
+        connection.send({
             "type": "connected",
             "message": "WebSocket连接成功",
             "timestamp": datetime.now().isoformat()
-        }, websocket)
-        
+        })
+
         while True:
             # 接收客户端消息
             data = await websocket.receive_text()
             message = json.loads(data)
-            
+            connection.touch()
+
             message_type = message.get("type")
-            
+
             if message_type == "ping":
                 # 心跳响应
-                await manager.send_personal_message({
+                connection.send({
                     "type": "pong",
                     "timestamp": datetime.now().isoformat()
-                }, websocket)
-            
-            elif message_type == "subscribe":
-                # 订阅主题
-                topic = message.get("topic")
-                if topic:
-                    manager.subscribe(topic, websocket)
-                    await manager.send_personal_message({
-                        "type": "subscribed",
-                        "topic": topic,
+                })
+
+            elif message_type == "pong":
+                # 服务端心跳的响应（touch已记录存活）
+                pass
+
+            elif message_type in ("subscribe", "unsubscribe"):
+                # 订阅/取消订阅数据流
+                topic = _topic(message, tenant_id)
+                if topic and message_type == "subscribe" and not bus.authorized(connection, topic):
+                    connection.send({
+                        "type": "error",
+                        "code": "forbidden",
+                        "message": f"Topic not permitted: {message.get('topic')}",
+                        "timestamp": datetime.now().isoformat()
+                    })
+                elif topic:
+                    connection.send({
+                        "type": f"{message_type}d",
+                        "topic": message.get("topic"),
+                        "epoch": bus.replay.epoch,
+                        "seq": bus.replay.current(topic),
                         "timestamp": datetime.now().isoformat()
-                    }, websocket)
-            
-            elif message_type == "unsubscribe":
-                # 取消订阅
-                topic = message.get("topic")
-                if topic:
-                    manager.unsubscribe(topic, websocket)
-                    await manager.send_personal_message({
-                        "type": "unsubscribed",
-                        "topic": topic,
+                    })
+                    # 确认消息先入队，补发的消息随后
+                    if message_type == "subscribe":
+                        bus.subscribe(connection, topic)
+                        if message.get("last_seq") is not None:
+                            bus.resume(connection, topic, int(message["last_seq"]), message.get("epoch"))
+                    else:
+                        bus.unsubscribe(connection, topic)
+                else:
+                    connection.send({
+                        "type": "error",
+                        "message": f"Unknown topic: {message.get('topic')}",
                         "timestamp": datetime.now().isoformat()
-                    }, websocket)
-            
+                    })
+
             else:
                 # 未知消息类型
-                await manager.send_personal_message({
+                connection.send({
                     "type": "error",
                     "message": f"Unknown message type: {message_type}",
                     "timestamp": datetime.now().isoformat()
-                }, websocket)
-    
+                })
+
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
+    finally:
+        await bus.disconnect(connection)
 
 
 # 辅助函数：推送告警
 async def push_alert(alert_data: dict):
     """推送新告警到所有订阅者"""
-    message = {
-        "type": "alert",
-        "data": alert_data,
-        "timestamp": datetime.now().isoformat()
-    }
-    await manager.broadcast_to_topic("alerts", message)
+    realtime_bus.push_alert(alert_data)
 
 
 # 辅助函数：推送设备状态更新
 async def push_device_status(device_data: dict):
     """推送设备状态更新"""
-    message = {
-        "type": "device_status",
-        "data": device_data,
-        "timestamp": datetime.now().isoformat()
-    }
-    await manager.broadcast_to_topic("devices", message)
+    realtime_bus.push_device_status(device_data)
 
 
 # 辅助函数：推送IoT数据
 async def push_iot_data(iot_data: dict):
     """推送IoT实时数据"""
-    message = {
-        "type": "iot_data",
-        "data": iot_data,
-        "timestamp": datetime.now().isoformat()
-    }
-    await manager.broadcast_to_topic("iot_data", message)
+    realtime_bus.push_iot_data(iot_data)
 
 
 # 辅助函数：推送住户状态更新
 async def push_resident_update(resident_data: dict):
     """推送住户状态更新"""
-    message = {
-        "type": "resident_update",
-        "data": resident_data,
-        "timestamp": datetime.now().isoformat()
-    }
-    await manager.broadcast_to_topic("residents", message)
+    realtime_bus.push_resident_update(resident_data)
@@ -42,11 +42,63 @@ class Settings(BaseSettings):
     # TDP Protocol
     tdp_buffer_size: int = Field(default=8192, env="TDP_BUFFER_SIZE")
     tdp_compression_enabled: bool = Field(default=True, env="TDP_COMPRESSION_ENABLED")
+    zone_grid_cell_cm: int = Field(default=20, env="ZONE_GRID_CELL_CM")
+    fall_clip_pre_roll_sec: int = Field(default=60, env="FALL_CLIP_PRE_ROLL_SEC")
+    fall_clip_post_roll_sec: int = Field(default=30, env="FALL_CLIP_POST_ROLL_SEC")
+    fall_clip_buffer_frames: int = Field(default=1200, env="FALL_CLIP_BUFFER_FRAMES")
+    fall_clip_max_pending_per_device: int = Field(default=4, env="FALL_CLIP_MAX_PENDING_PER_DEVICE")
+    fall_clip_flush_interval_sec: float = Field(default=5.0, env="FALL_CLIP_FLUSH_INTERVAL_SEC")
+    
+    # Ingest Dedup
+    ingest_dedup_window_sec: int = Field(default=300, env="INGEST_DEDUP_WINDOW_SEC")
+    ingest_dedup_partition_hours: int = Field(default=1, env="INGEST_DEDUP_PARTITION_HOURS")
+    ingest_dedup_partitions: int = Field(default=24, env="INGEST_DEDUP_PARTITIONS")
+    ingest_dedup_bloom_capacity: int = Field(default=500000, env="INGEST_DEDUP_BLOOM_CAPACITY")
+    ingest_dedup_bloom_error_rate: float = Field(default=0.001, env="INGEST_DEDUP_BLOOM_ERROR_RATE")
+    ingest_max_clock_skew_sec: int = Field(default=300, env="INGEST_MAX_CLOCK_SKEW_SEC")
+    
+    # Timeseries Storage
+    timeseries_late_window_hours: int = Field(default=72, env="TIMESERIES_LATE_WINDOW_HOURS")
+    timeseries_merge_interval_sec: int = Field(default=30, env="TIMESERIES_MERGE_INTERVAL_SEC")
+    timeseries_delta_max_records: int = Field(default=5000, env="TIMESERIES_DELTA_MAX_RECORDS")
+    timeseries_cached_partitions: int = Field(default=7, env="TIMESERIES_CACHED_PARTITIONS")
     
     # Alert System
     alert_confirmation_timeout_l5: int = Field(default=30, env="ALERT_CONFIRMATION_TIMEOUT_L5")
     alert_secondary_timeout_l5: int = Field(default=150, env="ALERT_SECONDARY_TIMEOUT_L5")
     alert_server_override_timeout: int = Field(default=50, env="ALERT_SERVER_OVERRIDE_TIMEOUT")
+    alert_store_recent_max: int = Field(default=5000, env="ALERT_STORE_RECENT_MAX")
+    alert_coalesce_window_sec: float = Field(default=30.0, env="ALERT_COALESCE_WINDOW_SEC")
+    alert_digest_max_items: int = Field(default=20, env="ALERT_DIGEST_MAX_ITEMS")
+    alert_correlation_window_sec: float = Field(default=60.0, env="ALERT_CORRELATION_WINDOW_SEC")
+    alert_correlation_max_events: int = Field(default=20, env="ALERT_CORRELATION_MAX_EVENTS")
+    
+    # Alert Notification
+    notification_queue_size: int = Field(default=1000, env="NOTIFICATION_QUEUE_SIZE")
+    notification_max_retries: int = Field(default=3, env="NOTIFICATION_MAX_RETRIES")
+    notification_retry_backoff_sec: float = Field(default=1.0, env="NOTIFICATION_RETRY_BACKOFF_SEC")
+    notification_channel_adapters: str = Field(default="", env="NOTIFICATION_CHANNEL_ADAPTERS")
+    notification_smtp_host: str = Field(default="localhost", env="NOTIFICATION_SMTP_HOST")
+    notification_smtp_port: int = Field(default=1025, env="NOTIFICATION_SMTP_PORT")
+    notification_smtp_sender: str = Field(default="alerts@owlrd.local", env="NOTIFICATION_SMTP_SENDER")
+    
+    # Realtime WebSocket
+    ws_send_queue_size: int = Field(default=256, env="WS_SEND_QUEUE_SIZE")
+    ws_slow_consumer_sec: float = Field(default=10.0, env="WS_SLOW_CONSUMER_SEC")
+    ws_overflow_policy: str = Field(
+        default="iot_data:drop_oldest,heartbeat:drop_newest", env="WS_OVERFLOW_POLICY"
+    )
+    realtime_backplane: str = Field(default="memory", env="REALTIME_BACKPLANE")
+    realtime_backplane_path: str = Field(default="", env="REALTIME_BACKPLANE_PATH")
+    realtime_delta_tick_sec: float = Field(default=1.0, env="REALTIME_DELTA_TICK_SEC")
+    realtime_replay_size: int = Field(default=256, env="REALTIME_REPLAY_SIZE")
+    realtime_replay_ttl_sec: float = Field(default=600.0, env="REALTIME_REPLAY_TTL_SEC")
+    realtime_replay_max_topics: int = Field(default=10000, env="REALTIME_REPLAY_MAX_TOPICS")
+    realtime_require_auth: bool = Field(default=True, env="REALTIME_REQUIRE_AUTH")
+    realtime_session_refresh_debounce_sec: float = Field(default=0.5, env="REALTIME_SESSION_REFRESH_DEBOUNCE_SEC")
+    ws_heartbeat_interval_sec: float = Field(default=30.0, env="WS_HEARTBEAT_INTERVAL_SEC")
+    ws_heartbeat_slots: int = Field(default=30, env="WS_HEARTBEAT_SLOTS")
+    ws_heartbeat_max_missed: int = Field(default=2, env="WS_HEARTBEAT_MAX_MISSED")
     
     # Care Quality
     effective_care_radius_meters: float = Field(default=1.2, env="EFFECTIVE_CARE_RADIUS_METERS")
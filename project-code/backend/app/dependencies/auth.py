@@ -4,9 +4,10 @@
 """
 
 from typing import Optional, Dict, Any
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, WebSocket
 from uuid import UUID
 import jwt
+from loguru import logger
 
 from app.services.storage import StorageService
 from app.api.v1.auth import SECRET_KEY, ALGORITHM
@@ -120,6 +121,31 @@ async def get_current_user_optional(
         return None
 
 
+def decode_websocket_token(websocket: WebSocket, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    校验WebSocket握手携带的JWT
+    浏览器WebSocket无法设置Authorization header，令牌可通过查询参数传递
+    
+    参数:
+        websocket: WebSocket（读取Authorization header）
+        token: 查询参数中的令牌（优先）
+        
+    返回:
+        Optional[Dict]: 令牌载荷（含user_id、tenant_id）；未携带或无效时返回None
+    """
+    if not token:
+        scheme, _, credentials = (websocket.headers.get("authorization") or "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError as e:
+        logger.warning(f"Invalid WebSocket token: {e}")
+        return None
+    return payload if payload.get("user_id") else None
+
+
 def require_role(allowed_roles: list[str]):
     """
     装饰器工厂：要求特定角色
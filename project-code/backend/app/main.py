@@ -19,7 +19,7 @@ from app.api.v1 import (
     cards, card_functions,
     care_quality,
     config_versions, mappings,
-    export_api, websocket
+    export_api, websocket, realtime
 )
 from app.api import docs, docs_offline, docs_local
 
@@ -130,6 +130,7 @@ app.include_router(card_functions.router, prefix="/api/v1/card_functions", tags=
 app.include_router(care_quality.router, prefix="/api/v1/care-quality", tags=["Care Quality"])
 app.include_router(export_api.router, prefix="/api/v1/export", tags=["Export"])
 app.include_router(websocket.router, prefix="/api/v1/realtime", tags=["Realtime WebSocket"])
+app.include_router(realtime.router, prefix="/api/v1/realtime", tags=["Realtime WebSocket"])
 app.include_router(iot_data.router, prefix="/api/v1/iot-data", tags=["IoT Data"])
 # 自定义文档页面（使用国内CDN）
 app.include_router(docs.router)
@@ -166,6 +167,23 @@ async def startup_event():
     # 初始化存储目录
     from app.services.storage import init_storage
     init_storage()
+    # 启动IoT时序数据后台合并任务
+    from app.services.timeseries_store import get_timeseries_store
+    get_timeseries_store().start()
+    # 启动跌倒片段后台持久化任务
+    from app.services.fall_capture import get_fall_capture_service
+    get_fall_capture_service().start()
+    # 恢复待处理告警的计时器并启动告警调度
+    from app.services.alert_engine import get_alert_engine
+    from app.services.alert_scheduler import get_alert_scheduler
+    from app.services.notification_dispatcher import get_notification_dispatcher
+    get_notification_dispatcher().start()
+    restored = get_alert_engine().restore_timers()
+    get_alert_scheduler().start()
+    logger.info(f"Alert scheduler started ({restored} pending alerts restored)")
+    # 启动实时推送总线（多worker时连接跨进程背板）
+    from app.services.realtime_bus import get_realtime_bus
+    await get_realtime_bus().start()
     logger.success("Application started successfully")
 
 
@@ -174,6 +192,16 @@ async def startup_event():
 async def shutdown_event():
     logger.info("Shutting down application")
     # 清理资源
+    from app.services.timeseries_store import get_timeseries_store
+    await get_timeseries_store().stop()
+    from app.services.fall_capture import get_fall_capture_service
+    await get_fall_capture_service().stop()
+    from app.services.alert_scheduler import get_alert_scheduler
+    await get_alert_scheduler().stop()
+    from app.services.notification_dispatcher import get_notification_dispatcher
+    await get_notification_dispatcher().stop()
+    from app.services.realtime_bus import get_realtime_bus
+    await get_realtime_bus().stop()
     logger.success("Application shutdown complete")
 
 
@@ -21,7 +21,7 @@ class ConfigVersionBase(BaseModel):
     config_type: str = Field(
         ...,
         max_length=50,
-        description="配置类型：room_layout/device_config/cloud_alert_policy/iot_monitor_alert/device_installation"
+        description="配置类型：room_layout/device_config/cloud_alert_policy/iot_monitor_alert/device_installation/resident_placement"
     )
     entity_id: UUID = Field(..., description="实体ID（根据config_type指向不同表的ID）")
     current_entity_id: Optional[UUID] = Field(None, description="当前实体ID（可为NULL，表示实体已删除）")
@@ -38,7 +38,8 @@ class ConfigVersionBase(BaseModel):
             "device_config",
             "cloud_alert_policy",
             "iot_monitor_alert",
-            "device_installation"
+            "device_installation",
+            "resident_placement"
         ]
         if v not in allowed:
             raise ValueError(f"config_type must be one of {allowed}")
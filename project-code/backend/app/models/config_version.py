@@ -15,7 +15,7 @@ class ConfigVersionBase(BaseModel):
     """配置版本基础模型"""
     
     # 配置类型
-    config_type: str = Field(..., max_length=50, description="配置类型：room_layout/device_config/cloud_alert_policy/iot_monitor_alert/device_installation")
+    config_type: str = Field(..., max_length=50, description="配置类型：room_layout/device_config/cloud_alert_policy/iot_monitor_alert/device_installation/resident_placement")
     
     # 实体关联
     entity_id: UUID = Field(..., description="关联的实体ID")
@@ -39,7 +39,8 @@ class ConfigVersionBase(BaseModel):
             "device_config",
             "cloud_alert_policy",
             "iot_monitor_alert",
-            "device_installation"
+            "device_installation",
+            "resident_placement"
         ]
         if v not in allowed:
             raise ValueError(f"config_type must be one of {allowed}")
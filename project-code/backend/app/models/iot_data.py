@@ -58,6 +58,8 @@ class IOTTimeseriesBase(BaseModel):
     # 位置信息（冗余，加速查询）
     location_id: Optional[UUID] = Field(None, description="门牌号/地址")
     room_id: Optional[UUID] = Field(None, description="房间ID")
+    bed_id: Optional[UUID] = Field(None, description="床位ID（接入时按设备绑定关系填充）")
+    resident_id: Optional[UUID] = Field(None, description="住户ID（接入时按床位/位置绑定关系填充）")
     
     # 其他字段
     confidence: Optional[int] = Field(None, ge=0, le=100, description="置信度（0-100）")
@@ -165,7 +165,7 @@ class TDPEvent(BaseModel):
     """TDP事件数据报文"""
     
     mode: DatagramMode = Field(..., description="数据报文模式：LITE/EXTEND")
-    header: LiteEventHeader | ExtendEventHeader = Field(..., description="事件头")
+    header: ExtendEventHeader | LiteEventHeader = Field(..., description="事件头（EXTEND字段为LITE超集，优先按EXTEND解析以保留租户/位置信息）")
     
     # 数据内容
     person_matrices: Optional[List[PersonMatrix]] = Field(None, description="人员矩阵列表")
@@ -8,6 +8,7 @@
   * alert_levels: 接收的告警级别（L1/L2/L3等）
   * alert_channels: 接收通道（APP/EMAIL等）
   * alert_scope: 接收范围（ALL/LOCATION-TAG/ASSIGNED_ONLY）
+  * alert_silence: 个人静默时段（扩展字段，SilenceRule格式）
 
 用户告警配置用于告警路由和过滤。
 """
@@ -85,6 +86,10 @@ class UserBase(BaseModel):
     alert_channels: Optional[List[str]] = Field(None, description="接收的通道 ['APP', 'EMAIL']")
     alert_scope: Optional[str] = Field(None, max_length=20, description="接收范围: ALL, LOCATION-TAG, ASSIGNED_ONLY")
     tags: Optional[Dict[str, Any]] = Field(None, description="员工标签（如班次、分组）")
+    alert_silence: Optional[Dict[str, Any]] = Field(
+        None,
+        description="个人静默时段（SilenceRule格式: enabled/silence_hours/silence_days，可选timezone）"
+    )
     
     @field_validator("status")
     @classmethod
@@ -124,6 +129,7 @@ class UserUpdate(BaseModel):
     alert_channels: Optional[List[str]] = None
     alert_scope: Optional[str] = Field(None, max_length=20)
     tags: Optional[Dict[str, Any]] = None
+    alert_silence: Optional[Dict[str, Any]] = None
     password: Optional[str] = Field(None, min_length=8, description="新密码（将被哈希）")
     pin: Optional[str] = Field(None, min_length=4, max_length=6, description="新PIN码（将被哈希）")
 
@@ -9,6 +9,31 @@ from app.services.alert_engine import AlertEngine, get_alert_engine
 from app.services.card_manager import CardManager, get_card_manager
 from app.services.care_quality import CareQualityService, get_care_quality_service
 from app.services.baseline import BaselineService, get_baseline_service
+from app.services.zone_index import ZoneIndex, ZoneService, get_zone_service
+from app.services.timeseries_store import TimeseriesStore, get_timeseries_store
+from app.services.binding_index import BindingIndex, get_binding_index
+from app.services.fall_capture import FallCaptureService, get_fall_capture_service
+from app.services.alert_store import AlertStore, get_alert_store
+from app.services.policy_cache import CompiledPolicy, PolicyCache, get_policy_cache
+from app.services.alert_suppression import AlertSuppressor, get_alert_suppressor
+from app.services.alert_scheduler import AlertScheduler, TimerWheel, get_alert_scheduler
+from app.services.notification_dispatcher import (
+    NotificationDispatcher, ChannelAdapter, get_notification_dispatcher
+)
+from app.services.alert_routing import AlertRoutingIndex, get_alert_routing_index
+from app.services.silence_calendar import SilenceCalendar, get_silence_calendar
+from app.services.alert_coalescer import AlertCoalescer, get_alert_coalescer
+from app.services.alert_correlator import AlertCorrelator, get_alert_correlator
+from app.services.alert_metrics import AlertLatencyMetrics, LatencyHistogram
+from app.services.realtime_connection import RealtimeConnection
+from app.services.realtime_topics import SubscriptionIndex
+from app.services.realtime_backplane import Backplane, UnixSocketBackplane, BackplaneBroker
+from app.services.realtime_delta import LiveStateCoalescer
+from app.services.realtime_binary import StringTable, get_string_table
+from app.services.realtime_replay import ReplayBuffer
+from app.services.realtime_session import RealtimeSession
+from app.services.realtime_heartbeat import HeartbeatScheduler
+from app.services.realtime_bus import RealtimeBus, get_realtime_bus
 
 __all__ = [
     "StorageService",
@@ -25,4 +50,49 @@ __all__ = [
     "get_care_quality_service",
     "BaselineService",
     "get_baseline_service",
+    "ZoneIndex",
+    "ZoneService",
+    "get_zone_service",
+    "TimeseriesStore",
+    "get_timeseries_store",
+    "BindingIndex",
+    "get_binding_index",
+    "FallCaptureService",
+    "get_fall_capture_service",
+    "AlertStore",
+    "get_alert_store",
+    "CompiledPolicy",
+    "PolicyCache",
+    "get_policy_cache",
+    "AlertSuppressor",
+    "get_alert_suppressor",
+    "AlertScheduler",
+    "TimerWheel",
+    "get_alert_scheduler",
+    "NotificationDispatcher",
+    "ChannelAdapter",
+    "get_notification_dispatcher",
+    "AlertRoutingIndex",
+    "get_alert_routing_index",
+    "SilenceCalendar",
+    "get_silence_calendar",
+    "AlertCoalescer",
+    "get_alert_coalescer",
+    "AlertCorrelator",
+    "get_alert_correlator",
+    "AlertLatencyMetrics",
+    "LatencyHistogram",
+    "RealtimeConnection",
+    "SubscriptionIndex",
+    "RealtimeBus",
+    "get_realtime_bus",
+    "Backplane",
+    "UnixSocketBackplane",
+    "BackplaneBroker",
+    "LiveStateCoalescer",
+    "StringTable",
+    "get_string_table",
+    "ReplayBuffer",
+    "RealtimeSession",
+    "HeartbeatScheduler",
 ]
@@ -0,0 +1,194 @@
+"""
+告警风暴合并 - 按接收者合并同类告警为摘要通知
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 通知规则（immediate / repeat_interval_sec）；L1紧急告警必须立即送达
+- models/alert_policy.py - NotificationRule
+
+设计说明：
+- 合并键：(tenant_id, 接收者, alert_type)，例如网络抖动时同一楼栋的大量 OfflineAlarm
+- 前沿立即发送：键上没有打开的合并窗口时，告警立即发给该接收者并打开窗口
+  （窗口长度 alert_coalesce_window_sec）；窗口内的后续告警只记入待发摘要
+- 窗口到期（由 alert_scheduler 时间轮回调 flush）：有待发告警则发送一条摘要通知
+  （数量、最高级别、最多 alert_digest_max_items 条精简列表）并顺延一个窗口；
+  没有待发告警则关闭窗口
+- L1告警不参与合并，也不打开窗口；WEB通道是看板广播而非按接收者发送，始终逐条立即推送
+- 窗口长度为0时关闭合并
+"""
+
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from uuid import uuid4
+from datetime import datetime
+import threading
+import time
+
+from app.config import settings
+from app.services.policy_cache import max_level
+
+# 合并键在时间轮中的动作名
+DIGEST_ACTION = "digest"
+_DIGEST_PREFIX = "digest:"
+
+# 摘要消息中的告警类型名称（未列出的类型直接使用类型名）
+_ALERT_TYPE_NAMES = {"fall": "跌倒", "vital_signs": "生命体征异常"}
+
+
+class _Window:
+    """单个合并键的窗口状态"""
+
+    __slots__ = ("key", "pending", "count", "level", "channels")
+
+    def __init__(self, key: Tuple[str, str, str]):
+        self.key = key
+        self.pending: List[Dict[str, Any]] = []
+        self.count = 0
+        self.level: Optional[str] = None
+        self.channels: List[str] = []
+
+    def add(self, alert_record: Dict[str, Any], channels: List[str], max_items: int) -> None:
+        self.count += 1
+        self.level = max_level(self.level, alert_record.get("alert_level")) or self.level
+        for channel in channels:
+            if channel not in self.channels:
+                self.channels.append(channel)
+        if len(self.pending) < max_items:
+            self.pending.append({
+                "alert_id": alert_record.get("alert_id"),
+                "alert_level": alert_record.get("alert_level"),
+                "device_id": alert_record.get("device_id"),
+                "resident_id": alert_record.get("resident_id"),
+                "location_id": alert_record.get("location_id"),
+                "timestamp": alert_record.get("timestamp"),
+            })
+
+
+class AlertCoalescer:
+    """告警风暴合并器"""
+
+    def __init__(self, window_sec: Optional[float] = None, max_items: Optional[int] = None):
+        """
+        初始化合并器
+
+        Args:
+            window_sec: 合并窗口（秒，缺省取配置）
+            max_items: 摘要中精简列表的最大条数（缺省取配置）
+        """
+        self.window_sec = settings.alert_coalesce_window_sec if window_sec is None else window_sec
+        self.max_items = settings.alert_digest_max_items if max_items is None else max_items
+        self._lock = threading.Lock()
+        self._windows: Dict[str, _Window] = {}
+        # schedule(key, action, deadline) —— 由AlertEngine注入告警调度器
+        self._schedule: Optional[Callable[[str, str, float], None]] = None
+        self._stats = {"immediate": 0, "coalesced": 0, "digests": 0, "bypassed": 0}
+
+    def set_scheduler(self, schedule: Callable[[str, str, float], None]) -> None:
+        """注册窗口到期计时函数 schedule(key, action, deadline_epoch)"""
+        self._schedule = schedule
+
+    @staticmethod
+    def is_digest_key(key: str) -> bool:
+        """判断计时器键是否为合并窗口"""
+        return key.startswith(_DIGEST_PREFIX)
+
+    def offer(self, alert_record: Dict[str, Any], channels: List[str],
+              recipients: List[str]) -> List[Tuple[List[str], List[str]]]:
+        """
+        提交一条待发送的告警
+
+        Args:
+            alert_record: 告警记录
+            channels: 发送通道
+            recipients: 接收者
+
+        Returns:
+            需要立即发送的 (通道, 接收者) 列表；其余部分已记入合并窗口
+        """
+        if not self.window_sec or alert_record.get("alert_level") == "L1" or not recipients:
+            self._stats["bypassed"] += 1
+            return [(channels, recipients)] if channels else []
+
+        direct = [c for c in channels if c != "WEB"]
+        sends: List[Tuple[List[str], List[str]]] = []
+        if "WEB" in channels:
+            sends.append((["WEB"], recipients))
+        if not direct:
+            return sends
+
+        tenant_id = str(alert_record.get("tenant_id"))
+        alert_type = alert_record.get("alert_type", "Unknown")
+        immediate: List[str] = []
+        deadline = time.time() + self.window_sec
+        with self._lock:
+            for recipient in recipients:
+                key = f"{_DIGEST_PREFIX}{tenant_id}:{recipient}:{alert_type}"
+                window = self._windows.get(key)
+                if window is None:
+                    self._windows[key] = _Window((tenant_id, recipient, alert_type))
+                    immediate.append(recipient)
+                    if self._schedule:
+                        self._schedule(key, DIGEST_ACTION, deadline)
+                else:
+                    window.add(alert_record, direct, self.max_items)
+                    self._stats["coalesced"] += 1
+        if immediate:
+            self._stats["immediate"] += 1
+            sends.append((direct, immediate))
+        return sends
+
+    def flush(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        合并窗口到期
+
+        Args:
+            key: 合并键
+
+        Returns:
+            摘要通知记录（recipients/channels已填好）；窗口内没有新告警时返回None并关闭窗口
+        """
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                return None
+            if not window.count:
+                del self._windows[key]
+                return None
+            self._windows[key] = _Window(window.key)
+        if self._schedule:
+            self._schedule(key, DIGEST_ACTION, time.time() + self.window_sec)
+
+        tenant_id, recipient, alert_type = window.key
+        self._stats["digests"] += 1
+        return {
+            "alert_id": str(uuid4()),
+            "tenant_id": tenant_id,
+            "alert_type": alert_type,
+            "alert_level": window.level or "L2",
+            "message": f"近{int(self.window_sec)}秒内另有{window.count}条"
+                       f"{_ALERT_TYPE_NAMES.get(alert_type, alert_type)}告警",
+            "timestamp": datetime.utcnow(),
+            "digest": True,
+            "count": window.count,
+            "alerts": window.pending,
+            "truncated": window.count > len(window.pending),
+            "recipients": [recipient],
+            "channels": window.channels,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        return {
+            **self._stats,
+            "open_windows": len(self._windows),
+            "window_sec": self.window_sec,
+        }
+
+
+# 全局单例
+_alert_coalescer = None
+
+def get_alert_coalescer() -> AlertCoalescer:
+    """获取告警风暴合并器单例"""
+    global _alert_coalescer
+    if _alert_coalescer is None:
+        _alert_coalescer = AlertCoalescer()
+    return _alert_coalescer
@@ -0,0 +1,140 @@
+"""
+跨设备告警关联 - 按住户将多设备告警合并为一个事件
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 告警级别确定规则：max(云端级别, IoT级别)
+- 11_devices.sql / 06_beds.sql - 设备绑定（设备 → 床位 → 住户，见binding_index）
+
+设计说明：
+- 关联键：(tenant_id, resident_id)，住户来自设备绑定（AlertEngine在抑制前已补全）；
+  没有住户的告警不参与关联
+- 同一住户在滑动窗口（alert_correlation_window_sec）内的告警合并到同一个事件：
+  第一条告警正常创建为事件，之后的告警只追加为事件的来源事件（source_events），
+  事件级别取 max(事件级别, 新告警级别)；窗口从最近一条告警起算
+- 打开的事件按最近活动时间存放在 OrderedDict 中，每次关联时从队首弹出已过期的键，
+  查找、刷新和过期清理都是均摊 O(1)，不需要后台任务
+- 事件已被确认/解决时不再合并，由AlertEngine开启新的事件
+- 窗口长度为0时关闭关联
+"""
+
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from uuid import UUID
+import threading
+import time
+
+from app.config import settings
+
+
+class AlertCorrelator:
+    """住户级告警关联器"""
+
+    def __init__(self, window_sec: Optional[float] = None, max_events: Optional[int] = None):
+        """
+        初始化关联器
+
+        Args:
+            window_sec: 滑动窗口（秒，缺省取配置）
+            max_events: 事件中保留的来源事件最大条数（缺省取配置）
+        """
+        self.window_sec = settings.alert_correlation_window_sec if window_sec is None else window_sec
+        self.max_events = settings.alert_correlation_max_events if max_events is None else max_events
+        self._lock = threading.Lock()
+        # (tenant_id, resident_id) -> (事件告警ID, 窗口截止时间)，按最近活动排序
+        self._open: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self._stats = {"incidents": 0, "merged": 0, "expired": 0}
+
+    @staticmethod
+    def source_event(alert: Dict[str, Any], alert_type: str, alert_level: str) -> Dict[str, Any]:
+        """
+        生成事件中记录的来源事件
+
+        Args:
+            alert: 原始告警数据（已补全设备绑定）
+            alert_type: 告警类型
+            alert_level: 该告警计算出的级别
+
+        Returns:
+            来源事件
+        """
+        return {
+            "alert_type": alert_type,
+            "alert_level": alert_level,
+            "device_id": alert.get("device_id"),
+            "timestamp": alert.get("timestamp"),
+            "data": alert,
+        }
+
+    def lookup(self, tenant_id: UUID | str, resident_id: Optional[UUID | str],
+               now: Optional[float] = None) -> Optional[str]:
+        """
+        查找住户当前打开的事件
+
+        Args:
+            tenant_id: 租户ID
+            resident_id: 住户ID
+            now: 当前时间（epoch秒，默认取系统时间）
+
+        Returns:
+            事件的告警ID，没有打开的事件时返回None
+        """
+        if not self.window_sec or not resident_id:
+            return None
+        now = time.time() if now is None else now
+        key = (str(tenant_id), str(resident_id))
+        with self._lock:
+            self._expire(now)
+            entry = self._open.get(key)
+            return entry[0] if entry else None
+
+    def touch(self, tenant_id: UUID | str, resident_id: Optional[UUID | str],
+              alert_id: str, now: Optional[float] = None) -> None:
+        """
+        打开或延长住户的事件窗口
+
+        Args:
+            tenant_id: 租户ID
+            resident_id: 住户ID
+            alert_id: 事件的告警ID
+            now: 当前时间（epoch秒，默认取系统时间）
+        """
+        if not self.window_sec or not resident_id:
+            return
+        now = time.time() if now is None else now
+        key = (str(tenant_id), str(resident_id))
+        with self._lock:
+            entry = self._open.get(key)
+            if entry is not None and entry[0] == alert_id:
+                self._stats["merged"] += 1
+            else:
+                self._stats["incidents"] += 1
+            self._open[key] = (alert_id, now + self.window_sec)
+            self._open.move_to_end(key)
+
+    def _expire(self, now: float) -> None:
+        """弹出队首已过期的窗口（调用方持有锁）"""
+        while self._open:
+            key, (_, deadline) = next(iter(self._open.items()))
+            if deadline > now:
+                break
+            del self._open[key]
+            self._stats["expired"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取关联统计"""
+        return {
+            **self._stats,
+            "open_incidents": len(self._open),
+            "window_sec": self.window_sec,
+        }
+
+
+# 全局单例
+_alert_correlator = None
+
+def get_alert_correlator() -> AlertCorrelator:
+    """获取告警关联器单例"""
+    global _alert_correlator
+    if _alert_correlator is None:
+        _alert_correlator = AlertCorrelator()
+    return _alert_correlator
@@ -12,18 +12,39 @@
 
 核心功能：
 1. 告警级别计算：最终级别 = max(云端级别, IoT级别)
-2. 告警路由：根据卡片类型和位置特征决定接收者
+2. 告警路由：根据卡片类型和位置特征决定接收者（预先解析的路由索引，见alert_routing）
 3. 用户过滤：根据用户配置过滤接收者
-4. 升级机制：超时自动升级告警级别
-5. 抑制机制：避免重复告警（静默期）
+4. 升级机制：超时自动升级告警级别、按间隔重复通知、L5确认计时（见alert_scheduler）
+5. 抑制机制：避免重复告警（重复抑制期 + 每小时上限，见alert_suppression）
+6. 静默机制：租户/个人静默时段按预编译周位图判定（见silence_calendar）
+7. 风暴合并：同一接收者的同类告警在窗口内合并为摘要通知（见alert_coalescer）
+8. 跨设备关联：同一住户短时间内的多设备告警合并为一个事件，级别取最高（见alert_correlator）；
+   每次合并都推送 alert_update，级别提高时才重新通知
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from uuid import UUID, uuid4
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.models.alert import CloudAlertPolicy, AlertLevel, DangerLevel
-from app.services.storage import StorageService
+from app.services.alert_store import get_alert_store
+from app.services.policy_cache import CompiledPolicy, get_policy_cache, max_level
+from app.services.binding_index import get_binding_index
+from app.services.alert_routing import get_alert_routing_index
+from app.services.silence_calendar import get_silence_calendar
+from app.services.alert_coalescer import get_alert_coalescer
+from app.services.alert_correlator import get_alert_correlator
+from app.services.alert_suppression import get_alert_suppressor
+from app.services.alert_scheduler import get_alert_scheduler
+from app.services.notification_dispatcher import get_notification_dispatcher
+from app.services.timeseries_store import normalize_timestamp
+from app.services.realtime_bus import push_alert_update
+from app.config import settings
+
+
+def _epoch(timestamp: datetime | str) -> float:
+    """告警时间戳（UTC）转epoch秒"""
+    return datetime.fromisoformat(normalize_timestamp(timestamp)).replace(tzinfo=timezone.utc).timestamp()
 
 
 class AlertEngine:
@@ -31,8 +52,17 @@ class AlertEngine:
     
     def __init__(self):
         """初始化告警引擎"""
-        self.policy_storage = StorageService(collection="cloud_alert_policies")
-        self.alert_history: List[Dict[str, Any]] = []
+        self.policy_cache = get_policy_cache()
+        self.alert_store = get_alert_store()
+        self.suppressor = get_alert_suppressor()
+        self.scheduler = get_alert_scheduler()
+        self.scheduler.set_handler(self.handle_timer)
+        self.dispatcher = get_notification_dispatcher()
+        self.routing_index = get_alert_routing_index()
+        self.silence = get_silence_calendar()
+        self.coalescer = get_alert_coalescer()
+        self.coalescer.set_scheduler(self.scheduler.schedule)
+        self.correlator = get_alert_correlator()
     
     def process_alert(self, alert: Dict[str, Any], tenant_id: UUID) -> Dict[str, Any]:
         """
@@ -43,17 +73,62 @@ class AlertEngine:
             tenant_id: 租户ID
             
         Returns:
-            处理结果
+            告警记录；被抑制时返回 {"status": "suppressed", "reason": ...}，不保存也不发送；
+            合并到住户已打开的事件时返回更新后的事件记录
         """
-        # 获取租户的告警策略
-        policy = self.policy_storage.find_by_id("tenant_id", tenant_id)
+        # 获取租户的告警策略（编译缓存，不读磁盘）
+        policy = self.policy_cache.get(tenant_id)
         
-        # 确定告警级别
-        danger_level = alert.get("danger_level", "L2")
+        # 确定告警级别：max(云端级别, IoT级别)
         alert_type = alert.get("type", "Unknown")
+        danger_level = self._determine_level(alert, policy)
+        device_id = alert.get("device_id")
+        if danger_level is None:
+            # 策略禁用该报警类型，或生理指标在租户阈值的正常范围内
+            return {
+                "status": "suppressed",
+                "reason": "disabled_by_policy",
+                "tenant_id": str(tenant_id),
+                "alert_type": alert_type,
+                "alert_level": None,
+                "device_id": device_id,
+                "resident_id": alert.get("resident_id")
+            }
+        
+        # 补全设备绑定的住户/位置（用于路由和告警查询）
+        binding = get_binding_index().resolve(device_id) if device_id else None
+        if binding:
+            alert = {
+                **{k: v for k, v in binding.items() if v is not None},
+                **{k: v for k, v in alert.items() if v is not None}
+            }
+        
+        # 重复抑制与每小时上限
+        reason = self.suppressor.check(
+            tenant_id, alert, alert_type, danger_level,
+            policy.suppression if policy else None
+        )
+        if reason:
+            return {
+                "status": "suppressed",
+                "reason": reason,
+                "tenant_id": str(tenant_id),
+                "alert_type": alert_type,
+                "alert_level": danger_level,
+                "device_id": device_id,
+                "resident_id": alert.get("resident_id")
+            }
+        
+        # 跨设备关联：同一住户窗口内的告警合并到已打开的事件
+        resident_id = alert.get("resident_id")
+        incident_id = self.correlator.lookup(tenant_id, resident_id)
+        if incident_id:
+            incident = self._merge_into_incident(incident_id, alert, alert_type, danger_level, policy)
+            if incident:
+                return incident
         
         # 确定告警路由
-        recipients = self._determine_recipients(alert, policy)
+        recipients = self._determine_recipients(alert, policy, tenant_id, danger_level)
         
         # 确定发送通道
         channels = self._determine_channels(danger_level, policy)
@@ -63,24 +138,270 @@ class AlertEngine:
             "alert_id": str(uuid4()),
             "tenant_id": str(tenant_id),
             "alert_type": alert_type,
-            "danger_level": danger_level,
-            "timestamp": datetime.utcnow().isoformat(),
+            "alert_level": danger_level,
+            "message": self._build_message(alert, alert_type),
+            "resident_id": alert.get("resident_id"),
+            "device_id": device_id,
+            "location_id": alert.get("location_id"),
+            "bed_id": alert.get("bed_id"),
+            "team_tags": list(self.routing_index.team_tags(tenant_id, alert.get("resident_id"))),
+            "timestamp": alert.get("timestamp") or datetime.utcnow(),
             "data": alert,
+            "source_events": [self.correlator.source_event(alert, alert_type, danger_level)],
+            "event_count": 1,
+            "alert_types": [alert_type],
             "recipients": recipients,
             "channels": channels,
-            "status": "pending"
+            "status": "pending",
+            "escalation_level": 0,
+            "auto_escalate": True
         }
         
-        # 保存告警历史
-        self.alert_history.append(alert_record)
+        # 持久化告警
+        alert_record = self.alert_store.add(alert_record)
+        self.correlator.touch(tenant_id, resident_id, alert_record["alert_id"])
         
         # 发送告警
         self._send_alert(alert_record)
         
+        # 登记升级/重复通知/确认超时计时器
+        self._schedule_timers(alert_record, policy)
+        
         return alert_record
     
-    def _determine_recipients(self, alert: Dict[str, Any], policy: Optional[Dict]) -> List[str]:
-        """确定告警接收者"""
+    def _merge_into_incident(self, incident_id: str, alert: Dict[str, Any], alert_type: str,
+                             danger_level: str, policy: Optional[CompiledPolicy]) -> Optional[Dict[str, Any]]:
+        """
+        将告警合并到住户已打开的事件
+        
+        事件级别取 max(事件级别, 新告警级别)；每次合并都向实时订阅者推送 alert_update，
+        级别提高时按新级别重新确定通道和接收者并重新发送，否则只追加来源事件，不重复通知
+        
+        Args:
+            incident_id: 事件的告警ID
+            alert: 告警数据（已补全设备绑定）
+            alert_type: 告警类型
+            danger_level: 新告警的级别
+            policy: 租户策略
+            
+        Returns:
+            更新后的事件记录；事件已确认/解决时返回None（由调用方创建新事件）
+        """
+        incident = self.alert_store.get(incident_id)
+        if not incident or incident.get("status") != "pending":
+            return None
+        tenant_id = incident["tenant_id"]
+        
+        events = list(incident.get("source_events") or [])
+        if len(events) < self.correlator.max_events:
+            events.append(self.correlator.source_event(alert, alert_type, danger_level))
+        alert_types = list(incident.get("alert_types") or [incident.get("alert_type")])
+        if alert_type not in alert_types:
+            alert_types.append(alert_type)
+        updates: Dict[str, Any] = {
+            "source_events": events,
+            "event_count": (incident.get("event_count") or 1) + 1,
+            "alert_types": alert_types
+        }
+        
+        level = incident.get("alert_level")
+        new_level = max_level(level, danger_level) or level
+        raised = new_level != level
+        if raised:
+            updates.update({
+                "alert_level": new_level,
+                "message": self._build_message(alert, alert_type),
+                "channels": self._determine_channels(new_level, policy),
+                "recipients": self._determine_recipients(alert, policy, tenant_id, new_level),
+                "last_notified_at": normalize_timestamp(datetime.utcnow()),
+                "notify_count": (incident.get("notify_count") or 0) + 1
+            })
+        
+        record = self.alert_store.update(incident_id, updates)
+        self.correlator.touch(tenant_id, alert.get("resident_id"), incident_id)
+        print(f"[AlertEngine] Correlated {alert_type} ({danger_level}) into incident {incident_id} "
+              f"({record['event_count']} events, level {record['alert_level']})")
+        push_alert_update(record)
+        if raised:
+            self._send_alert(record)
+            self._schedule_timers(record, policy)
+        return record
+    
+    def handle_timer(self, alert_id: str, action: str) -> None:
+        """
+        处理告警计时器到期（由alert_scheduler回调）
+        
+        动作：
+        - escalate: 升级到策略中的escalate_to_level并重新发送
+        - renotify: 按notification_rules的repeat_interval_sec重复通知
+        - confirmation_timeout: L5本地确认超时（30秒），重新通知
+        - server_override_expired: L5服务端否决窗口结束（50秒），只做记录
+        - secondary_timeout: L5二次确认超时（150秒）仍未确认，升级为L2
+        - digest: 告警风暴合并窗口到期，发送摘要通知（alert_id为合并键）
+        
+        Args:
+            alert_id: 告警ID
+            action: 动作名
+        """
+        if self.coalescer.is_digest_key(alert_id):
+            self._send_digest(alert_id)
+            return
+        record = self.alert_store.get(alert_id)
+        if not record or record.get("status") != "pending":
+            return
+        policy = self.policy_cache.get(record["tenant_id"])
+        level = record.get("alert_level")
+        now = normalize_timestamp(datetime.utcnow())
+        
+        new_level = None
+        if action == "escalate" and policy and policy.escalation:
+            target = policy.escalation.escalate_to_level
+            new_level = max_level(getattr(target, "value", target), level)
+        elif action == "secondary_timeout":
+            new_level = max_level("L2", level)
+        
+        resend = action != "server_override_expired"
+        updates: Dict[str, Any] = {}
+        if new_level and new_level != level:
+            updates.update({
+                "alert_level": new_level,
+                "escalation_level": (record.get("escalation_level") or 0) + 1,
+                "escalated_at": now,
+                "channels": self._determine_channels(new_level, policy),
+                "recipients": self._determine_recipients(record, policy, record["tenant_id"], new_level)
+            })
+        if action == "confirmation_timeout":
+            updates["confirmation_timeout_at"] = now
+        elif action == "server_override_expired":
+            updates["server_override_expired_at"] = now
+        elif action == "secondary_timeout":
+            updates["secondary_timeout_at"] = now
+        if resend:
+            updates["last_notified_at"] = now
+            updates["notify_count"] = (record.get("notify_count") or 0) + 1
+        
+        record = self.alert_store.update(alert_id, updates)
+        print(f"[AlertEngine] Timer {action} fired for alert {alert_id} (level {record.get('alert_level')})")
+        if resend:
+            self._send_alert(record)
+        self._schedule_timers(record, policy)
+    
+    def restore_timers(self) -> int:
+        """
+        根据告警存储中的待处理告警重新登记计时器（启动时调用）
+        
+        Returns:
+            恢复的告警数量
+        """
+        pending = self.alert_store.find_by_status("pending")
+        for record in pending:
+            self._schedule_timers(record, self.policy_cache.get(record["tenant_id"]))
+        return len(pending)
+    
+    def _schedule_timers(self, alert_record: Dict[str, Any], policy: Optional[CompiledPolicy]) -> None:
+        """登记待处理告警的计时器（已到期的动作在下一个刻度触发）"""
+        alert_id = alert_record["alert_id"]
+        level = alert_record.get("alert_level")
+        created = _epoch(alert_record["timestamp"])
+        
+        # L5：30秒本地确认 / 50秒服务端否决窗口 / 150秒二次确认
+        if level == "L5":
+            if not alert_record.get("confirmation_timeout_at"):
+                self.scheduler.schedule(alert_id, "confirmation_timeout",
+                                        created + settings.alert_confirmation_timeout_l5)
+            if not alert_record.get("server_override_expired_at"):
+                self.scheduler.schedule(alert_id, "server_override_expired",
+                                        created + settings.alert_server_override_timeout)
+            if not alert_record.get("secondary_timeout_at"):
+                self.scheduler.schedule(alert_id, "secondary_timeout",
+                                        created + settings.alert_secondary_timeout_l5)
+        
+        if not policy:
+            return
+        
+        escalation = policy.escalation
+        if (escalation and escalation.enabled and alert_record.get("auto_escalate", True)
+                and (alert_record.get("escalation_level") or 0) < 3):
+            target = getattr(escalation.escalate_to_level, "value", escalation.escalate_to_level)
+            if max_level(target, level) != level:
+                base = _epoch(alert_record.get("escalated_at") or alert_record["timestamp"])
+                self.scheduler.schedule(alert_id, "escalate", base + escalation.escalate_after_sec)
+        
+        rule = policy.notification_rules.get(level) or {}
+        interval = rule.get("repeat_interval_sec")
+        if interval:
+            base = _epoch(alert_record.get("last_notified_at") or alert_record["timestamp"])
+            self.scheduler.schedule(alert_id, "renotify", base + interval)
+    
+    def _build_message(self, alert: Dict[str, Any], alert_type: str) -> str:
+        """生成告警消息"""
+        if alert.get("message"):
+            return alert["message"]
+        if alert_type == "fall":
+            posture = alert.get("posture") or {}
+            return f"检测到跌倒：{posture.get('display', 'Fall')}"
+        if alert_type == "vital_signs":
+            displays = [ab.get("display", "") for ab in alert.get("abnormalities", [])]
+            return f"生命体征异常：{'、'.join(d for d in displays if d) or '未知'}"
+        return f"{alert_type}告警"
+    
+    def _determine_level(self, alert: Dict[str, Any], policy: Optional[CompiledPolicy]) -> Optional[str]:
+        """
+        确定告警级别（云端策略中配置的级别与IoT上报级别取更严重者）
+        
+        生理指标告警：租户配置了阈值的指标按租户阈值分级（替代设备端评估），
+        未配置阈值的指标沿用IoT上报级别
+        
+        Returns:
+            告警级别；策略将所有相关报警类型设为DISABLE，
+            或所有指标都在租户阈值的正常范围内时返回None（不产生告警）
+        """
+        iot_level = alert.get("danger_level", "L2")
+        if not policy:
+            return iot_level
+        
+        policy_types = []
+        device_level = iot_level
+        if alert.get("type") == "fall":
+            code = (alert.get("posture") or {}).get("code")
+            policy_types.append("Fall" if code == "1912002" else "SuspectedFall")
+        elif alert.get("type") == "vital_signs":
+            vital_levels = []
+            all_classified = True
+            for vital_type, policy_type in (("heart_rate", "Radar_AbnormalHeartRate"),
+                                            ("respiratory_rate", "Radar_AbnormalRespiratoryRate")):
+                value = alert.get(vital_type)
+                if value is None:
+                    continue
+                policy_types.append(policy_type)
+                if vital_type in policy.vital_thresholds:
+                    classified = policy.classify_vital(vital_type, value)
+                    if classified:
+                        vital_levels.append(classified[0])
+                else:
+                    all_classified = False
+            device_level = max_level(*vital_levels) if all_classified else max_level(iot_level, *vital_levels)
+            if device_level is None:
+                return None
+        
+        configured = [policy.level_for(t) for t in policy_types]
+        if configured and all(level == "DISABLE" for level in configured):
+            return None
+        cloud_level = max_level(*configured)
+        return max_level(cloud_level, device_level) or device_level
+    
+    def _determine_recipients(self, alert: Dict[str, Any], policy: Optional[CompiledPolicy],
+                              tenant_id: UUID, danger_level: str) -> List[str]:
+        """
+        确定告警接收者
+        
+        优先按卡片路由（路由索引中预先解析并按alert_levels/alert_scope过滤的用户），
+        告警未关联卡片或卡片无可用接收者时回退到租户策略的接收范围
+        """
+        routed = self.routing_index.route(tenant_id, alert, danger_level)
+        if routed:
+            return [f"user_{uid}" for uid in routed]
+        
         recipients = []
         
         if not policy:
@@ -88,9 +409,9 @@ class AlertEngine:
             return ["admin@example.com"]
         
         # 根据告警接收范围确定接收者
-        alert_scope = policy.get("alert_scope", "NURSE_ONLY")
-        alert_user_ids = policy.get("alert_user_ids", [])
-        alert_tags = policy.get("alert_tags", [])
+        alert_scope = policy.alert_scope
+        alert_user_ids = policy.alert_user_ids
+        alert_tags = policy.alert_tags
         
         # 从alert_user_ids获取用户
         if alert_user_ids:
@@ -116,8 +437,10 @@ class AlertEngine:
         
         return recipients if recipients else ["admin@example.com"]
     
-    def _determine_channels(self, danger_level: str, policy: Optional[Dict]) -> List[str]:
-        """确定发送通道"""
+    def _determine_channels(self, danger_level: str, policy: Optional[CompiledPolicy]) -> List[str]:
+        """确定发送通道（策略notification_rules中未配置时使用默认通道）"""
+        if policy:
+            return policy.channels_for(danger_level)
         if danger_level == "L1":
             return ["WEB", "APP", "PHONE", "EMAIL"]
         else:
@@ -125,132 +448,66 @@ class AlertEngine:
     
     def _send_alert(self, alert_record: Dict[str, Any]) -> None:
         """
-        发送告警
+        发送告警（提交到通知分发器，按通道异步发送）
         
-        实现多通道告警发送逻辑：
         - WEB: 网页推送（WebSocket）
         - APP: 移动应用推送
         - PHONE: 电话呼叫
         - EMAIL: 邮件通知
+        
+        静默时段（L1除外）：租户静默时只保留WEB通道，个人静默的用户不接收本次通知
         """
         channels = alert_record.get("channels", [])
         recipients = alert_record.get("recipients", [])
         alert_level = alert_record.get("alert_level", "INFO")
         alert_type = alert_record.get("alert_type", "GENERAL")
         message = alert_record.get("message", "")
-        tenant_id = alert_record.get("tenant_id")
+        
+        if alert_level != "L1":
+            channels, recipients = self._apply_silence(alert_record, channels, recipients)
         
         # 记录发送日志
         print(f"[AlertEngine] Sending alert via {channels} to {recipients}")
         print(f"[AlertEngine] Level: {alert_level}, Type: {alert_type}, Message: {message}")
         
-        # 实际发送实现
-        for channel in channels:
-            try:
-                if channel == "WEB":
-                    self._send_websocket(tenant_id, alert_type, alert_level, alert_record)
-                elif channel == "APP":
-                    self._send_push_notification(recipients, alert_level, message)
-                elif channel == "PHONE":
-                    self._make_phone_call(recipients, alert_level, message)
-                elif channel == "EMAIL":
-                    self._send_email(recipients, alert_level, message)
-                else:
-                    print(f"[AlertEngine] Unknown channel: {channel}")
-            except Exception as e:
-                print(f"[AlertEngine] Error sending via {channel}: {e}")
-    
-    def _send_websocket(self, tenant_id: str, alert_type: str, alert_level: str, alert_data: Dict[str, Any]) -> None:
-        """
-        通过WebSocket发送告警
-        
-        Args:
-            tenant_id: 租户ID
-            alert_type: 告警类型
-            alert_level: 告警级别
-            alert_data: 告警数据
-        """
-        try:
-            # 导入realtime模块并调用push_alert
-            import asyncio
-            from app.api.v1 import realtime
-            
-            # 创建异步任务推送告警
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(
-                realtime.push_alert(tenant_id, alert_type, alert_level, alert_data)
-            )
-            loop.close()
-            
-            print(f"[AlertEngine] WebSocket alert sent to tenant {tenant_id}")
-        except Exception as e:
-            print(f"[AlertEngine] WebSocket send error: {e}")
-    
-    def _send_push_notification(self, recipients: List[str], alert_level: str, message: str) -> None:
-        """
-        发送移动应用推送通知
-        
-        Args:
-            recipients: 接收者列表
-            alert_level: 告警级别
-            message: 告警消息
-            
-        Note:
-            实际实现需要集成FCM（Firebase Cloud Messaging）或APNs（Apple Push Notification service）
-        """
-        print(f"[AlertEngine] APP Push: {alert_level} to {recipients}")
-        print(f"[AlertEngine] Message: {message}")
-        # 实际实现示例：
-        # from firebase_admin import messaging
-        # notification = messaging.Notification(title=f"Alert - {alert_level}", body=message)
-        # messaging.send(notification, tokens=recipients)
+        # 同类告警按接收者合并（L1与WEB通道立即发送）
+        for send_channels, send_recipients in self.coalescer.offer(alert_record, channels, recipients):
+            self.dispatcher.submit(alert_record, channels=send_channels, recipients=send_recipients)
     
-    def _make_phone_call(self, recipients: List[str], alert_level: str, message: str) -> None:
-        """
-        拨打电话告警
-        
-        Args:
-            recipients: 接收者电话号码列表
-            alert_level: 告警级别
-            message: 告警消息
-            
-        Note:
-            实际实现需要集成Twilio或类似的电话服务
-        """
-        print(f"[AlertEngine] Phone Call: {alert_level} to {recipients}")
-        print(f"[AlertEngine] Message: {message}")
-        # 实际实现示例：
-        # from twilio.rest import Client
-        # client = Client(account_sid, auth_token)
-        # for phone in recipients:
-        #     call = client.calls.create(to=phone, from_=from_phone, twiml=f"<Response><Say>{message}</Say></Response>")
+    def _send_digest(self, key: str) -> None:
+        """发送合并窗口内累积的告警摘要"""
+        digest = self.coalescer.flush(key)
+        if not digest:
+            return
+        channels, recipients = self._apply_silence(digest, digest["channels"], digest["recipients"])
+        print(f"[AlertEngine] Sending digest of {digest['count']} {digest['alert_type']} alerts "
+              f"via {channels} to {recipients}")
+        if channels and recipients:
+            self.dispatcher.submit(digest, channels=channels, recipients=recipients)
     
-    def _send_email(self, recipients: List[str], alert_level: str, message: str) -> None:
-        """
-        发送邮件告警
-        
-        Args:
-            recipients: 接收者邮箱列表
-            alert_level: 告警级别
-            message: 告警消息
-            
-        Note:
-            实际实现需要配置SMTP服务器
-        """
-        print(f"[AlertEngine] Email: {alert_level} to {recipients}")
-        print(f"[AlertEngine] Message: {message}")
-        # 实际实现示例：
-        # import smtplib
-        # from email.mime.text import MIMEText
-        # msg = MIMEText(message)
-        # msg['Subject'] = f'Alert - {alert_level}'
-        # msg['From'] = from_email
-        # msg['To'] = ', '.join(recipients)
-        # with smtplib.SMTP(smtp_server, smtp_port) as server:
-        #     server.send_message(msg)
+    def _apply_silence(self, alert_record: Dict[str, Any], channels: List[str],
+                       recipients: List[str]) -> Tuple[List[str], List[str]]:
+        """按租户和个人静默时段过滤通道与接收者（位图判定，不读磁盘）"""
+        tenant_id = alert_record.get("tenant_id")
+        policy = self.policy_cache.get(tenant_id)
+        if policy and self.silence.tenant_silenced(tenant_id, policy.silence_mask):
+            channels = [c for c in channels if c == "WEB"]
+            print(f"[AlertEngine] Tenant silence window active, channels reduced to {channels}")
+        active = [
+            r for r in recipients
+            if not (r.startswith("user_") and self.silence.user_silenced(tenant_id, r[5:]))
+        ]
+        if len(active) != len(recipients):
+            print(f"[AlertEngine] Skipping {len(recipients) - len(active)} silenced recipients")
+        return channels, active
+
 
+# 全局单例
+_alert_engine = None
 
 def get_alert_engine() -> AlertEngine:
     """获取告警引擎单例"""
-    return AlertEngine()
+    global _alert_engine
+    if _alert_engine is None:
+        _alert_engine = AlertEngine()
+    return _alert_engine
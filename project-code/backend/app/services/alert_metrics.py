@@ -0,0 +1,194 @@
+"""
+告警生命周期指标 - 确认/解决耗时的流式直方图
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 告警生命周期（pending → acknowledged → resolved）
+- 17_care_quality_reports.sql - 护理质量报告（告警响应速度）
+
+设计说明：
+- 每个维度一个对数分桶直方图：第i个桶上界为 2^(i/4) 秒（相邻桶相差约19%），
+  最后一个桶收纳超过约36小时的耗时；记录与查询都是常数时间（桶数固定）
+- 维度：(tenant_id, 指标, 维度类型, 维度值)
+  * 指标：ack（告警时间 → acknowledged_at）、resolve（告警时间 → resolved_at）
+  * 维度类型：tenant（全租户）、team（告警的护士组标签 team_tags）、caregiver（确认/解决人）
+- 按事件发生的UTC小时分片，保留最近 _RETENTION_HOURS 小时的分片用于时间窗口查询，
+  另有一个不过期的累计分片用于全量查询
+- 由AlertStore在状态变更（包括启动重放日志）时调用 observe，不单独持久化
+- 分位数取所在桶的几何中点，相对误差约±9%
+"""
+
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+import math
+import threading
+
+_SUB_BUCKETS = 4
+_BUCKETS = 17 * _SUB_BUCKETS + 2
+_RETENTION_HOURS = 168
+
+KINDS = ("ack", "resolve")
+
+
+def _bucket(seconds: float) -> int:
+    if seconds < 1.0:
+        return 0
+    return min(_BUCKETS - 1, int(math.log2(seconds) * _SUB_BUCKETS) + 1)
+
+
+def _bucket_value(index: int) -> float:
+    """桶的代表值（几何中点，秒）"""
+    if index == 0:
+        return 0.5
+    return 2 ** ((index - 0.5) / _SUB_BUCKETS)
+
+
+class _Slice:
+    """一个时间分片的计数"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.counts[_bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+class LatencyHistogram:
+    """按小时分片的耗时直方图"""
+
+    def __init__(self):
+        self.cumulative = _Slice()
+        # UTC小时 -> 分片
+        self.hours: Dict[int, _Slice] = {}
+
+    def record(self, seconds: float, hour: int) -> None:
+        """
+        记录一次耗时
+
+        Args:
+            seconds: 耗时（秒）
+            hour: 事件发生的UTC小时（epoch秒 // 3600）
+        """
+        seconds = max(0.0, seconds)
+        self.cumulative.add(seconds)
+        slot = self.hours.get(hour)
+        if slot is None:
+            slot = self.hours[hour] = _Slice()
+            if len(self.hours) > _RETENTION_HOURS:
+                newest = max(self.hours)
+                for old in [h for h in self.hours if h <= newest - _RETENTION_HOURS]:
+                    del self.hours[old]
+        slot.add(seconds)
+
+    def summary(self, since_hour: Optional[int] = None) -> Dict[str, Any]:
+        """
+        汇总直方图
+
+        Args:
+            since_hour: 起始UTC小时（包含，为None时使用累计分片）
+
+        Returns:
+            {count, mean_sec, p50_sec, p90_sec, p99_sec, max_sec}
+        """
+        if since_hour is None:
+            slices: Iterable[_Slice] = (self.cumulative,)
+        else:
+            slices = [s for h, s in self.hours.items() if h >= since_hour]
+        counts = [0] * _BUCKETS
+        count = 0
+        total = 0.0
+        maximum = 0.0
+        for s in slices:
+            if not s.count:
+                continue
+            for i, c in enumerate(s.counts):
+                if c:
+                    counts[i] += c
+            count += s.count
+            total += s.total
+            maximum = max(maximum, s.max)
+
+        result = {"count": count, "mean_sec": round(total / count, 1) if count else 0.0}
+        for name, q in (("p50_sec", 0.5), ("p90_sec", 0.9), ("p99_sec", 0.99)):
+            result[name] = round(min(self._quantile(counts, count, q), maximum), 1) if count else 0.0
+        result["max_sec"] = round(maximum, 1)
+        return result
+
+    @staticmethod
+    def _quantile(counts: List[int], count: int, q: float) -> float:
+        rank = max(1, math.ceil(q * count))
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return _bucket_value(i)
+        return _bucket_value(_BUCKETS - 1)
+
+
+class AlertLatencyMetrics:
+    """告警确认/解决耗时指标"""
+
+    def __init__(self):
+        """初始化指标"""
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str, str, str], LatencyHistogram] = {}
+
+    def observe(self, kind: str, tenant_id: str, seconds: float, at_epoch: float,
+                teams: Iterable[str] = (), caregiver: Optional[str] = None) -> None:
+        """
+        记录一次状态变更耗时
+
+        Args:
+            kind: 指标（ack/resolve）
+            tenant_id: 租户ID
+            seconds: 告警发生到状态变更的耗时（秒）
+            at_epoch: 状态变更时间（epoch秒）
+            teams: 告警的护士组标签
+            caregiver: 操作人用户ID
+        """
+        hour = int(at_epoch // 3600)
+        keys = [(tenant_id, kind, "tenant", "")]
+        keys.extend((tenant_id, kind, "team", str(team)) for team in teams)
+        if caregiver:
+            keys.append((tenant_id, kind, "caregiver", str(caregiver)))
+        with self._lock:
+            for key in keys:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram()
+                histogram.record(seconds, hour)
+
+    def summary(self, tenant_id: str, kind: str, team: Optional[str] = None,
+                caregiver: Optional[str] = None, since_epoch: Optional[float] = None) -> Dict[str, Any]:
+        """
+        查询耗时分布
+
+        Args:
+            tenant_id: 租户ID
+            kind: 指标（ack/resolve）
+            team: 护士组标签（可选）
+            caregiver: 操作人用户ID（可选，优先于team）
+            since_epoch: 起始时间（epoch秒，为None时统计全部）
+
+        Returns:
+            {count, mean_sec, p50_sec, p90_sec, p99_sec, max_sec}
+        """
+        if caregiver:
+            key = (tenant_id, kind, "caregiver", str(caregiver))
+        elif team:
+            key = (tenant_id, kind, "team", str(team))
+        else:
+            key = (tenant_id, kind, "tenant", "")
+        since_hour = int(since_epoch // 3600) if since_epoch is not None else None
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                return LatencyHistogram().summary()
+            return histogram.summary(since_hour)
@@ -0,0 +1,385 @@
+"""
+告警路由索引 - 按卡片预先解析的告警接收者
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 告警路由机制与用户过滤
+  * 规则1：ActiveBed卡片 → resident_caregivers 中该住户的负责护士
+  * 规则2：Location卡片（公共空间/多人房间）→ 警报通报组（alert_user_ids + alert_tags）
+  * 规则3：Location卡片（个人空间）→ 该位置所有住户的护士 ∪ 警报通报组
+  * cards.routing_alert_user_ids / routing_alert_tags 有值时覆盖 locations 的配置
+  * 用户过滤：alert_levels（愿意接收的级别）、alert_scope（是否能看到该卡片）
+- 18_cards.sql / 10_resident_caregivers.sql / 03_users.sql
+
+设计说明：
+- 每个租户一张路由表：路由目标 → {告警级别: 接收者用户ID元组}
+  * 路由目标：("device", device_id)（card_devices绑定）、("bed", bed_id)（ActiveBed卡片）、
+    ("location", location_id)（Location卡片）
+  * 构建时一次性完成护士查找、标签匹配、alert_scope 与 alert_levels 过滤，
+    告警路由只做字典查找，不扫描 cards/resident_caregivers/users
+- 增量重建：cards、card_devices、resident_caregivers、users、locations、residents、beds
+  发生增删改时调用 invalidate(tenant_id)，只将该租户标记为待重建，
+  下一次路由该租户的告警时重建（其他租户的路由表不受影响）
+- 用户标签 users.tags 为JSON对象，键、字符串值和列表元素都参与匹配
+- 同时缓存住户的护士组标签（caregivers_tags），告警创建时写入 team_tags 供按组统计，
+  以及设备/床位所属的卡片（cards_of，实时推送按卡片合并IoT状态）
+- alert_scope 未设置时按 ASSIGNED_ONLY 处理（与 PermissionService 一致），Admin角色视为 ALL；
+  alert_levels 为空表示接收全部级别
+"""
+
+from typing import Dict, List, Any, Optional, Set, Tuple
+from uuid import UUID
+import threading
+from loguru import logger
+
+from app.models.alert import AlertLevel
+from app.services.storage import StorageService
+
+ALERT_LEVELS = tuple(level.value for level in AlertLevel if level != AlertLevel.DISABLE)
+
+RouteKey = Tuple[str, str]
+
+
+def _id(value: Any) -> Optional[str]:
+    return str(value) if value else None
+
+
+def _tag_set(tags: Any) -> Set[str]:
+    """展开用户标签（对象的键、字符串值、列表元素）"""
+    result: Set[str] = set()
+    if isinstance(tags, dict):
+        for key, value in tags.items():
+            result.add(str(key))
+            result |= _tag_set(value)
+    elif isinstance(tags, (list, tuple, set)):
+        for value in tags:
+            result |= _tag_set(value)
+    elif isinstance(tags, str):
+        result.add(tags)
+    return result
+
+
+class _RoutingUser:
+    """参与路由的用户（构建期使用）"""
+
+    __slots__ = ("user_id", "levels", "scope", "tags")
+
+    def __init__(self, user: Dict[str, Any]):
+        self.user_id = str(user["user_id"])
+        self.levels = frozenset(user.get("alert_levels") or ALERT_LEVELS)
+        scope = user.get("alert_scope") or "ASSIGNED_ONLY"
+        if user.get("role") == "Admin":
+            scope = "ALL"
+        self.scope = "LOCATION-TAG" if scope == "LOCATION" else scope
+        self.tags = _tag_set(user.get("tags"))
+
+    def can_see(self, location_tag: Optional[str], assigned: Set[str]) -> bool:
+        """alert_scope 过滤：用户是否能看到该卡片"""
+        if self.scope == "ALL":
+            return True
+        if self.scope == "LOCATION-TAG":
+            return bool(location_tag) and location_tag in self.tags
+        return self.user_id in assigned
+
+
+class AlertRoutingIndex:
+    """告警路由索引"""
+
+    def __init__(self):
+        """初始化路由索引（按租户在首次路由时构建）"""
+        self.card_storage = StorageService("cards")
+        self.card_device_storage = StorageService("card_devices")
+        self.caregiver_storage = StorageService("resident_caregivers")
+        self.user_storage = StorageService("users")
+        self.location_storage = StorageService("locations")
+        self.resident_storage = StorageService("residents")
+        self.bed_storage = StorageService("beds")
+        self._lock = threading.Lock()
+        # tenant_id -> {路由目标: {级别: 接收者}}
+        self._routes: Dict[str, Dict[RouteKey, Dict[str, Tuple[str, ...]]]] = {}
+        # tenant_id -> {resident_id: 护士组标签}
+        self._teams: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+        # tenant_id -> {("device"|"bed", ID): 卡片ID元组}
+        self._cards: Dict[str, Dict[RouteKey, Tuple[str, ...]]] = {}
+        # 待重建的租户（None表示全部）
+        self._dirty: Set[Optional[str]] = {None}
+        self._stats = {"lookups": 0, "hits": 0, "rebuilds": 0}
+
+    def route(self, tenant_id: UUID | str, alert: Dict[str, Any],
+              alert_level: str) -> Optional[Tuple[str, ...]]:
+        """
+        查找告警的接收者
+
+        Args:
+            tenant_id: 租户ID
+            alert: 告警数据（读取device_id/bed_id/location_id）
+            alert_level: 告警级别
+
+        Returns:
+            接收者用户ID元组；告警未关联到任何卡片时返回None
+        """
+        tenant = str(tenant_id)
+        if self._dirty and (None in self._dirty or tenant in self._dirty):
+            self._rebuild(tenant)
+        self._stats["lookups"] += 1
+
+        routes = self._routes.get(tenant)
+        if not routes:
+            return None
+        for key in (
+            ("device", _id(alert.get("device_id"))),
+            ("bed", _id(alert.get("bed_id"))),
+            ("location", _id(alert.get("location_id"))),
+        ):
+            if key[1] is None:
+                continue
+            levels = routes.get(key)
+            if levels is not None:
+                self._stats["hits"] += 1
+                return levels.get(alert_level, ())
+        return None
+
+    def team_tags(self, tenant_id: UUID | str, resident_id: Optional[UUID | str]) -> Tuple[str, ...]:
+        """
+        查找住户的护士组标签（resident_caregivers.caregivers_tags）
+
+        Args:
+            tenant_id: 租户ID
+            resident_id: 住户ID
+
+        Returns:
+            标签元组（住户没有护理分配时为空）
+        """
+        if not resident_id:
+            return ()
+        tenant = str(tenant_id)
+        if self._dirty and (None in self._dirty or tenant in self._dirty):
+            self._rebuild(tenant)
+        return self._teams.get(tenant, {}).get(str(resident_id), ())
+
+    def cards_of(self, tenant_id: UUID | str, device_id: Optional[UUID | str],
+                 bed_id: Optional[UUID | str] = None) -> Tuple[str, ...]:
+        """
+        查找设备所属的卡片（card_devices绑定，以及床位对应的ActiveBed卡片）
+
+        Args:
+            tenant_id: 租户ID
+            device_id: 设备ID
+            bed_id: 床位ID（接入时按绑定关系填充）
+
+        Returns:
+            启用的卡片ID元组（去重）
+        """
+        tenant = str(tenant_id)
+        if self._dirty and (None in self._dirty or tenant in self._dirty):
+            self._rebuild(tenant)
+        cards = self._cards.get(tenant)
+        if not cards:
+            return ()
+        by_device = cards.get(("device", _id(device_id)), ()) if device_id else ()
+        by_bed = cards.get(("bed", _id(bed_id)), ()) if bed_id else ()
+        if not by_bed:
+            return by_device
+        return tuple(dict.fromkeys(by_device + by_bed))
+
+    def invalidate(self, tenant_id: Optional[UUID | str] = None) -> None:
+        """
+        标记租户路由表待重建（卡片/护理分配/用户/位置等变更后调用）
+
+        Args:
+            tenant_id: 租户ID（为None时全部租户待重建）
+        """
+        with self._lock:
+            self._dirty.add(str(tenant_id) if tenant_id else None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取路由索引统计"""
+        return {
+            **self._stats,
+            "tenants": len(self._routes),
+            "targets": sum(len(routes) for routes in self._routes.values()),
+        }
+
+    def _rebuild(self, tenant: str) -> None:
+        with self._lock:
+            if None in self._dirty:
+                self._dirty.clear()
+                tenants = None
+            elif tenant in self._dirty:
+                self._dirty.discard(tenant)
+                tenants = {tenant}
+            else:
+                return
+
+            def of_tenants(record: Dict[str, Any]) -> bool:
+                return tenants is None or str(record.get("tenant_id")) in tenants
+
+            grouped: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+            for name, storage in (
+                ("cards", self.card_storage),
+                ("caregivers", self.caregiver_storage),
+                ("users", self.user_storage),
+                ("locations", self.location_storage),
+                ("residents", self.resident_storage),
+                ("beds", self.bed_storage),
+            ):
+                for record in storage.find_all(of_tenants):
+                    key = str(record.get("tenant_id"))
+                    grouped.setdefault(key, {}).setdefault(name, []).append(record)
+
+            # card_devices 记录不一定带tenant_id，按卡片归属租户
+            card_tenants = {
+                str(card["card_id"]): key
+                for key, tables in grouped.items()
+                for card in tables.get("cards", [])
+                if card.get("card_id")
+            }
+            for link in self.card_device_storage.load_all():
+                key = card_tenants.get(str(link.get("card_id")))
+                if key is not None:
+                    grouped[key].setdefault("card_devices", []).append(link)
+
+            if tenants is None:
+                self._routes = {}
+                self._teams = {}
+                self._cards = {}
+            for key in tenants or ():
+                self._routes.pop(key, None)
+                self._teams.pop(key, None)
+                self._cards.pop(key, None)
+            for key, tables in grouped.items():
+                self._routes[key] = self._build_tenant(tables)
+                self._cards[key] = self._build_cards(tables)
+                self._teams[key] = {
+                    str(a.get("resident_id")): tuple(sorted(_tag_set(a.get("caregivers_tags"))))
+                    for a in tables.get("caregivers", [])
+                    if a.get("caregivers_tags")
+                }
+            self._stats["rebuilds"] += 1
+
+        logger.info(f"Built alert routing index for {len(grouped)} tenants"
+                    f"{'' if tenants is None else f' ({tenant})'}")
+
+    @staticmethod
+    def _build_tenant(tables: Dict[str, List[Dict[str, Any]]]) -> Dict[RouteKey, Dict[str, Tuple[str, ...]]]:
+        users: Dict[str, _RoutingUser] = {}
+        users_by_tag: Dict[str, Set[str]] = {}
+        for user in tables.get("users", []):
+            if not user.get("user_id") or user.get("status", "active") != "active":
+                continue
+            routing_user = _RoutingUser(user)
+            users[routing_user.user_id] = routing_user
+            for tag in routing_user.tags:
+                users_by_tag.setdefault(tag, set()).add(routing_user.user_id)
+
+        caregivers: Dict[str, Set[str]] = {}
+        for assignment in tables.get("caregivers", []):
+            ids = caregivers.setdefault(str(assignment.get("resident_id")), set())
+            for i in range(1, 6):
+                if assignment.get(f"caregiver_id{i}"):
+                    ids.add(str(assignment[f"caregiver_id{i}"]))
+
+        location_residents: Dict[str, List[str]] = {}
+        for resident in tables.get("residents", []):
+            if resident.get("status", "active") == "active" and resident.get("location_id"):
+                location_residents.setdefault(str(resident["location_id"]), []).append(
+                    str(resident["resident_id"])
+                )
+        bed_residents = {
+            str(bed["bed_id"]): str(bed["resident_id"])
+            for bed in tables.get("beds", [])
+            if bed.get("bed_id") and bed.get("resident_id")
+        }
+        locations = {
+            str(location["location_id"]): location
+            for location in tables.get("locations", [])
+            if location.get("location_id")
+        }
+
+        routes: Dict[RouteKey, Dict[str, Tuple[str, ...]]] = {}
+        card_routes: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+        for card in tables.get("cards", []):
+            if not card.get("is_active", True):
+                continue
+            location_id = _id(card.get("location_id"))
+            location = locations.get(location_id, {}) if location_id else {}
+            is_bed_card = card.get("card_type") == "ActiveBed"
+
+            if is_bed_card:
+                if not card.get("bed_id"):
+                    continue
+                key = ("bed", str(card["bed_id"]))
+                resident_id = _id(card.get("resident_id")) or bed_residents.get(key[1])
+                residents = [resident_id] if resident_id else []
+            else:
+                if not location_id:
+                    continue
+                key = ("location", location_id)
+                residents = location_residents.get(location_id, [])
+
+            # 卡片配置覆盖位置的警报通报组（ActiveBed卡片只使用卡片自身配置）
+            group_user_ids = card.get("routing_alert_user_ids")
+            group_tags = card.get("routing_alert_tags")
+            if not is_bed_card:
+                group_user_ids = group_user_ids or location.get("alert_user_ids")
+                group_tags = group_tags or location.get("alert_tags")
+            group: Set[str] = {str(uid) for uid in group_user_ids or []}
+            for tag in group_tags or []:
+                group |= users_by_tag.get(tag, set())
+
+            assigned: Set[str] = set()
+            for resident_id in residents:
+                assigned |= caregivers.get(resident_id, set())
+
+            is_public = card.get("is_public_space")
+            if is_public is None:
+                is_public = not is_bed_card and bool(
+                    location.get("is_public_space") or location.get("is_multi_person_room")
+                )
+            candidates = group if is_public else assigned | group
+
+            location_tag = location.get("location_tag")
+            visible = [
+                users[uid] for uid in sorted(candidates)
+                if uid in users and users[uid].can_see(location_tag, assigned)
+            ]
+            levels = {
+                level: tuple(u.user_id for u in visible if level in u.levels)
+                for level in ALERT_LEVELS
+            }
+            routes[key] = levels
+            if card.get("card_id"):
+                card_routes[str(card["card_id"])] = levels
+
+        for link in tables.get("card_devices", []):
+            levels = card_routes.get(str(link.get("card_id")))
+            if levels is not None and link.get("device_id"):
+                routes[("device", str(link["device_id"]))] = levels
+        return routes
+
+    @staticmethod
+    def _build_cards(tables: Dict[str, List[Dict[str, Any]]]) -> Dict[RouteKey, Tuple[str, ...]]:
+        members: Dict[RouteKey, List[str]] = {}
+        active: Set[str] = set()
+        for card in tables.get("cards", []):
+            if not card.get("card_id") or not card.get("is_active", True):
+                continue
+            card_id = str(card["card_id"])
+            active.add(card_id)
+            if card.get("card_type") == "ActiveBed" and card.get("bed_id"):
+                members.setdefault(("bed", str(card["bed_id"])), []).append(card_id)
+        for link in tables.get("card_devices", []):
+            card_id = str(link.get("card_id"))
+            if card_id in active and link.get("device_id"):
+                members.setdefault(("device", str(link["device_id"])), []).append(card_id)
+        return {key: tuple(dict.fromkeys(ids)) for key, ids in members.items()}
+
+
+# 全局单例
+_alert_routing_index = None
+
+def get_alert_routing_index() -> AlertRoutingIndex:
+    """获取告警路由索引单例"""
+    global _alert_routing_index
+    if _alert_routing_index is None:
+        _alert_routing_index = AlertRoutingIndex()
+    return _alert_routing_index
@@ -0,0 +1,275 @@
+"""
+告警计时调度服务 - 分层时间轮
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 升级机制（超时未确认自动升级）、L5警示灯计时器（30秒+120秒）
+- Radar本地报警机制-0916.md - L5：30秒本地确认、150秒二次确认、Server在50秒内可否决
+- models/alert_policy.py - EscalationRule.escalate_after_sec / NotificationRule.repeat_interval_sec
+
+设计说明：
+- 4层时间轮，每层64个槽，最小刻度1秒（覆盖约194天，更远的计时器放入溢出表）
+- 计时器按绝对刻度（epoch秒）放置：与当前刻度最高不同位所在的层，槽号为该层的位值；
+  当前刻度进入某层的新槽时，将该槽中的计时器下放到更低层，第0层的槽到期即触发
+- 插入、取消均为O(1)：计时器记录自己所在的槽（集合），取消时从集合中移除
+- 每条告警的计时器按 (alert_id, action) 登记，同一动作重复登记时替换旧计时器，
+  确认/解决告警时一次取消该告警的全部计时器
+- 由一个asyncio任务驱动：每秒推进一次，事件循环延迟时逐刻度追赶，
+  到期计时器按截止时间顺序交给回调处理（回调由AlertEngine注册）
+- 计时器只保存在内存中；启动时由AlertEngine根据告警存储中的待处理告警重新登记
+"""
+
+from typing import Dict, List, Any, Optional, Callable, Set
+import asyncio
+import time
+from loguru import logger
+
+_SLOT_BITS = 6
+_SLOTS = 1 << _SLOT_BITS
+_SLOT_MASK = _SLOTS - 1
+_LEVELS = 4
+
+
+class Timer:
+    """单个计时器"""
+
+    __slots__ = ("deadline", "tick", "alert_id", "action", "bucket")
+
+    def __init__(self, deadline: float, tick: int, alert_id: str, action: str):
+        self.deadline = deadline
+        self.tick = tick
+        self.alert_id = alert_id
+        self.action = action
+        # 所在的槽（取消时从中移除）
+        self.bucket: Optional[Set["Timer"]] = None
+
+
+class TimerWheel:
+    """分层时间轮"""
+
+    def __init__(self, tick_sec: float = 1.0, now: Optional[float] = None):
+        """
+        初始化时间轮
+
+        Args:
+            tick_sec: 刻度长度（秒）
+            now: 当前时间（epoch秒，默认取系统时间）
+        """
+        self.tick_sec = tick_sec
+        self.current = self._to_tick(time.time() if now is None else now)
+        self.wheels: List[List[Set[Timer]]] = [
+            [set() for _ in range(_SLOTS)] for _ in range(_LEVELS)
+        ]
+        self.overflow: Set[Timer] = set()
+        # 插入时已到期的计时器
+        self.expired: Set[Timer] = set()
+        self.count = 0
+
+    def _to_tick(self, when: float) -> int:
+        return int(-(-when // self.tick_sec))
+
+    def add(self, timer: Timer) -> None:
+        """放置计时器"""
+        self._place(timer)
+        self.count += 1
+
+    def remove(self, timer: Timer) -> None:
+        """移除计时器（O(1)）"""
+        if timer.bucket is not None:
+            timer.bucket.discard(timer)
+            timer.bucket = None
+            self.count -= 1
+
+    def advance(self, now: float) -> List[Timer]:
+        """
+        推进到指定时间
+
+        Args:
+            now: 当前时间（epoch秒）
+
+        Returns:
+            到期的计时器（按截止时间排序）
+        """
+        due = list(self.expired)
+        self.expired.clear()
+        target = int(now // self.tick_sec)
+        if self.count == len(due) and not self.overflow:
+            # 时间轮为空时直接跳到目标刻度
+            self.current = max(self.current, target)
+        while self.current < target:
+            self.current += 1
+            if self.current & ((1 << (_SLOT_BITS * (_LEVELS - 1))) - 1) == 0 and self.overflow:
+                pending, self.overflow = self.overflow, set()
+                for timer in pending:
+                    self._place(timer)
+            # 高层先下放，再触发第0层
+            for level in range(_LEVELS - 1, 0, -1):
+                if self.current & ((1 << (_SLOT_BITS * level)) - 1) == 0:
+                    slot = (self.current >> (_SLOT_BITS * level)) & _SLOT_MASK
+                    bucket = self.wheels[level][slot]
+                    if bucket:
+                        self.wheels[level][slot] = set()
+                        for timer in bucket:
+                            self._place(timer)
+            bucket = self.wheels[0][self.current & _SLOT_MASK]
+            if bucket:
+                self.wheels[0][self.current & _SLOT_MASK] = set()
+                due.extend(bucket)
+            if self.expired:
+                # 下放时恰好到期的计时器（截止刻度为下放边界，如64的倍数）
+                due.extend(self.expired)
+                self.expired.clear()
+
+        for timer in due:
+            timer.bucket = None
+        self.count -= len(due)
+        due.sort(key=lambda t: t.deadline)
+        return due
+
+    def _place(self, timer: Timer) -> None:
+        if timer.tick <= self.current:
+            bucket = self.expired
+        else:
+            for level in range(_LEVELS):
+                shift = _SLOT_BITS * (level + 1)
+                if (timer.tick >> shift) == (self.current >> shift):
+                    bucket = self.wheels[level][(timer.tick >> (_SLOT_BITS * level)) & _SLOT_MASK]
+                    break
+            else:
+                bucket = self.overflow
+        bucket.add(timer)
+        timer.bucket = bucket
+
+
+class AlertScheduler:
+    """告警计时调度器"""
+
+    def __init__(self, tick_sec: float = 1.0):
+        """
+        初始化调度器
+
+        Args:
+            tick_sec: 刻度长度（秒）
+        """
+        self.wheel = TimerWheel(tick_sec)
+        # alert_id -> {action: Timer}
+        self._timers: Dict[str, Dict[str, Timer]] = {}
+        self._handler: Optional[Callable[[str, str], None]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"scheduled": 0, "cancelled": 0, "fired": 0, "errors": 0}
+
+    def set_handler(self, handler: Callable[[str, str], None]) -> None:
+        """注册到期回调 handler(alert_id, action)"""
+        self._handler = handler
+
+    def schedule(self, alert_id: str, action: str, deadline: float) -> None:
+        """
+        登记计时器（同一告警的同一动作只保留最新的一个）
+
+        Args:
+            alert_id: 告警ID
+            action: 动作名
+            deadline: 截止时间（epoch秒）
+        """
+        timers = self._timers.setdefault(str(alert_id), {})
+        old = timers.get(action)
+        if old is not None:
+            self.wheel.remove(old)
+        timer = Timer(deadline, self.wheel._to_tick(deadline), str(alert_id), action)
+        timers[action] = timer
+        self.wheel.add(timer)
+        self._stats["scheduled"] += 1
+
+    def cancel(self, alert_id: str, action: Optional[str] = None) -> int:
+        """
+        取消告警的计时器
+
+        Args:
+            alert_id: 告警ID
+            action: 动作名（为None时取消该告警的全部计时器）
+
+        Returns:
+            取消的计时器数量
+        """
+        key = str(alert_id)
+        timers = self._timers.get(key)
+        if not timers:
+            return 0
+        if action is None:
+            targets = list(timers.values())
+            del self._timers[key]
+        else:
+            timer = timers.pop(action, None)
+            targets = [timer] if timer else []
+            if not timers:
+                del self._timers[key]
+        for timer in targets:
+            self.wheel.remove(timer)
+        self._stats["cancelled"] += len(targets)
+        return len(targets)
+
+    def tick(self, now: Optional[float] = None) -> int:
+        """
+        推进时间轮并处理到期计时器
+
+        Returns:
+            触发的计时器数量
+        """
+        due = self.wheel.advance(time.time() if now is None else now)
+        for timer in due:
+            timers = self._timers.get(timer.alert_id)
+            if timers is None or timers.get(timer.action) is not timer:
+                continue
+            del timers[timer.action]
+            if not timers:
+                del self._timers[timer.alert_id]
+            self._stats["fired"] += 1
+            if self._handler is None:
+                continue
+            try:
+                self._handler(timer.alert_id, timer.action)
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Error handling alert timer {timer.action} for {timer.alert_id}: {e}")
+        return len(due)
+
+    async def run(self) -> None:
+        """调度循环（每个刻度推进一次）"""
+        tick_sec = self.wheel.tick_sec
+        while True:
+            now = time.time()
+            await asyncio.sleep(tick_sec - (now % tick_sec))
+            self.tick()
+
+    def start(self) -> None:
+        """在当前事件循环中启动调度任务"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """停止调度任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取调度统计"""
+        return {
+            **self._stats,
+            "outstanding": self.wheel.count,
+            "alerts": len(self._timers),
+        }
+
+
+# 全局单例
+_alert_scheduler = None
+
+def get_alert_scheduler() -> AlertScheduler:
+    """获取告警计时调度器单例"""
+    global _alert_scheduler
+    if _alert_scheduler is None:
+        _alert_scheduler = AlertScheduler()
+    return _alert_scheduler
@@ -0,0 +1,529 @@
+"""
+告警实例存储 - 追加写日志 + 内存索引
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 告警生命周期（pending → acknowledged → resolved）
+- models/alert.py - Alert数据模型（协议扩展，源SQL中没有alerts表）
+
+设计说明：
+- 持久化为追加写日志 alerts.jsonl：每行是一条告警的完整版本，
+  新建和状态变更都只追加一行，不重写文件；启动时按行重放，同一告警以最后一行为准
+- 内存中只常驻索引，不常驻全部告警：
+  * alert_id -> 最新版本在日志中的字节偏移
+  * (tenant_id, status) / (tenant_id, alert_level) -> alert_id集合
+  * 每个租户一个按时间有序的 (timestamp, alert_id) 序列，时间范围查询二分定位
+- 最近写入/更新的 alert_store_recent_max 条告警完整保存在有序哈希表中（超出时淘汰最旧的），
+  其余告警按偏移从日志读取
+- 时间戳统一规范为定长ISO字符串（见timeseries_store.normalize_timestamp），
+  查询只做字符串比较，不逐条解析时间
+- 日志中的过期版本超过存活告警数（且不少于 _COMPACT_MIN_GARBAGE 行）时压缩重写
+- 首次启动时导入旧版 alerts.json 集合中的告警
+- 状态变为 acknowledged / resolved 时（包括启动重放）记录确认/解决耗时到流式直方图，
+  按租户、护士组（team_tags）、操作人查询分位数（见alert_metrics）
+"""
+
+from typing import Dict, List, Any, Optional, Set, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from uuid import UUID, uuid4
+from bisect import bisect_left, bisect_right
+import json
+import os
+import threading
+from loguru import logger
+
+from app.config import settings
+from app.services.timeseries_store import normalize_timestamp
+from app.services.alert_metrics import AlertLatencyMetrics
+
+# 触发日志压缩的最少过期行数
+_COMPACT_MIN_GARBAGE = 1000
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class _AlertMeta:
+    """告警的索引字段（常驻内存）"""
+
+    __slots__ = ("tenant_id", "status", "alert_level", "alert_type", "timestamp")
+
+    def __init__(self, record: Dict[str, Any]):
+        self.tenant_id = str(record.get("tenant_id"))
+        self.status = record.get("status") or "pending"
+        self.alert_level = record.get("alert_level")
+        self.alert_type = record.get("alert_type")
+        self.timestamp = record["timestamp"]
+
+
+class AlertStore:
+    """告警实例存储"""
+
+    def __init__(self, data_dir: Optional[str] = None, recent_max: Optional[int] = None):
+        """
+        初始化告警存储并重放日志（参数缺省时取配置）
+
+        Args:
+            data_dir: 数据目录（日志文件为其下的 alerts.jsonl）
+            recent_max: 内存中保留完整记录的最近告警数量
+        """
+        base_dir = Path(data_dir or settings.data_dir)
+        base_dir.mkdir(parents=True, exist_ok=True)
+        self.path = base_dir / "alerts.jsonl"
+        self.legacy_path = base_dir / "alerts.json"
+        self.recent_max = recent_max or settings.alert_store_recent_max
+
+        self._lock = threading.RLock()
+        self._writer = None
+        self._offsets: Dict[str, int] = {}
+        self._meta: Dict[str, _AlertMeta] = {}
+        self._by_status: Dict[Tuple[str, str], Set[str]] = {}
+        self._by_level: Dict[Tuple[str, str], Set[str]] = {}
+        # tenant_id -> (时间戳列表, alert_id列表)，按时间升序
+        self._by_time: Dict[str, Tuple[List[str], List[str]]] = {}
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._log_lines = 0
+        self.metrics = AlertLatencyMetrics()
+
+        self._replay()
+        if not self._offsets:
+            self._import_legacy()
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def add(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        新增告警
+
+        Args:
+            record: 告警记录（缺少alert_id/status/timestamp时自动补全）
+
+        Returns:
+            保存的告警记录
+        """
+        record = dict(record)
+        record["alert_id"] = str(record.get("alert_id") or uuid4())
+        record["tenant_id"] = str(record.get("tenant_id"))
+        record["status"] = record.get("status") or "pending"
+        record["timestamp"] = normalize_timestamp(record.get("timestamp") or datetime.utcnow())
+
+        with self._lock:
+            if record["alert_id"] in self._offsets:
+                raise ValueError(f"Alert {record['alert_id']} already exists")
+            self._write(record)
+        return record
+
+    def update(self, alert_id: UUID | str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        更新告警（追加一个新版本）
+
+        Args:
+            alert_id: 告警ID
+            updates: 更新字段（alert_id/tenant_id/timestamp不可修改）
+
+        Returns:
+            更新后的告警记录，不存在时返回None
+        """
+        key = str(alert_id)
+        with self._lock:
+            current = self._load(key)
+            if current is None:
+                return None
+            record = {**current, **updates}
+            record["alert_id"] = current["alert_id"]
+            record["tenant_id"] = current["tenant_id"]
+            record["timestamp"] = current["timestamp"]
+            record["updated_at"] = datetime.utcnow().isoformat()
+            self._write(record)
+            self._maybe_compact()
+        return record
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def get(self, alert_id: UUID | str) -> Optional[Dict[str, Any]]:
+        """按ID获取告警（返回的记录不要原地修改，使用update）"""
+        with self._lock:
+            return self._load(str(alert_id))
+
+    def query(self,
+              tenant_id: UUID | str,
+              status: Optional[str] = None,
+              alert_level: Optional[str] = None,
+              alert_type: Optional[str] = None,
+              start: Optional[datetime | str] = None,
+              end: Optional[datetime | str] = None,
+              limit: Optional[int] = 100,
+              reverse: bool = True) -> List[Dict[str, Any]]:
+        """
+        查询租户的告警
+
+        Args:
+            tenant_id: 租户ID
+            status: 状态筛选
+            alert_level: 级别筛选
+            alert_type: 类型筛选
+            start: 开始时间（包含）
+            end: 结束时间（包含）
+            limit: 最大返回数量（None表示不限制）
+            reverse: True按时间倒序，False按时间正序
+
+        Returns:
+            告警列表（按时间排序）
+        """
+        with self._lock:
+            alert_ids = self._select(str(tenant_id), status, alert_level, alert_type,
+                                     start, end, limit, reverse)
+            return self._load_many(alert_ids)
+
+    def find_by_status(self, status: str) -> List[Dict[str, Any]]:
+        """
+        获取所有租户中指定状态的告警（用于启动时恢复计时器等）
+
+        Args:
+            status: 告警状态
+
+        Returns:
+            告警列表（按时间正序）
+        """
+        with self._lock:
+            alert_ids = [
+                alert_id
+                for (_, bucket_status), ids in self._by_status.items() if bucket_status == status
+                for alert_id in ids
+            ]
+            alert_ids.sort(key=lambda a: self._meta[a].timestamp)
+            return self._load_many(alert_ids)
+
+    def count(self,
+              tenant_id: UUID | str,
+              start: Optional[datetime | str] = None,
+              end: Optional[datetime | str] = None) -> Dict[str, Any]:
+        """
+        统计租户在时间范围内的告警数量（只读索引，不读取告警记录）
+
+        Returns:
+            {total_count, by_level, by_type, by_status}
+        """
+        result = {"total_count": 0, "by_level": {}, "by_type": {}, "by_status": {}}
+        with self._lock:
+            for alert_id in self._select(str(tenant_id), None, None, None, start, end, None, False):
+                meta = self._meta[alert_id]
+                result["total_count"] += 1
+                for field, value in (("by_level", meta.alert_level),
+                                     ("by_type", meta.alert_type),
+                                     ("by_status", meta.status)):
+                    value = value or "UNKNOWN"
+                    result[field][value] = result[field].get(value, 0) + 1
+        return result
+
+    def latency(self,
+                tenant_id: UUID | str,
+                kind: str = "ack",
+                team: Optional[str] = None,
+                caregiver: Optional[UUID | str] = None,
+                hours: Optional[int] = None) -> Dict[str, Any]:
+        """
+        查询确认/解决耗时分布（常数时间）
+
+        Args:
+            tenant_id: 租户ID
+            kind: ack（确认耗时）或 resolve（解决耗时）
+            team: 护士组标签（可选）
+            caregiver: 操作人用户ID（可选）
+            hours: 最近多少小时内的状态变更（为空时统计全部）
+
+        Returns:
+            {count, mean_sec, p50_sec, p90_sec, p99_sec, max_sec}
+        """
+        since = datetime.now(timezone.utc).timestamp() - hours * 3600 if hours else None
+        return self.metrics.summary(str(tenant_id), kind, team, caregiver, since)
+
+    def recent(self, tenant_id: Optional[UUID | str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        获取最近写入/更新的告警（只读内存窗口）
+
+        Args:
+            tenant_id: 租户ID（为空时不限租户）
+            limit: 最大返回数量
+
+        Returns:
+            告警列表（最近的在前）
+        """
+        key = str(tenant_id) if tenant_id is not None else None
+        result = []
+        with self._lock:
+            for record in reversed(self._recent.values()):
+                if key is None or record.get("tenant_id") == key:
+                    result.append(record)
+                    if len(result) >= limit:
+                        break
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计"""
+        with self._lock:
+            return {
+                "alerts": len(self._offsets),
+                "tenants": len(self._by_time),
+                "recent_cached": len(self._recent),
+                "recent_max": self.recent_max,
+                "log_lines": self._log_lines,
+                "stale_versions": self._log_lines - len(self._offsets),
+            }
+
+    def close(self) -> None:
+        """关闭日志文件"""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+
+    def _select(self, tenant_id: str, status: Optional[str], alert_level: Optional[str],
+                alert_type: Optional[str], start, end, limit: Optional[int],
+                reverse: bool) -> List[str]:
+        """根据索引选出满足条件的alert_id（按时间排序）"""
+        keys, ids = self._by_time.get(tenant_id, ([], []))
+        lo = bisect_left(keys, normalize_timestamp(start)) if start is not None else 0
+        hi = bisect_right(keys, normalize_timestamp(end)) if end is not None else len(keys)
+        if lo >= hi:
+            return []
+
+        # 状态/级别索引集合比时间范围小时，从集合出发再按时间排序
+        smallest = None
+        if status is not None:
+            smallest = self._by_status.get((tenant_id, status), set())
+        if alert_level is not None:
+            level_ids = self._by_level.get((tenant_id, alert_level), set())
+            if smallest is None or len(level_ids) < len(smallest):
+                smallest = level_ids
+
+        if smallest is not None and len(smallest) < hi - lo:
+            low_key, high_key = keys[lo], keys[hi - 1]
+            candidates = sorted(
+                (self._meta[a].timestamp, a) for a in smallest
+                if low_key <= self._meta[a].timestamp <= high_key
+            )
+            if reverse:
+                candidates.reverse()
+            ordered = (a for _, a in candidates)
+        elif reverse:
+            ordered = (ids[i] for i in range(hi - 1, lo - 1, -1))
+        else:
+            ordered = (ids[i] for i in range(lo, hi))
+
+        selected = []
+        for alert_id in ordered:
+            meta = self._meta[alert_id]
+            if status is not None and meta.status != status:
+                continue
+            if alert_level is not None and meta.alert_level != alert_level:
+                continue
+            if alert_type is not None and meta.alert_type != alert_type:
+                continue
+            selected.append(alert_id)
+            if limit is not None and len(selected) >= limit:
+                break
+        return selected
+
+    def _load(self, alert_id: str) -> Optional[Dict[str, Any]]:
+        record = self._recent.get(alert_id)
+        if record is not None:
+            return record
+        offset = self._offsets.get(alert_id)
+        if offset is None:
+            return None
+        self._flush_writer()
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def _load_many(self, alert_ids: List[str]) -> List[Dict[str, Any]]:
+        missing = [a for a in alert_ids if a not in self._recent]
+        loaded: Dict[str, Dict[str, Any]] = {}
+        if missing:
+            self._flush_writer()
+            with open(self.path, "rb") as f:
+                # 按偏移顺序读取，减少随机寻址
+                for alert_id in sorted(missing, key=self._offsets.__getitem__):
+                    f.seek(self._offsets[alert_id])
+                    loaded[alert_id] = json.loads(f.readline())
+        return [self._recent.get(a) or loaded[a] for a in alert_ids]
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        """追加一个版本到日志并更新索引（调用方持有锁）"""
+        line = json.dumps(record, ensure_ascii=False, default=_json_default).encode("utf-8") + b"\n"
+        if self._writer is None:
+            self._writer = open(self.path, "ab")
+        offset = self._writer.tell()
+        self._writer.write(line)
+        self._writer.flush()
+        self._log_lines += 1
+        self._index(record, offset)
+        self._remember(record)
+
+    def _flush_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.flush()
+
+    def _index(self, record: Dict[str, Any], offset: int) -> None:
+        alert_id = record["alert_id"]
+        meta = _AlertMeta(record)
+        old = self._meta.get(alert_id)
+        if old is None or old.status != meta.status:
+            self._observe_transition(record, meta, old.status if old is not None else None)
+        if old is not None:
+            self._by_status[(old.tenant_id, old.status)].discard(alert_id)
+            self._by_level[(old.tenant_id, old.alert_level)].discard(alert_id)
+        else:
+            keys, ids = self._by_time.setdefault(meta.tenant_id, ([], []))
+            if not keys or meta.timestamp >= keys[-1]:
+                keys.append(meta.timestamp)
+                ids.append(alert_id)
+            else:
+                i = bisect_right(keys, meta.timestamp)
+                keys.insert(i, meta.timestamp)
+                ids.insert(i, alert_id)
+
+        self._meta[alert_id] = meta
+        self._offsets[alert_id] = offset
+        self._by_status.setdefault((meta.tenant_id, meta.status), set()).add(alert_id)
+        self._by_level.setdefault((meta.tenant_id, meta.alert_level), set()).add(alert_id)
+
+    def _observe_transition(self, record: Dict[str, Any], meta: _AlertMeta,
+                            old_status: Optional[str] = None) -> None:
+        """
+        状态变为已确认/已解决时记录耗时
+
+        直接以已解决状态出现的记录（压缩或重放后只剩最终版本、确认与解决之间没有单独写入）
+        若带有 acknowledged_at，同时记录确认耗时
+        """
+        if meta.status == "acknowledged":
+            transitions = [("ack", record.get("acknowledged_at"), record.get("acknowledged_by"))]
+        elif meta.status == "resolved":
+            transitions = [("resolve", record.get("resolved_at"), record.get("resolved_by"))]
+            if old_status != "acknowledged":
+                transitions.append(("ack", record.get("acknowledged_at"), record.get("acknowledged_by")))
+        else:
+            return
+        for kind, at, by in transitions:
+            if not at:
+                continue
+            try:
+                started = datetime.fromisoformat(meta.timestamp)
+                finished = datetime.fromisoformat(normalize_timestamp(at))
+            except (ValueError, TypeError):
+                continue
+            self.metrics.observe(
+                kind, meta.tenant_id, (finished - started).total_seconds(),
+                finished.replace(tzinfo=timezone.utc).timestamp(),
+                record.get("team_tags") or (), by
+            )
+
+    def _remember(self, record: Dict[str, Any]) -> None:
+        """放入最近告警窗口，超出容量时淘汰最旧的"""
+        alert_id = record["alert_id"]
+        self._recent[alert_id] = record
+        self._recent.move_to_end(alert_id)
+        while len(self._recent) > self.recent_max:
+            self._recent.popitem(last=False)
+
+    def _replay(self) -> None:
+        """启动时重放日志，重建索引"""
+        if not self.path.exists():
+            return
+        offset = 0
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                start = offset
+                offset += len(line)
+                if not line.endswith(b"\n"):
+                    # 异常退出时写了一半的行
+                    logger.warning(f"Discarding truncated alert log tail at offset {start}")
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt alert log line at offset {start}")
+                    valid_end = offset
+                    continue
+                valid_end = offset
+                self._log_lines += 1
+                self._index(record, start)
+                self._remember(record)
+
+        if valid_end < self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+        logger.info(f"Loaded alert store: {len(self._offsets)} alerts from {self._log_lines} log lines")
+
+    def _maybe_compact(self) -> None:
+        garbage = self._log_lines - len(self._offsets)
+        if garbage >= _COMPACT_MIN_GARBAGE and garbage > len(self._offsets):
+            self._compact()
+
+    def _compact(self) -> None:
+        """只保留每条告警的最新版本，重写日志（调用方持有锁）"""
+        self._flush_writer()
+        tmp_path = self.path.with_suffix(".jsonl.tmp")
+        new_offsets: Dict[str, int] = {}
+        with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+            for alert_id, offset in sorted(self._offsets.items(), key=lambda item: item[1]):
+                src.seek(offset)
+                new_offsets[alert_id] = dst.tell()
+                dst.write(src.readline())
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        self.close()
+        os.replace(tmp_path, self.path)
+        self._offsets = new_offsets
+        logger.info(f"Compacted alert log: {self._log_lines} -> {len(new_offsets)} lines")
+        self._log_lines = len(new_offsets)
+
+    def _import_legacy(self) -> None:
+        """一次性导入旧版 alerts.json 集合"""
+        if not self.legacy_path.exists():
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Error reading legacy alerts: {e}")
+            return
+        if not records:
+            return
+
+        records.sort(key=lambda r: str(r.get("timestamp") or ""))
+        with self._lock:
+            for record in records:
+                try:
+                    self.add(record)
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"Skipping legacy alert {record.get('alert_id')}: {e}")
+        logger.info(f"Imported {len(self._offsets)} alerts from {self.legacy_path.name}")
+
+
+# 全局单例
+_alert_store = None
+
+def get_alert_store() -> AlertStore:
+    """获取告警存储单例"""
+    global _alert_store
+    if _alert_store is None:
+        _alert_store = AlertStore()
+    return _alert_store
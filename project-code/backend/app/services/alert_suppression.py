@@ -0,0 +1,183 @@
+"""
+告警抑制服务 - 重复告警抑制与每小时上限
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 抑制机制（静默期内不重复告警）
+- models/alert_policy.py - SuppressionRule（suppress_duplicate_sec, max_alerts_per_hour）
+
+设计说明：
+- 抑制键：(tenant_id, 住户ID或设备ID, alert_type)，同一住户的多个设备共享一个键
+- 每个键一个状态：重复抑制截止时间 + 令牌桶（容量 max_alerts_per_hour，每秒补充 容量/3600 个）
+- 判定只做一次字典查找和常数次运算：
+  * 处于重复抑制期内，且不比开启抑制期的告警更严重 → 抑制（duplicate）；
+    L1紧急告警不做重复抑制，比抑制期内已放行的告警级别更高的告警（如L2跌倒风险后的L1跌倒）同样放行
+  * 令牌不足 → 抑制（rate_limited）；L1紧急告警不受每小时上限限制
+  * 否则消耗一个令牌，刷新重复抑制截止时间，放行
+- 过期清理按时间分桶：每个键按“状态可丢弃的时间”（抑制期结束且令牌桶已补满）登记到
+  _SWEEP_BUCKET_SEC 秒宽的桶中，判定时顺带清理已到期的桶，不需要后台任务也不扫描全部键
+- 租户未配置抑制规则时使用 SuppressionRule 默认值；规则 enabled=False 时不抑制
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from uuid import UUID
+import time
+
+from app.models.alert_policy import SuppressionRule
+from app.services.policy_cache import max_level
+
+# 清理分桶宽度（秒）
+_SWEEP_BUCKET_SEC = 10
+
+_DEFAULT_RULE = SuppressionRule()
+
+
+class _SuppressionState:
+    """单个抑制键的状态"""
+
+    __slots__ = ("dedup_until", "dedup_level", "tokens", "updated", "capacity", "bucket")
+
+    def __init__(self, capacity: int, now: float):
+        self.dedup_until = 0.0
+        # 开启当前重复抑制期的告警级别
+        self.dedup_level: Optional[str] = None
+        self.tokens = float(capacity)
+        self.updated = now
+        self.capacity = capacity
+        # 已登记的清理桶（None表示未登记）
+        self.bucket: Optional[int] = None
+
+    def refill(self, capacity: int, now: float) -> None:
+        if capacity != self.capacity:
+            self.tokens = min(self.tokens, float(capacity))
+            self.capacity = capacity
+        self.tokens = min(float(capacity), self.tokens + (now - self.updated) * capacity / 3600.0)
+        self.updated = now
+
+    def retire_at(self) -> float:
+        """状态可丢弃的时间（抑制期已结束且令牌桶已补满）"""
+        if self.capacity <= 0:
+            return self.dedup_until
+        refill_sec = (self.capacity - self.tokens) * 3600.0 / self.capacity
+        return max(self.dedup_until, self.updated + refill_sec)
+
+
+class AlertSuppressor:
+    """告警抑制器"""
+
+    def __init__(self):
+        """初始化抑制器"""
+        self._states: Dict[Tuple[str, str, str], _SuppressionState] = {}
+        # 桶序号 -> 该桶内到期的键
+        self._buckets: Dict[int, List[Tuple[str, str, str]]] = {}
+        self._swept_bucket = int(time.monotonic() // _SWEEP_BUCKET_SEC)
+        self._stats = {
+            "checked": 0,
+            "delivered": 0,
+            "suppressed_duplicate": 0,
+            "suppressed_rate_limited": 0,
+        }
+
+    @staticmethod
+    def make_key(tenant_id: UUID | str, alert: Dict[str, Any],
+                 alert_type: str) -> Tuple[str, str, str]:
+        """生成抑制键（优先按住户，其次按设备）"""
+        subject = alert.get("resident_id") or alert.get("device_id") or ""
+        return str(tenant_id), str(subject), alert_type
+
+    def check(self, tenant_id: UUID | str, alert: Dict[str, Any], alert_type: str,
+              alert_level: str, rule: Optional[SuppressionRule] = None) -> Optional[str]:
+        """
+        判定告警是否应被抑制（放行时登记本次告警）
+
+        Args:
+            tenant_id: 租户ID
+            alert: 告警数据（读取resident_id/device_id）
+            alert_type: 告警类型
+            alert_level: 告警级别
+            rule: 租户抑制规则（为None时使用默认规则）
+
+        Returns:
+            抑制原因（duplicate/rate_limited），放行时返回None
+        """
+        rule = rule or _DEFAULT_RULE
+        now = time.monotonic()
+        self._sweep(now)
+        self._stats["checked"] += 1
+
+        if not rule.enabled:
+            self._stats["delivered"] += 1
+            return None
+
+        key = self.make_key(tenant_id, alert, alert_type)
+        capacity = max(0, rule.max_alerts_per_hour)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _SuppressionState(capacity, now)
+        else:
+            state.refill(capacity, now)
+
+        escalated = alert_level != state.dedup_level and max_level(alert_level, state.dedup_level) == alert_level
+        if now < state.dedup_until and alert_level != "L1" and not escalated:
+            self._stats["suppressed_duplicate"] += 1
+            return "duplicate"
+
+        if alert_level != "L1":
+            if state.tokens < 1.0:
+                self._stats["suppressed_rate_limited"] += 1
+                self._schedule(key, state)
+                return "rate_limited"
+            state.tokens -= 1.0
+
+        state.dedup_until = now + rule.suppress_duplicate_sec
+        state.dedup_level = alert_level
+        self._schedule(key, state)
+        self._stats["delivered"] += 1
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取抑制统计"""
+        suppressed = self._stats["suppressed_duplicate"] + self._stats["suppressed_rate_limited"]
+        checked = self._stats["checked"]
+        return {
+            **self._stats,
+            "suppressed": suppressed,
+            "suppression_rate": round(suppressed / checked, 4) if checked else 0.0,
+            "tracked_keys": len(self._states),
+        }
+
+    def _schedule(self, key: Tuple[str, str, str], state: _SuppressionState) -> None:
+        """登记清理桶（已登记的键在清理时按最新状态重新登记）"""
+        if state.bucket is not None:
+            return
+        state.bucket = int(state.retire_at() // _SWEEP_BUCKET_SEC) + 1
+        self._buckets.setdefault(state.bucket, []).append(key)
+
+    def _sweep(self, now: float) -> None:
+        """清理已到期分桶中的键（键状态已更新的重新登记）"""
+        current = int(now // _SWEEP_BUCKET_SEC)
+        if current <= self._swept_bucket:
+            return
+        self._swept_bucket = current
+        # 桶数量以最长保留时间（约1小时）/ 桶宽为上限
+        for bucket in [b for b in self._buckets if b <= current]:
+            for key in self._buckets.pop(bucket):
+                state = self._states.get(key)
+                if state is None:
+                    continue
+                state.refill(state.capacity, now)
+                state.bucket = None
+                if state.retire_at() <= now:
+                    del self._states[key]
+                else:
+                    self._schedule(key, state)
+
+
+# 全局单例
+_alert_suppressor = None
+
+def get_alert_suppressor() -> AlertSuppressor:
+    """获取告警抑制器单例"""
+    global _alert_suppressor
+    if _alert_suppressor is None:
+        _alert_suppressor = AlertSuppressor()
+    return _alert_suppressor
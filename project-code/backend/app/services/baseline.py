@@ -10,6 +10,7 @@ from collections import defaultdict
 import statistics
 
 from app.services.storage import StorageService
+from app.services.timeseries_store import get_timeseries_store
 from app.services.snomed_service import get_snomed_service
 
 
@@ -18,7 +19,7 @@ class BaselineService:
     
     def __init__(self):
         """初始化健康基线服务"""
-        self.iot_storage = StorageService(collection="iot_timeseries")
+        self.iot_storage = get_timeseries_store()
         self.resident_storage = StorageService(collection="residents")
         self.baseline_storage = StorageService(collection="health_baselines")
         self.snomed_service = get_snomed_service()
@@ -43,12 +44,11 @@ class BaselineService:
         if not resident:
             raise ValueError(f"Resident {resident_id} not found")
         
-        # 收集IoT时序数据
-        iot_data = self.iot_storage.find_all(
-            lambda record: (
-                str(record.get("resident_id")) == str(resident_id) and
-                start_time <= datetime.fromisoformat(record.get("timestamp", "")) <= end_time
-            )
+        # 收集IoT时序数据（按时间升序）
+        iot_data = self.iot_storage.query(
+            start=start_time,
+            end=end_time,
+            match={"resident_id": resident_id}
         )
         
         # 建立各项基线
@@ -201,11 +201,8 @@ class BaselineService:
         for date_key, records in daily_sleep.items():
             if not records:
                 continue
-                
-            # 按时间排序
-            records.sort(key=lambda x: x["timestamp"])
             
-            # 查找入睡时间（第一个进入睡眠状态的时间）
+            # 查找入睡时间（第一个进入睡眠状态的时间，iot_data已按时间有序）
             for record in records:
                 if record["sleep_state"] in ["258158006", "60984000"]:  # Light sleep or Deep sleep
                     bedtimes.append(record["timestamp"].time())
@@ -601,7 +598,6 @@ class BaselineService:
         # 基于数据间隔的一致性
         if len(iot_data) > 1:
             timestamps = [datetime.fromisoformat(r.get("timestamp", "")) for r in iot_data]
-            timestamps.sort()
             intervals = [(timestamps[i+1] - timestamps[i]).total_seconds() 
                         for i in range(len(timestamps)-1)]
             if intervals:
@@ -848,11 +844,10 @@ class BaselineService:
         start_time = end_time - timedelta(days=new_observation_days)
         
         # 获取新数据
-        new_iot_data = self.iot_storage.find_all(
-            lambda record: (
-                str(record.get("resident_id")) == str(resident_id) and
-                start_time <= datetime.fromisoformat(record.get("timestamp", "")) <= end_time
-            )
+        new_iot_data = self.iot_storage.query(
+            start=start_time,
+            end=end_time,
+            match={"resident_id": resident_id}
         )
         
         if new_iot_data:
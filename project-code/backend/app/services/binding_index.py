@@ -0,0 +1,352 @@
+"""
+设备绑定关系索引 - 接入时填充 location/room/bed/resident
+
+对齐源参考：
+- 11_devices.sql - devices.location_id / bound_room_id / bound_bed_id
+- 06_beds.sql - beds.resident_id（床位绑定住户）
+- 07_residents.sql - residents.bed_id / location_id
+- 15_config_versions.sql - device_installation配置版本（设备绑定的历史生效区间）、
+  resident_placement配置版本（住户入住床位/位置的历史区间）
+
+设计说明：
+- 从devices/beds/residents一次性构建 device_id -> 绑定关系 的字典，
+  每条接入记录只做一次字典查找（补传数据额外一次二分查找）
+- 设备当前绑定以devices表为准；device_installation中已失效（valid_to非空）的版本
+  按valid_from排序保存，用于为补传的历史数据匹配当时的绑定关系
+- 住户解析：床位绑定的住户优先；未绑定床位的设备，若所在位置只有一位在住住户则归属该住户
+- 两跳都按记录时间解析：设备 → 床位/位置 取当时的安装版本，床位/位置 → 住户 取当时的入住区间；
+  住户当前入住区间从其最近一次 resident_placement 的 valid_to（没有时取入住日期）开始，
+  住户换床、改位置、出院或删除时由API写入已结束的 resident_placement 版本（record_placement_end）；
+  实时数据落在当前区间内，只多一次字符串比较
+- devices/beds/residents/config_versions(device_installation/resident_placement)发生增删改时整体失效，
+  下一次查找时重建
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from uuid import UUID, uuid4
+from datetime import datetime
+from bisect import bisect_right
+import threading
+from loguru import logger
+
+from app.services.storage import StorageService
+from app.services.timeseries_store import normalize_timestamp
+
+
+# (valid_from, valid_to, resident_id)；valid_to为None表示当前入住，valid_from为""表示起点未知
+Placement = Tuple[str, Optional[str], str]
+
+
+def _id(value: Any) -> Optional[str]:
+    return str(value) if value else None
+
+
+def _ts(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    try:
+        return normalize_timestamp(value)
+    except (ValueError, TypeError):
+        return None
+
+
+class BindingIndex:
+    """设备 → 床位/房间/位置 → 住户 绑定索引"""
+
+    def __init__(self):
+        """初始化绑定索引（首次查找时构建）"""
+        self.device_storage = StorageService("devices")
+        self.bed_storage = StorageService("beds")
+        self.resident_storage = StorageService("residents")
+        self.config_storage = StorageService("config_versions")
+        self._lock = threading.Lock()
+        # 每次失效递增；构建完成时记录所基于的版本
+        self._generation = 0
+        self._built_generation = -1
+        # device_id -> 当前绑定
+        self._bindings: Dict[str, Dict[str, Optional[str]]] = {}
+        # device_id -> (valid_from列表, [(valid_to, 绑定)])，按valid_from升序
+        self._history: Dict[str, Tuple[List[str], List[Tuple[str, Dict[str, Optional[str]]]]]] = {}
+        # bed_id / location_id -> 入住区间，按valid_from升序
+        self._bed_placements: Dict[str, List[Placement]] = {}
+        self._location_placements: Dict[str, List[Placement]] = {}
+
+    def resolve(self, device_id: UUID | str,
+                timestamp: Optional[datetime | str] = None) -> Optional[Dict[str, Optional[str]]]:
+        """
+        查找设备在指定时间的绑定关系
+
+        Args:
+            device_id: 设备ID
+            timestamp: 数据时间（为空时返回当前绑定）
+
+        Returns:
+            {location_id, room_id, bed_id, resident_id}，设备未知时返回None
+        """
+        if self._built_generation != self._generation:
+            self._rebuild()
+
+        key = str(device_id)
+        binding = self._bindings.get(key)
+        if timestamp is None:
+            return binding
+        ts = _ts(timestamp)
+        if ts is None:
+            return binding
+
+        history = self._history.get(key)
+        if history is not None:
+            starts, entries = history
+            i = bisect_right(starts, ts) - 1
+            if i >= 0 and ts < entries[i][0]:
+                binding = entries[i][1]
+        if binding is None:
+            return None
+
+        if binding["bed_id"]:
+            resident_id = self._bed_resident_at(binding["bed_id"], ts)
+        elif binding["location_id"]:
+            resident_id = self._location_resident_at(binding["location_id"], ts)
+        else:
+            resident_id = None
+        if resident_id != binding["resident_id"]:
+            binding = {**binding, "resident_id": resident_id}
+        return binding
+
+    def _bed_resident_at(self, bed_id: str, ts: str) -> Optional[str]:
+        placements = self._bed_placements.get(bed_id)
+        if not placements:
+            return None
+        # 当前入住区间通常是最后一项，实时数据直接命中
+        for valid_from, valid_to, resident_id in reversed(placements):
+            if valid_from <= ts and (valid_to is None or ts < valid_to):
+                return resident_id
+        return None
+
+    def _location_resident_at(self, location_id: str, ts: str) -> Optional[str]:
+        placements = self._location_placements.get(location_id)
+        if not placements:
+            return None
+        residents = {
+            resident_id for valid_from, valid_to, resident_id in placements
+            if valid_from <= ts and (valid_to is None or ts < valid_to)
+        }
+        # 同一时间同一位置有多位住户时无法唯一归属
+        return residents.pop() if len(residents) == 1 else None
+
+    def stamp(self, record: Dict[str, Any], device_id: Optional[UUID | str] = None,
+              timestamp: Optional[datetime | str] = None) -> Dict[str, Any]:
+        """
+        为IoT记录填充绑定字段（只填充记录中为空的字段）
+
+        Args:
+            record: IoT时序数据记录
+            device_id: 设备ID（缺省取record.device_id）
+            timestamp: 数据时间（缺省取record.timestamp）
+
+        Returns:
+            填充后的记录（原地修改）
+        """
+        binding = self.resolve(
+            device_id or record.get("device_id"),
+            timestamp or record.get("timestamp")
+        )
+        if binding:
+            for field, value in binding.items():
+                if value is not None and record.get(field) is None:
+                    record[field] = value
+        return record
+
+    def invalidate(self) -> None:
+        """使索引失效（下一次查找时重建）"""
+        self._generation += 1
+
+    def record_placement_end(self, resident: Dict[str, Any], bed_id: Optional[UUID | str] = None,
+                             location_id: Optional[UUID | str] = None,
+                             ended_at: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        记录住户一段入住区间结束（换床、改位置、出院、删除时调用，写入前的住户记录）
+
+        区间起点取该住户最近一次 resident_placement 的 valid_to，没有时取入住日期。
+
+        Args:
+            resident: 变更前的住户记录
+            bed_id: 结束入住的床位（缺省取resident.bed_id）
+            location_id: 结束入住的位置（缺省取resident.location_id）
+            ended_at: 结束时间（缺省为当前UTC时间）
+
+        Returns:
+            写入的配置版本，住户没有床位/位置时返回None
+        """
+        resident_id = _id(resident.get("resident_id"))
+        bed_id = _id(bed_id or resident.get("bed_id"))
+        location_id = _id(location_id or resident.get("location_id"))
+        if not resident_id or not (bed_id or location_id):
+            return None
+
+        valid_to = normalize_timestamp(ended_at or datetime.utcnow())
+        ends = [
+            _ts(v.get("valid_to")) for v in self.config_storage.load_all()
+            if v.get("config_type") == "resident_placement" and str(v.get("entity_id")) == resident_id
+        ]
+        ends = [e for e in ends if e and e <= valid_to]
+        valid_from = max(ends) if ends else (_ts(resident.get("admission_date")) or valid_to)
+
+        now = datetime.now().isoformat()
+        version = {
+            "version_id": str(uuid4()),
+            "tenant_id": _id(resident.get("tenant_id")),
+            "config_type": "resident_placement",
+            "entity_id": resident_id,
+            "current_entity_id": resident_id,
+            "config_data": {"bed_id": bed_id, "location_id": location_id},
+            "valid_from": valid_from,
+            "valid_to": valid_to,
+            "is_active": True,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.config_storage.save_all(self.config_storage.load_all() + [version])
+        self.invalidate()
+        return version
+
+    def _rebuild(self) -> None:
+        with self._lock:
+            generation = self._generation
+            if self._built_generation == generation:
+                return
+
+            beds = {str(b["bed_id"]): b for b in self.bed_storage.load_all() if b.get("bed_id")}
+            versions = self.config_storage.load_all()
+
+            # 已结束的入住区间
+            bed_placements: Dict[str, List[Placement]] = {}
+            location_placements: Dict[str, List[Placement]] = {}
+            placement_ends: Dict[str, str] = {}
+            for version in versions:
+                if version.get("config_type") != "resident_placement" or not version.get("is_active", True):
+                    continue
+                valid_from, valid_to = _ts(version.get("valid_from")), _ts(version.get("valid_to"))
+                resident_id = _id(version.get("entity_id"))
+                if not valid_from or not valid_to or not resident_id:
+                    continue
+                placement_ends[resident_id] = max(placement_ends.get(resident_id, ""), valid_to)
+                data = version.get("config_data") or {}
+                if _id(data.get("bed_id")):
+                    bed_placements.setdefault(_id(data["bed_id"]), []).append((valid_from, valid_to, resident_id))
+                if _id(data.get("location_id")):
+                    location_placements.setdefault(_id(data["location_id"]), []).append(
+                        (valid_from, valid_to, resident_id)
+                    )
+
+            # 当前入住区间：从最近一次结束的区间（没有时为入住日期）开始
+            residents = {
+                str(r["resident_id"]): r for r in self.resident_storage.load_all() if r.get("resident_id")
+            }
+
+            def current_start(resident_id: str) -> str:
+                if resident_id in placement_ends:
+                    return placement_ends[resident_id]
+                resident = residents.get(resident_id) or {}
+                return _ts(resident.get("admission_date")) or ""
+
+            bed_residents: Dict[str, str] = {}
+            location_residents: Dict[str, Optional[str]] = {}
+            for bed_id, bed in beds.items():
+                if bed.get("resident_id"):
+                    bed_residents[bed_id] = str(bed["resident_id"])
+            for resident_id, resident in residents.items():
+                if resident.get("status", "active") != "active":
+                    continue
+                if resident.get("bed_id"):
+                    bed_residents.setdefault(str(resident["bed_id"]), resident_id)
+                location_id = _id(resident.get("location_id"))
+                if location_id:
+                    # 同一位置有多位住户时无法唯一归属
+                    location_residents[location_id] = (
+                        resident_id if location_id not in location_residents else None
+                    )
+                    location_placements.setdefault(location_id, []).append(
+                        (current_start(resident_id), None, resident_id)
+                    )
+            for bed_id, resident_id in bed_residents.items():
+                bed_placements.setdefault(bed_id, []).append((current_start(resident_id), None, resident_id))
+            for placements in (*bed_placements.values(), *location_placements.values()):
+                placements.sort(key=lambda p: p[0])
+
+            def compose(location_id, room_id, bed_id) -> Dict[str, Optional[str]]:
+                bed = beds.get(bed_id) if bed_id else None
+                if bed:
+                    room_id = room_id or _id(bed.get("room_id"))
+                    location_id = location_id or _id(bed.get("location_id"))
+                if bed_id:
+                    resident_id = bed_residents.get(bed_id)
+                else:
+                    resident_id = location_residents.get(location_id) if location_id else None
+                return {
+                    "location_id": location_id,
+                    "room_id": room_id,
+                    "bed_id": bed_id,
+                    "resident_id": resident_id,
+                }
+
+            bindings = {}
+            for device in self.device_storage.load_all():
+                if not device.get("device_id"):
+                    continue
+                bindings[str(device["device_id"])] = compose(
+                    _id(device.get("location_id")),
+                    _id(device.get("bound_room_id")),
+                    _id(device.get("bound_bed_id"))
+                )
+
+            grouped: Dict[str, List[Tuple[str, str, Dict[str, Optional[str]]]]] = {}
+            for version in versions:
+                if version.get("config_type") != "device_installation" or not version.get("is_active", True):
+                    continue
+                if not version.get("valid_from") or not version.get("valid_to"):
+                    # 当前生效的版本以devices表为准
+                    continue
+                try:
+                    valid_from = normalize_timestamp(version["valid_from"])
+                    valid_to = normalize_timestamp(version["valid_to"])
+                except (ValueError, TypeError):
+                    continue
+                data = version.get("config_data") or {}
+                grouped.setdefault(str(version.get("entity_id")), []).append((
+                    valid_from,
+                    valid_to,
+                    compose(
+                        _id(data.get("location_id")),
+                        _id(data.get("bound_room_id") or data.get("room_id")),
+                        _id(data.get("bound_bed_id") or data.get("bed_id"))
+                    )
+                ))
+
+            history = {}
+            for device_id, versions in grouped.items():
+                versions.sort(key=lambda v: v[0])
+                history[device_id] = (
+                    [v[0] for v in versions],
+                    [(v[1], v[2]) for v in versions]
+                )
+
+            self._bindings = bindings
+            self._history = history
+            self._bed_placements = bed_placements
+            self._location_placements = location_placements
+            self._built_generation = generation
+            logger.info(f"Built device binding index: {len(bindings)} devices, "
+                        f"{sum(len(h[0]) for h in history.values())} historical bindings, "
+                        f"{len(placement_ends)} residents with placement history")
+
+
+# 全局单例
+_binding_index = None
+
+def get_binding_index() -> BindingIndex:
+    """获取设备绑定索引单例"""
+    global _binding_index
+    if _binding_index is None:
+        _binding_index = BindingIndex()
+    return _binding_index
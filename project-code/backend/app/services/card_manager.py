@@ -5,12 +5,12 @@
 
 from typing import Dict, List, Any, Optional
 from uuid import UUID, uuid4
-from datetime import datetime
+from datetime import datetime, timedelta
 from loguru import logger
 
 from app.models.card import Card, CardType, CardCreate
-from app.models.iot_data import IOTTimeseries
 from app.services.storage import StorageService
+from app.services.timeseries_store import get_timeseries_store
 
 
 class CardManager:
@@ -24,7 +24,7 @@ class CardManager:
         self.location_storage = StorageService("locations")
         self.resident_storage = StorageService("residents")
         self.device_storage = StorageService("devices")
-        self.iot_storage = StorageService[IOTTimeseries]("iot_timeseries")
+        self.iot_storage = get_timeseries_store()
     
     def create_activebed_card(self, bed_id: UUID, tenant_id: UUID) -> Optional[Dict[str, Any]]:
         """
@@ -175,36 +175,30 @@ class CardManager:
                 aggregated["resident_info"] = resident[0]
         
         # 获取最近的IoT数据
-        start_time = datetime.now().timestamp() - (hours * 3600)
+        start_time = datetime.now() - timedelta(hours=hours)
         
-        # 根据卡片类型查询IoT数据
+        # 根据卡片类型查询IoT数据（按时间倒序）
         if card.get("bed_id"):
             # ActiveBed: 查询床位相关数据
-            iot_records = await self.iot_storage.find_all(
-                lambda r: (
-                    str(r.get("tenant_id")) == str(tenant_id) and
-                    r.get("bed_id") and
-                    str(r.get("bed_id")) == str(card.get("bed_id"))
-                )
+            iot_records = self.iot_storage.query(
+                start=start_time,
+                reverse=True,
+                filter_func=lambda r: str(r.get("tenant_id")) == str(tenant_id),
+                match={"bed_id": card.get("bed_id")}
             )
         elif card.get("location_id"):
             # Location: 查询位置相关数据
-            iot_records = await self.iot_storage.find_all(
-                lambda r: (
-                    str(r.get("tenant_id")) == str(tenant_id) and
-                    r.get("location_id") and
-                    str(r.get("location_id")) == str(card.get("location_id"))
-                )
+            iot_records = self.iot_storage.query(
+                start=start_time,
+                reverse=True,
+                filter_func=lambda r: str(r.get("tenant_id")) == str(tenant_id),
+                match={"location_id": card.get("location_id")}
             )
         else:
             iot_records = []
         
-        # 按时间排序，获取最新数据
+        # 获取最新数据
         if iot_records:
-            iot_records.sort(
-                key=lambda x: x.get("timestamp", "1970-01-01"),
-                reverse=True
-            )
             aggregated["latest_iot_data"] = iot_records[0]
             
             # 统计告警
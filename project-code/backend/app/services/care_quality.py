@@ -5,6 +5,7 @@
 - 17_care_quality_reports.sql - 护理质量报告表
 - AI护理.md - AI分析方法和指标
 - 评分维度包含告警响应速度和告警处理质量
+- 响应时间取自AlertStore的确认耗时直方图（按护士组 team_tags 维度），不再逐条扫描IoT数据
 """
 
 from typing import Dict, List, Any, Optional, Tuple
@@ -14,7 +15,9 @@ from collections import defaultdict
 import statistics
 
 from app.services.storage import StorageService
+from app.services.timeseries_store import get_timeseries_store
 from app.services.snomed_service import get_snomed_service
+from app.services.alert_store import get_alert_store
 
 
 class CareQualityService:
@@ -22,7 +25,7 @@ class CareQualityService:
     
     def __init__(self):
         """初始化护理质量服务"""
-        self.iot_storage = StorageService(collection="iot_timeseries")
+        self.iot_storage = get_timeseries_store()
         self.resident_storage = StorageService(collection="residents")
         self.caregiver_storage = StorageService(collection="resident_caregivers")
         self.location_storage = StorageService(collection="locations")
@@ -112,20 +115,17 @@ class CareQualityService:
         location_id = location.get("location_id")
         
         # 查询该位置的IoT数据（代表有人员活动）
-        location_iot_data = self.iot_storage.find_all(
-            lambda record: (
-                str(record.get("location_id")) == str(location_id) and
-                start_time <= datetime.fromisoformat(record.get("timestamp", "")) <= end_time
-            )
+        location_iot_data = self.iot_storage.query(
+            start=start_time,
+            end=end_time,
+            match={"location_id": location_id}
         )
         
         visit_count = len(location_iot_data)
         last_visit_time = None
         if location_iot_data:
-            # 找到最近一次访问时间
-            latest_record = max(location_iot_data, 
-                              key=lambda r: datetime.fromisoformat(r.get("timestamp", "")))
-            last_visit_time = latest_record.get("timestamp")
+            # 最近一次访问时间（结果按时间升序）
+            last_visit_time = location_iot_data[-1].get("timestamp")
         
         analysis = {
             "location_id": str(location_id),
@@ -231,6 +231,14 @@ class CareQualityService:
         report["metrics"]["fall_events"] = fall_events
         report["metrics"]["vital_sign_alerts"] = vital_alerts
         
+        # 响应时间：告警确认耗时直方图（告警状态变更时增量维护）
+        latency = get_alert_store().latency(
+            tenant_id, "ack", team=team_tag, hours=time_range_hours
+        )
+        report["metrics"]["avg_response_time_minutes"] = round(latency["mean_sec"] / 60, 1)
+        report["metrics"]["p90_response_time_minutes"] = round(latency["p90_sec"] / 60, 1)
+        report["metrics"]["acknowledged_alerts"] = latency["count"]
+        
         # 计算质量评分
         report["quality_score"] = self._calculate_quality_score(report["metrics"])
         
@@ -251,56 +259,21 @@ class CareQualityService:
             "alert_count": 0,
             "critical_alert_count": 0,
             "fall_count": 0,
-            "vital_alert_count": 0,
-            "avg_response_time": 0.0
+            "vital_alert_count": 0
         }
         
-        # 查询团队相关的IoT数据和告警记录
-        # 获取团队成员
-        team_members = self.caregiver_storage.find_all(
-            lambda cg: team_tag in str(cg.get("nurse_group_tags", []))
+        # 查询该住户时间范围内的IoT数据
+        iot_data = self.iot_storage.query(
+            start=start_time,
+            end=end_time,
+            match={"resident_id": resident_id}
         )
-        
-        team_resident_ids = set()
-        for member in team_members:
-            resident_id = member.get("resident_id")
-            if resident_id:
-                team_resident_ids.add(str(resident_id))
-        
-        if team_resident_ids:
-            # 查询这些住户的IoT数据
-            team_iot_data = self.iot_storage.find_all(
-                lambda record: (
-                    str(record.get("resident_id")) in team_resident_ids and
-                    start_time <= datetime.fromisoformat(record.get("timestamp", "")) <= end_time
-                )
-            )
-            
-            # 计算实际指标
-            analysis["total_events"] = len(team_iot_data)
-            
-            # 计算告警处理情况
-            alert_events = [r for r in team_iot_data if r.get("alert_triggered")]
+        if iot_data:
+            analysis["monitored"] = True
+            analysis["total_events"] = len(iot_data)
+            alert_events = [r for r in iot_data if r.get("alert_triggered")]
             analysis["alert_count"] = len(alert_events)
-            if team_iot_data:
-                analysis["alert_rate"] = len(alert_events) / len(team_iot_data)
-            
-            # 计算响应时间（简化：基于数据时间戳间隔）
-            if alert_events:
-                response_times = []
-                for alert in alert_events:
-                    alert_time = datetime.fromisoformat(alert.get("timestamp", ""))
-                    # 查找该告警后的第一次记录作为响应
-                    responses = [r for r in team_iot_data 
-                               if datetime.fromisoformat(r.get("timestamp", "")) > alert_time]
-                    if responses:
-                        first_response = min(responses, 
-                                           key=lambda r: datetime.fromisoformat(r.get("timestamp", "")))
-                        response_time = (datetime.fromisoformat(first_response.get("timestamp", "")) - alert_time).total_seconds() / 60
-                        response_times.append(response_time)
-                
-                if response_times:
-                    analysis["avg_response_time"] = statistics.mean(response_times)
+            analysis["alert_rate"] = len(alert_events) / len(iot_data)
         
         return analysis
     
@@ -484,11 +457,10 @@ class CareQualityService:
         }
         
         # 查询住户的IoT时序数据进行行为模式分析
-        resident_iot_data = self.iot_storage.find_all(
-            lambda record: (
-                str(record.get("resident_id")) == str(resident_id) and
-                start_time <= datetime.fromisoformat(record.get("timestamp", "")) <= end_time
-            )
+        resident_iot_data = self.iot_storage.query(
+            start=start_time,
+            end=end_time,
+            match={"resident_id": resident_id}
         )
         
         if resident_iot_data:
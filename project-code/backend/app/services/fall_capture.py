@@ -0,0 +1,356 @@
+"""
+跌倒事件前后轨迹采集服务 - 每设备固定容量环形缓冲
+
+对齐源参考：
+- TDPv2-0916.md - Person Matrix（轨迹坐标、姿态、生命体征）
+- 16_mapping_tables.sql - 姿态编码 1912002 (Fall)
+- 25_Alarm_Notification_Flow.md - 跌倒告警需附带现场信息供护理人员/质控复核
+
+设计说明：
+- 每个设备一个固定容量的环形缓冲，保存最近处理过的IoT记录引用（不复制），
+  写入只是一次槽位赋值，内存占用以 fall_clip_buffer_frames 为上限
+- 检测到跌倒时，从环形缓冲截取 fall_clip_pre_roll_sec 秒的前置帧，
+  之后继续收集 fall_clip_post_roll_sec 秒的后置帧，合并为一个跌倒片段
+- 片段以列式紧凑格式保存（fields + frames），时间为相对跌倒时刻的毫秒偏移，
+  包含该设备上所有目标的轨迹（可看到护理人员到场过程）
+- 片段ID写入告警数据（fall_clip_id）
+- 一次跌倒只开一个片段：同一设备同一跟踪目标在跌倒姿态持续期间（告警每帧触发）
+  直接关联已开启的片段，目标恢复非跌倒姿态或超过后置时长未再上报跌倒后，下一次跌倒才开新片段
+- 每设备同时收集的片段数以 fall_clip_max_pending_per_device 为上限，超出时关联到最新的片段
+  （片段本身包含该设备上所有目标的轨迹）
+- 完成的片段先放入内存队列，由后台任务每 fall_clip_flush_interval_sec 秒在线程中批量追加到
+  fall_clips 集合，热路径上不做文件读写；持久化之前 get_clip 同样可以查到
+- 设备在后置时段内停止上报时，超过后置时长+宽限期后按已收集的帧完成片段（后台任务同时检查）
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from uuid import UUID, uuid4
+from datetime import datetime
+import asyncio
+import threading
+import time
+from loguru import logger
+
+from app.config import settings
+from app.services.storage import StorageService
+
+# 片段帧字段（列式存储）
+CLIP_FIELDS = (
+    "offset_ms", "tracking_id",
+    "radar_pos_x", "radar_pos_y", "radar_pos_z",
+    "posture_snomed_code", "area_id", "heart_rate", "respiratory_rate",
+)
+
+# 设备停止上报时，后置时段结束后再等待的宽限时间（秒）
+_POST_ROLL_GRACE_SEC = 5
+
+# 跌倒姿态编码
+_FALL_POSTURE_CODE = "1912002"
+
+
+class FrameRing:
+    """固定容量的帧环形缓冲（保存记录引用）"""
+
+    __slots__ = ("capacity", "times", "frames", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.times: List[float] = [0.0] * self.capacity
+        self.frames: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self.head = 0
+        self.size = 0
+
+    def push(self, frame_time: float, record: Dict[str, Any]) -> None:
+        self.times[self.head] = frame_time
+        self.frames[self.head] = record
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def since(self, start_time: float) -> List[tuple]:
+        """按写入顺序返回时间不早于start_time的 (时间, 记录)"""
+        first = (self.head - self.size) % self.capacity
+        result = []
+        for i in range(self.size):
+            slot = (first + i) % self.capacity
+            if self.times[slot] >= start_time:
+                result.append((self.times[slot], self.frames[slot]))
+        return result
+
+
+class _PendingClip:
+    """收集后置帧中的片段"""
+
+    __slots__ = ("clip", "fall_time", "post_until", "deadline")
+
+    def __init__(self, clip: Dict[str, Any], fall_time: float, post_until: float, deadline: float):
+        self.clip = clip
+        self.fall_time = fall_time
+        self.post_until = post_until
+        self.deadline = deadline
+
+
+class FallCaptureService:
+    """跌倒片段采集服务"""
+
+    def __init__(self,
+                 pre_roll_sec: Optional[int] = None,
+                 post_roll_sec: Optional[int] = None,
+                 buffer_frames: Optional[int] = None):
+        """
+        初始化采集服务（参数缺省时取配置）
+
+        Args:
+            pre_roll_sec: 前置时长（秒）
+            post_roll_sec: 后置时长（秒）
+            buffer_frames: 每设备环形缓冲容量（帧）
+        """
+        self.pre_roll_sec = pre_roll_sec or settings.fall_clip_pre_roll_sec
+        self.post_roll_sec = post_roll_sec or settings.fall_clip_post_roll_sec
+        self.buffer_frames = buffer_frames or settings.fall_clip_buffer_frames
+        self.max_pending = max(1, settings.fall_clip_max_pending_per_device)
+        self.flush_interval = settings.fall_clip_flush_interval_sec
+        self.clip_storage = StorageService("fall_clips")
+        self._rings: Dict[str, FrameRing] = {}
+        # device_id -> 收集中的片段
+        self._pending: Dict[str, List[_PendingClip]] = {}
+        self._next_deadline = float("inf")
+        # device_id -> {tracking_id: (片段ID, 最近一次跌倒帧时间)}，跌倒持续期间复用片段
+        self._episodes: Dict[str, Dict[Any, Tuple[str, float]]] = {}
+        # 已完成、等待后台持久化的片段
+        self._completed: List[Dict[str, Any]] = []
+        self._completed_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"clips_started": 0, "fall_frames_attached": 0, "pending_cap_hits": 0, "clips_saved": 0}
+
+    def record(self, device_id: UUID | str, frame_time: float, record: Dict[str, Any]) -> None:
+        """
+        记录一帧已处理的数据（热路径：只保存引用）
+
+        Args:
+            device_id: 设备ID
+            frame_time: 帧时间（epoch秒）
+            record: IoT时序数据记录
+        """
+        key = str(device_id)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = FrameRing(self.buffer_frames)
+        ring.push(frame_time, record)
+
+        episodes = self._episodes.get(key)
+        if episodes and record.get("posture_snomed_code") != _FALL_POSTURE_CODE:
+            # 目标恢复非跌倒姿态，本次跌倒结束
+            if episodes.pop(record.get("tracking_id"), None) is not None and not episodes:
+                del self._episodes[key]
+
+        pending = self._pending.get(key)
+        if pending:
+            for item in list(pending):
+                if frame_time > item.post_until:
+                    self._complete(key, item)
+                else:
+                    item.clip["frames"].append(self._compact(frame_time, item.fall_time, record))
+
+        if time.monotonic() >= self._next_deadline:
+            self._expire()
+
+    def start_clip(self, tenant_id: UUID | str, device_id: UUID | str,
+                   tracking_id: Optional[int], frame_time: float,
+                   alert: Optional[Dict[str, Any]] = None) -> str:
+        """
+        开始一个跌倒片段（截取前置帧并开始收集后置帧）
+
+        同一目标的跌倒仍在持续、或设备收集中的片段已达上限时，不开新片段，关联到已有片段。
+
+        Args:
+            tenant_id: 租户ID
+            device_id: 设备ID
+            tracking_id: 跌倒目标的跟踪ID
+            frame_time: 跌倒帧时间（epoch秒）
+            alert: 告警数据（写入fall_clip_id）
+
+        Returns:
+            片段ID
+        """
+        key = str(device_id)
+        episodes = self._episodes.setdefault(key, {})
+        episode = episodes.get(tracking_id)
+        clip_id = None
+        if episode is not None and frame_time - episode[1] <= self.post_roll_sec:
+            clip_id = episode[0]
+        elif len(self._pending.get(key, ())) >= self.max_pending:
+            self._stats["pending_cap_hits"] += 1
+            clip_id = self._pending[key][-1].clip["clip_id"]
+        if clip_id is not None:
+            episodes[tracking_id] = (clip_id, frame_time)
+            self._stats["fall_frames_attached"] += 1
+            if alert is not None:
+                alert["fall_clip_id"] = clip_id
+            return clip_id
+
+        ring = self._rings.get(key)
+        pre_frames = ring.since(frame_time - self.pre_roll_sec) if ring else []
+
+        clip = {
+            "clip_id": str(uuid4()),
+            "tenant_id": str(tenant_id),
+            "device_id": key,
+            "tracking_id": tracking_id,
+            "fall_time": datetime.fromtimestamp(frame_time).isoformat(),
+            "pre_roll_sec": self.pre_roll_sec,
+            "post_roll_sec": self.post_roll_sec,
+            "status": "recording",
+            "fields": list(CLIP_FIELDS),
+            "frames": [self._compact(t, frame_time, r) for t, r in pre_frames],
+        }
+
+        deadline = time.monotonic() + self.post_roll_sec + _POST_ROLL_GRACE_SEC
+        self._pending.setdefault(key, []).append(
+            _PendingClip(clip, frame_time, frame_time + self.post_roll_sec, deadline)
+        )
+        self._next_deadline = min(self._next_deadline, deadline)
+        episodes[tracking_id] = (clip["clip_id"], frame_time)
+        self._stats["clips_started"] += 1
+
+        if alert is not None:
+            alert["fall_clip_id"] = clip["clip_id"]
+        logger.info(f"Started fall clip {clip['clip_id']} for device {key} "
+                    f"({len(clip['frames'])} pre-roll frames)")
+        return clip["clip_id"]
+
+    def get_clip(self, clip_id: UUID | str) -> Optional[Dict[str, Any]]:
+        """获取跌倒片段（包括仍在收集中的片段）"""
+        key = str(clip_id)
+        for pending in self._pending.values():
+            for item in pending:
+                if item.clip["clip_id"] == key:
+                    return item.clip
+        with self._completed_lock:
+            for clip in self._completed:
+                if clip["clip_id"] == key:
+                    return clip
+        return self.clip_storage.find_by_id("clip_id", key)
+
+    @staticmethod
+    def _compact(frame_time: float, fall_time: float, record: Dict[str, Any]) -> List[Any]:
+        return [
+            int(round((frame_time - fall_time) * 1000)),
+            record.get("tracking_id"),
+            record.get("radar_pos_x"),
+            record.get("radar_pos_y"),
+            record.get("radar_pos_z"),
+            record.get("posture_snomed_code"),
+            record.get("area_id"),
+            record.get("heart_rate"),
+            record.get("respiratory_rate"),
+        ]
+
+    def _complete(self, device_id: str, item: _PendingClip) -> None:
+        pending = self._pending.get(device_id)
+        if pending and item in pending:
+            pending.remove(item)
+            if not pending:
+                del self._pending[device_id]
+        item.clip["status"] = "complete"
+        item.clip["created_at"] = datetime.now().isoformat()
+        with self._completed_lock:
+            self._completed.append(item.clip)
+
+    def _expire(self) -> None:
+        """完成设备已停止上报、超过后置时长的片段"""
+        now = time.monotonic()
+        next_deadline = float("inf")
+        for device_id, pending in list(self._pending.items()):
+            for item in list(pending):
+                if item.deadline <= now:
+                    self._complete(device_id, item)
+                else:
+                    next_deadline = min(next_deadline, item.deadline)
+        self._next_deadline = next_deadline
+        # 清理已超过后置时长未再上报跌倒的目标（目标消失时不会收到非跌倒帧）
+        wall_now = time.time()
+        for device_id, episodes in list(self._episodes.items()):
+            for tracking_id, (_, last_fall) in list(episodes.items()):
+                if wall_now - last_fall > self.post_roll_sec + _POST_ROLL_GRACE_SEC:
+                    del episodes[tracking_id]
+            if not episodes:
+                del self._episodes[device_id]
+
+    def flush(self) -> int:
+        """
+        批量持久化已完成的片段（一次读写 fall_clips 集合）
+
+        Returns:
+            持久化的片段数量
+        """
+        with self._completed_lock:
+            clips, self._completed = self._completed, []
+        if not clips:
+            return 0
+        try:
+            # 直接追加（片段ID在开始采集时已写入告警，不能由create重新生成）
+            self.clip_storage.save_all(self.clip_storage.load_all() + clips)
+        except Exception as e:
+            logger.error(f"Error saving {len(clips)} fall clips: {e}")
+            with self._completed_lock:
+                self._completed[:0] = clips
+            return 0
+        self._stats["clips_saved"] += len(clips)
+        for clip in clips:
+            logger.info(f"Saved fall clip {clip['clip_id']} ({len(clip['frames'])} frames)")
+        return len(clips)
+
+    async def run_flush_loop(self) -> None:
+        """后台持久化循环（同时完成设备已停止上报的片段）"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                if time.monotonic() >= self._next_deadline:
+                    self._expire()
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Error flushing fall clips: {e}")
+
+    def start(self) -> None:
+        """启动后台持久化任务（需在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_flush_loop())
+
+    async def stop(self) -> None:
+        """停止后台持久化任务并保存剩余片段（收集中的片段按已收集的帧完成）"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for device_id, pending in list(self._pending.items()):
+            for item in list(pending):
+                self._complete(device_id, item)
+        self._next_deadline = float("inf")
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取采集统计"""
+        with self._completed_lock:
+            unsaved = len(self._completed)
+        return {
+            **self._stats,
+            "devices": len(self._rings),
+            "pending_clips": sum(len(p) for p in self._pending.values()),
+            "open_episodes": sum(len(e) for e in self._episodes.values()),
+            "unsaved_clips": unsaved,
+        }
+
+
+# 全局单例
+_fall_capture_service = None
+
+def get_fall_capture_service() -> FallCaptureService:
+    """获取跌倒片段采集服务单例"""
+    global _fall_capture_service
+    if _fall_capture_service is None:
+        _fall_capture_service = FallCaptureService()
+    return _fall_capture_service
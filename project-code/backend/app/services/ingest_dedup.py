@@ -0,0 +1,294 @@
+"""
+IoT数据接入去重服务 - 重复帧/重放抑制
+
+对齐源参考：
+- TDPv2-0916.md - 设备在弱网下会重传数据报文
+- 12_iot_timeseries.sql - (device_id, timestamp, tracking_id) 唯一标识一帧目标数据
+
+设计说明：
+- 幂等键：(device_id, timestamp, tracking_id)，时间戳精确到毫秒
+- 热窗口：最近 ingest_dedup_window_sec 秒内到达的键保存在有序哈希表中，精确去重
+- 冷分区：按数据时间戳划分分区（默认每小时一个），每个分区一个可扩展Bloom过滤器，
+  用于识别离线补传（/batch/upload）与已入库实时数据的重叠
+- 只有数据时间戳早于热窗口的键才查询冷分区：实时帧只做精确判重，不受Bloom误判影响
+- 可扩展Bloom过滤器：当前段达到容量后追加一段（容量翻倍、误判率减半），
+  分区内总误判率始终不超过 2 × ingest_dedup_bloom_error_rate，不随接入量退化
+- 判重只做哈希表查找和固定次数的位测试，不扫描存储
+- 超前于当前时间 ingest_max_clock_skew_sec 以上的时间戳按当前时间归入分区；
+  分区保留范围按服务器时间计算，时钟错误的设备不会挤掉正常分区
+- 判重（is_duplicate）与登记（add）分开：调用方在处理成功后才登记，处理失败时客户端的重试不会被当作重复
+- 早于最老保留分区的数据无法判重，直接放行并计入 unchecked 计数
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime
+from uuid import UUID
+import hashlib
+import math
+import time
+
+from app.config import settings
+
+
+class BloomFilter:
+    """固定容量的Bloom过滤器"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        初始化Bloom过滤器
+
+        Args:
+            capacity: 预期元素数量
+            error_rate: 目标误判率
+        """
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: bytes) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class ScalableBloomFilter:
+    """可扩展Bloom过滤器（满容量时追加容量翻倍、误判率减半的新段）"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        初始化过滤器
+
+        Args:
+            capacity: 第一段的容量
+            error_rate: 第一段的误判率（总误判率不超过其2倍）
+        """
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.stages: List[BloomFilter] = [BloomFilter(self.capacity, error_rate)]
+        self._stage_capacity = self.capacity
+
+    @property
+    def count(self) -> int:
+        return sum(stage.count for stage in self.stages)
+
+    def add(self, key: bytes) -> None:
+        stage = self.stages[-1]
+        if stage.count >= self._stage_capacity:
+            self._stage_capacity *= 2
+            stage = BloomFilter(self._stage_capacity, self.error_rate / (2 ** len(self.stages)))
+            self.stages.append(stage)
+        stage.add(key)
+
+    def __contains__(self, key: bytes) -> bool:
+        return any(key in stage for stage in self.stages)
+
+
+class IngestDeduplicator:
+    """接入去重器"""
+
+    def __init__(self,
+                 window_seconds: Optional[int] = None,
+                 partition_hours: Optional[int] = None,
+                 max_partitions: Optional[int] = None,
+                 bloom_capacity: Optional[int] = None,
+                 bloom_error_rate: Optional[float] = None):
+        """
+        初始化去重器（参数缺省时取配置）
+
+        Args:
+            window_seconds: 热窗口长度（秒）
+            partition_hours: 冷分区跨度（小时）
+            max_partitions: 保留的冷分区数量
+            bloom_capacity: 每个分区Bloom过滤器第一段的容量
+            bloom_error_rate: Bloom过滤器第一段的误判率
+        """
+        self.window_seconds = window_seconds or settings.ingest_dedup_window_sec
+        self.partition_seconds = (partition_hours or settings.ingest_dedup_partition_hours) * 3600
+        self.max_partitions = max_partitions or settings.ingest_dedup_partitions
+        self.bloom_capacity = bloom_capacity or settings.ingest_dedup_bloom_capacity
+        self.bloom_error_rate = bloom_error_rate or settings.ingest_dedup_bloom_error_rate
+        self.max_clock_skew = settings.ingest_max_clock_skew_sec
+
+        # 热窗口：key -> 到达时间（单调时钟），按到达顺序排列
+        self._recent: "OrderedDict[bytes, float]" = OrderedDict()
+        # 冷分区：partition_id -> ScalableBloomFilter
+        self._partitions: Dict[int, ScalableBloomFilter] = {}
+
+        self._stats = {
+            "checked": 0,
+            "accepted": 0,
+            "duplicates_recent": 0,
+            "duplicates_partition": 0,
+            "unchecked": 0,
+            "future_clamped": 0,
+        }
+
+    @staticmethod
+    def make_key(device_id: UUID | str, timestamp: datetime | str | float,
+                 tracking_id: Optional[int]) -> Tuple[bytes, float]:
+        """
+        生成幂等键
+
+        Returns:
+            (键, 数据时间戳的epoch秒)
+        """
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        epoch = timestamp.timestamp() if isinstance(timestamp, datetime) else float(timestamp)
+        track = -1 if tracking_id is None else tracking_id
+        return f"{device_id}|{int(epoch * 1000)}|{track}".encode(), epoch
+
+    def is_duplicate(self, device_id: UUID | str, timestamp: datetime | str | float,
+                     tracking_id: Optional[int]) -> bool:
+        """
+        判重（不登记）
+
+        Args:
+            device_id: 设备ID
+            timestamp: 数据时间戳
+            tracking_id: 目标跟踪ID
+
+        Returns:
+            True表示重复（应丢弃）
+        """
+        key, epoch = self.make_key(device_id, timestamp, tracking_id)
+        self._evict(time.monotonic())
+        self._stats["checked"] += 1
+
+        if key in self._recent:
+            self._stats["duplicates_recent"] += 1
+            return True
+
+        # 热窗口内的数据只做精确判重
+        if epoch >= time.time() - self.window_seconds:
+            return False
+
+        partition = self._partitions.get(self._partition_id(epoch))
+        if partition is not None and key in partition:
+            self._stats["duplicates_partition"] += 1
+            return True
+        return False
+
+    def add(self, device_id: UUID | str, timestamp: datetime | str | float,
+            tracking_id: Optional[int]) -> None:
+        """
+        登记已成功处理的数据
+
+        Args:
+            device_id: 设备ID
+            timestamp: 数据时间戳
+            tracking_id: 目标跟踪ID
+        """
+        key, epoch = self.make_key(device_id, timestamp, tracking_id)
+        self._recent[key] = time.monotonic()
+        self._recent.move_to_end(key)
+        partition = self._get_partition(self._partition_id(epoch))
+        if partition is not None:
+            partition.add(key)
+        else:
+            self._stats["unchecked"] += 1
+        self._stats["accepted"] += 1
+
+    def check_and_add(self, device_id: UUID | str, timestamp: datetime | str | float,
+                      tracking_id: Optional[int]) -> bool:
+        """
+        判重并登记
+
+        Args:
+            device_id: 设备ID
+            timestamp: 数据时间戳
+            tracking_id: 目标跟踪ID
+
+        Returns:
+            True表示新数据（应接收），False表示重复（应丢弃）
+        """
+        if self.is_duplicate(device_id, timestamp, tracking_id):
+            return False
+        self.add(device_id, timestamp, tracking_id)
+        return True
+
+    def filter_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        过滤重复的IoT记录
+
+        Args:
+            records: IoT时序数据记录（需包含device_id/timestamp/tracking_id）
+
+        Returns:
+            去重后的记录列表
+        """
+        return [
+            record for record in records
+            if self.check_and_add(record.get("device_id"), record.get("timestamp"), record.get("tracking_id"))
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取去重统计（命中率 = 重复数 / 检查数）"""
+        duplicates = self._stats["duplicates_recent"] + self._stats["duplicates_partition"]
+        checked = self._stats["checked"]
+        return {
+            **self._stats,
+            "duplicates": duplicates,
+            "hit_rate": round(duplicates / checked, 4) if checked else 0.0,
+            "recent_keys": len(self._recent),
+            "partitions": len(self._partitions),
+            "bloom_stages": sum(len(p.stages) for p in self._partitions.values()),
+            "window_seconds": self.window_seconds,
+        }
+
+    def _evict(self, now: float) -> None:
+        """淘汰热窗口中过期的键（键已登记在冷分区中）"""
+        cutoff = now - self.window_seconds
+        recent = self._recent
+        while recent:
+            key, arrived = next(iter(recent.items()))
+            if arrived >= cutoff:
+                break
+            recent.popitem(last=False)
+
+    def _partition_id(self, epoch: float) -> int:
+        """数据时间戳所在的分区（超前于当前时间的时间戳按当前时间处理）"""
+        now = time.time()
+        if epoch > now + self.max_clock_skew:
+            self._stats["future_clamped"] += 1
+            epoch = now
+        return int(epoch // self.partition_seconds)
+
+    def _get_partition(self, partition_id: int) -> Optional[ScalableBloomFilter]:
+        """获取（必要时创建）冷分区，超出保留范围（按服务器时间）的旧分区返回None"""
+        oldest = int(time.time() // self.partition_seconds) - self.max_partitions + 1
+        for stale in [pid for pid in self._partitions if pid < oldest]:
+            del self._partitions[stale]
+        if partition_id < oldest:
+            return None
+
+        partition = self._partitions.get(partition_id)
+        if partition is None:
+            partition = self._partitions[partition_id] = ScalableBloomFilter(
+                self.bloom_capacity, self.bloom_error_rate
+            )
+        return partition
+
+
+# 全局单例
+_ingest_deduplicator = None
+
+def get_ingest_deduplicator() -> IngestDeduplicator:
+    """获取接入去重器单例"""
+    global _ingest_deduplicator
+    if _ingest_deduplicator is None:
+        _ingest_deduplicator = IngestDeduplicator()
+    return _ingest_deduplicator
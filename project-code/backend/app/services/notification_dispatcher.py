@@ -0,0 +1,372 @@
+"""
+告警通知分发服务 - 按通道排队的异步发送
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 告警发送通道（WEB/APP/PHONE/EMAIL）
+- models/alert_policy.py - NotificationChannel
+
+设计说明：
+- 每个通道一个有界队列和固定数量的工作协程（并发上限），通道之间互不阻塞：
+  PHONE/EMAIL变慢或故障不会延迟WEB推送，也不会阻塞IoT接入路径
+- submit() 只做入队（非阻塞），可在事件循环线程或其他线程中调用；
+  队列已满时丢弃该通知并计数
+- 每次发送受通道超时限制；失败后按指数退避重新入队，
+  超过 notification_max_retries 次后放弃并计数
+- 通道适配器可插拔：register_adapter() 替换任意通道的实现；
+  内置适配器：
+    websocket  WEB推送（发布到实时推送总线，由 /api/v1/realtime WebSocket客户端订阅）
+    mock_push  模拟APP推送（记录到内存发件箱，便于测试）
+    file       追加写入 {data_dir}/notifications/{channel}.jsonl
+    smtp_debug 发送到本地调试SMTP服务器（如 python -m aiosmtpd -n -l localhost:1025）
+- 通道 → 适配器的映射由 notification_channel_adapters 配置（如 "APP:mock_push,EMAIL:smtp_debug"）
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from email.message import EmailMessage
+from pathlib import Path
+import asyncio
+import json
+import smtplib
+from loguru import logger
+
+from app.config import settings
+from app.services.realtime_bus import push_alert
+
+# 通道 -> (工作协程数, 发送超时秒)
+_CHANNEL_DEFAULTS: Dict[str, Tuple[int, float]] = {
+    "WEB": (4, 2.0),
+    "APP": (2, 5.0),
+    "PHONE": (2, 15.0),
+    "EMAIL": (2, 10.0),
+    "SMS": (2, 10.0),
+}
+
+# 退避上限（秒）
+_MAX_BACKOFF_SEC = 60.0
+
+
+class Notification:
+    """一条待发送的通知（一个告警在一个通道上的发送任务）"""
+
+    __slots__ = ("channel", "alert", "recipients", "attempt", "created_at")
+
+    def __init__(self, channel: str, alert: Dict[str, Any], recipients: List[str]):
+        self.channel = channel
+        self.alert = alert
+        self.recipients = recipients
+        self.attempt = 0
+        self.created_at = datetime.utcnow().isoformat()
+
+    @property
+    def title(self) -> str:
+        return f"[{self.alert.get('alert_level', 'L2')}] {self.alert.get('alert_type', 'alert')}"
+
+    @property
+    def body(self) -> str:
+        return self.alert.get("message", "")
+
+
+class ChannelAdapter(ABC):
+    """通道适配器基类（send失败时抛出异常以触发重试）"""
+
+    name = "base"
+
+    @abstractmethod
+    async def send(self, notification: Notification) -> None:
+        """发送一条通知"""
+
+
+class WebSocketAdapter(ChannelAdapter):
+    """WEB：推送给WebSocket客户端"""
+
+    name = "websocket"
+
+    async def send(self, notification: Notification) -> None:
+        push_alert(notification.alert)
+
+
+class MockPushAdapter(ChannelAdapter):
+    """
+    APP：模拟移动推送（保存到内存发件箱）
+
+    实际实现需要集成FCM（Firebase Cloud Messaging）或APNs：
+        from firebase_admin import messaging
+        messaging.send(messaging.Message(notification=messaging.Notification(title, body), token=token))
+    """
+
+    name = "mock_push"
+
+    def __init__(self, capacity: int = 1000):
+        self.outbox: deque = deque(maxlen=capacity)
+
+    async def send(self, notification: Notification) -> None:
+        self.outbox.append({
+            "channel": notification.channel,
+            "recipients": notification.recipients,
+            "title": notification.title,
+            "body": notification.body,
+            "alert_id": notification.alert.get("alert_id"),
+            "sent_at": datetime.utcnow().isoformat(),
+        })
+        logger.debug(f"Mock push {notification.title} to {notification.recipients}")
+
+
+class FileAdapter(ChannelAdapter):
+    """
+    通用：追加写入本地文件（PHONE/EMAIL的默认实现）
+
+    电话通知实际实现需要集成Twilio等语音服务：
+        client.calls.create(to=phone, from_=from_phone, twiml=f"<Response><Say>{message}</Say></Response>")
+    """
+
+    name = "file"
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = Path(directory or settings.data_dir) / "notifications"
+
+    async def send(self, notification: Notification) -> None:
+        line = json.dumps({
+            "channel": notification.channel,
+            "recipients": notification.recipients,
+            "title": notification.title,
+            "body": notification.body,
+            "alert_id": notification.alert.get("alert_id"),
+            "attempt": notification.attempt,
+            "sent_at": datetime.utcnow().isoformat(),
+        }, ensure_ascii=False)
+        await asyncio.to_thread(self._append, notification.channel, line)
+
+    def _append(self, channel: str, line: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / f"{channel.lower()}.jsonl", "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+class SmtpDebugAdapter(ChannelAdapter):
+    """EMAIL：发送到SMTP服务器（默认本地调试服务器，不做认证和TLS）"""
+
+    name = "smtp_debug"
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 sender: Optional[str] = None):
+        self.host = host or settings.notification_smtp_host
+        self.port = port or settings.notification_smtp_port
+        self.sender = sender or settings.notification_smtp_sender
+
+    async def send(self, notification: Notification) -> None:
+        message = EmailMessage()
+        message["Subject"] = f"Alert {notification.title}"
+        message["From"] = self.sender
+        message["To"] = ", ".join(notification.recipients)
+        message.set_content(notification.body)
+        await asyncio.to_thread(self._send, message)
+
+    def _send(self, message: EmailMessage) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=10) as server:
+            server.send_message(message)
+
+
+# 内置适配器
+ADAPTERS = {
+    "websocket": WebSocketAdapter,
+    "mock_push": MockPushAdapter,
+    "file": FileAdapter,
+    "smtp_debug": SmtpDebugAdapter,
+}
+
+_DEFAULT_ADAPTERS = {"WEB": "websocket", "APP": "mock_push", "PHONE": "file", "EMAIL": "file", "SMS": "file"}
+
+
+def _parse_adapter_config(value: str) -> Dict[str, str]:
+    """解析 "APP:mock_push,EMAIL:smtp_debug" 格式的通道适配器配置"""
+    result = {}
+    for item in (value or "").split(","):
+        if ":" in item:
+            channel, adapter = item.split(":", 1)
+            result[channel.strip().upper()] = adapter.strip()
+    return result
+
+
+class _ChannelWorker:
+    """单个通道的队列与工作协程"""
+
+    def __init__(self, channel: str, adapter: ChannelAdapter, concurrency: int, timeout: float):
+        self.channel = channel
+        self.adapter = adapter
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.stats = {"submitted": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+
+class NotificationDispatcher:
+    """告警通知分发器"""
+
+    def __init__(self):
+        """初始化分发器（按配置创建各通道适配器）"""
+        self.queue_size = settings.notification_queue_size
+        self.max_retries = settings.notification_max_retries
+        self.backoff_sec = settings.notification_retry_backoff_sec
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        mapping = {**_DEFAULT_ADAPTERS, **_parse_adapter_config(settings.notification_channel_adapters)}
+        self._channels: Dict[str, _ChannelWorker] = {}
+        for channel, adapter_name in mapping.items():
+            adapter_cls = ADAPTERS.get(adapter_name)
+            if adapter_cls is None:
+                logger.warning(f"Unknown notification adapter {adapter_name} for {channel}, using file")
+                adapter_cls = FileAdapter
+            concurrency, timeout = _CHANNEL_DEFAULTS.get(channel, (2, 10.0))
+            self._channels[channel] = _ChannelWorker(channel, adapter_cls(), concurrency, timeout)
+
+    def register_adapter(self, channel: str, adapter: ChannelAdapter,
+                         concurrency: Optional[int] = None, timeout: Optional[float] = None) -> None:
+        """
+        注册/替换通道适配器（需在start之前调用）
+
+        Args:
+            channel: 通道名（WEB/APP/PHONE/EMAIL/SMS）
+            adapter: 适配器实例
+            concurrency: 工作协程数
+            timeout: 发送超时（秒）
+        """
+        default_concurrency, default_timeout = _CHANNEL_DEFAULTS.get(channel, (2, 10.0))
+        self._channels[channel] = _ChannelWorker(
+            channel, adapter, concurrency or default_concurrency, timeout or default_timeout
+        )
+
+    def get_adapter(self, channel: str) -> Optional[ChannelAdapter]:
+        """获取通道当前使用的适配器"""
+        worker = self._channels.get(channel)
+        return worker.adapter if worker else None
+
+    def submit(self, alert: Dict[str, Any], channels: Optional[List[str]] = None,
+               recipients: Optional[List[str]] = None) -> int:
+        """
+        提交告警通知（非阻塞）
+
+        Args:
+            alert: 告警记录
+            channels: 发送通道（缺省取alert.channels）
+            recipients: 接收者（缺省取alert.recipients）
+
+        Returns:
+            入队的通知数量
+        """
+        if self._loop is None:
+            logger.warning(f"Notification dispatcher not running, alert {alert.get('alert_id')} not sent")
+            return 0
+
+        recipients = recipients if recipients is not None else alert.get("recipients", [])
+        notifications = []
+        for channel in channels if channels is not None else alert.get("channels", []):
+            if channel not in self._channels:
+                logger.warning(f"Unknown notification channel: {channel}")
+                continue
+            notifications.append(Notification(channel, alert, recipients))
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for notification in notifications:
+            if running is self._loop:
+                self._enqueue(notification)
+            else:
+                self._loop.call_soon_threadsafe(self._enqueue, notification)
+        return len(notifications)
+
+    def start(self) -> None:
+        """在当前事件循环中启动各通道工作协程"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        for worker in self._channels.values():
+            worker.queue = asyncio.Queue(maxsize=self.queue_size)
+            worker.tasks = [
+                self._loop.create_task(self._run(worker)) for _ in range(worker.concurrency)
+            ]
+
+    async def stop(self) -> None:
+        """停止工作协程（未发送的通知丢弃）"""
+        tasks = [task for worker in self._channels.values() for task in worker.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for worker in self._channels.values():
+            worker.tasks = []
+            worker.queue = None
+        self._loop = None
+
+    async def drain(self) -> None:
+        """等待所有已入队的通知处理完（不含等待重试中的通知）"""
+        for worker in self._channels.values():
+            if worker.queue is not None:
+                await worker.queue.join()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各通道统计"""
+        return {
+            channel: {
+                **worker.stats,
+                "adapter": worker.adapter.name,
+                "queued": worker.queue.qsize() if worker.queue else 0,
+                "concurrency": worker.concurrency,
+                "timeout_sec": worker.timeout,
+            }
+            for channel, worker in self._channels.items()
+        }
+
+    def _enqueue(self, notification: Notification) -> None:
+        worker = self._channels[notification.channel]
+        if worker.queue is None:
+            return
+        if notification.attempt == 0:
+            worker.stats["submitted"] += 1
+        try:
+            worker.queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            worker.stats["dropped"] += 1
+            logger.error(f"{notification.channel} notification queue full, "
+                         f"dropped alert {notification.alert.get('alert_id')}")
+
+    async def _run(self, worker: _ChannelWorker) -> None:
+        while True:
+            notification = await worker.queue.get()
+            try:
+                await asyncio.wait_for(worker.adapter.send(notification), worker.timeout)
+                worker.stats["sent"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._retry(worker, notification, e)
+            finally:
+                worker.queue.task_done()
+
+    def _retry(self, worker: _ChannelWorker, notification: Notification, error: Exception) -> None:
+        notification.attempt += 1
+        reason = "timeout" if isinstance(error, asyncio.TimeoutError) else str(error)
+        if notification.attempt > self.max_retries:
+            worker.stats["failed"] += 1
+            logger.error(f"{worker.channel} notification for alert {notification.alert.get('alert_id')} "
+                         f"failed after {notification.attempt} attempts: {reason}")
+            return
+        delay = min(_MAX_BACKOFF_SEC, self.backoff_sec * (2 ** (notification.attempt - 1)))
+        worker.stats["retried"] += 1
+        logger.warning(f"{worker.channel} notification failed ({reason}), retry {notification.attempt} in {delay}s")
+        self._loop.call_later(delay, self._enqueue, notification)
+
+
+# 全局单例
+_notification_dispatcher = None
+
+def get_notification_dispatcher() -> NotificationDispatcher:
+    """获取告警通知分发器单例"""
+    global _notification_dispatcher
+    if _notification_dispatcher is None:
+        _notification_dispatcher = NotificationDispatcher()
+    return _notification_dispatcher
@@ -4,7 +4,7 @@
 参考: 源参考文件/docs/24_Card_Permission_Design.md
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set
 from uuid import UUID
 from loguru import logger
 
@@ -101,6 +101,83 @@ class PermissionService:
         
         return []
     
+    def get_visible_scope(self, user_id: UUID, tenant_id: UUID) -> Optional[Dict[str, Any]]:
+        """
+        预先计算用户可见的卡片/住户/设备/位置（实时推送会话在连接时调用，规则与 can_view_card 相同）
+        
+        规则:
+        - 卡片: get_user_cards（Admin/ALL 为租户全部，LOCATION 按location_tag，ASSIGNED_ONLY 按护理分配）
+        - 住户: ActiveBed卡片的住户 + Location卡片所在位置的住户
+        - 设备: 可见卡片绑定的设备（card_devices）+ ActiveBed卡片床位上的设备
+        - 位置: Location卡片的位置
+        - Admin/ALL: 住户、设备、位置均为租户全部
+        
+        参数:
+            user_id: 用户ID
+            tenant_id: 租户ID
+            
+        返回:
+            Dict: {"all": 是否租户全部可见, "cards"/"residents"/"devices"/"locations": ID集合}；
+            用户不存在、已停用或不属于该租户时返回None
+        """
+        user = self._get_user(user_id)
+        if not user or str(user.get("tenant_id")) != str(tenant_id):
+            return None
+        if user.get("is_active", True) is False or user.get("status", "active") != "active":
+            return None
+        
+        tenant = str(tenant_id)
+        cards = self.get_user_cards(user_id, tenant_id)
+        all_access = user.get("role") == "Admin" or user.get("alert_scope", "ASSIGNED_ONLY") == "ALL"
+        card_ids = {str(c["card_id"]) for c in cards if c.get("card_id")}
+        
+        if all_access:
+            of_tenant = lambda r: str(r.get("tenant_id")) == tenant
+            return {
+                "all": True,
+                "cards": card_ids,
+                "residents": {str(r["resident_id"]) for r in self.resident_storage.find_all(of_tenant)
+                              if r.get("resident_id")},
+                "devices": {str(d["device_id"]) for d in StorageService("devices").find_all(of_tenant)
+                            if d.get("device_id")},
+                "locations": {str(l["location_id"]) for l in self.location_storage.find_all(of_tenant)
+                              if l.get("location_id")},
+            }
+        
+        location_ids = {
+            str(c["location_id"]) for c in cards
+            if c.get("card_type") == "Location" and c.get("location_id")
+        }
+        bed_ids = {
+            str(c["bed_id"]) for c in cards
+            if c.get("card_type") == "ActiveBed" and c.get("bed_id")
+        }
+        resident_ids = {str(c["resident_id"]) for c in cards if c.get("resident_id")}
+        if location_ids:
+            resident_ids |= {
+                str(r["resident_id"]) for r in self.resident_storage.find_all(
+                    lambda r: str(r.get("location_id")) in location_ids
+                ) if r.get("resident_id")
+            }
+        device_ids = {
+            str(link["device_id"]) for link in StorageService("card_devices").find_all(
+                lambda link: str(link.get("card_id")) in card_ids
+            ) if link.get("device_id")
+        }
+        if bed_ids:
+            device_ids |= {
+                str(d["device_id"]) for d in StorageService("devices").find_all(
+                    lambda d: str(d.get("bound_bed_id")) in bed_ids
+                ) if d.get("device_id")
+            }
+        return {
+            "all": False,
+            "cards": card_ids,
+            "residents": resident_ids,
+            "devices": device_ids,
+            "locations": location_ids,
+        }
+    
     def get_resident_cards(self, resident_id: UUID, tenant_id: UUID) -> List[Dict[str, Any]]:
         """
         获取住户可见的卡片列表
@@ -245,33 +322,53 @@ class PermissionService:
         - ActiveBed卡片: 住户分配给该用户
         - Location卡片: 有住户分配给该用户
         """
-        # 获取用户负责的所有住户
+        return self._is_assigned_card(card, self._get_assigned_resident_ids(user_id))
+    
+    def _get_assigned_resident_ids(self, user_id: UUID) -> Set[str]:
+        """
+        获取分配给用户的住户ID
+        
+        规则:
+        - resident_caregivers.caregiver_id1..5（兼容旧数据的 caregiver_id）包含该用户
+        - 未显式停用（is_active 不为 FALSE）
+        """
+        uid = str(user_id)
+        fields = ("caregiver_id",) + tuple(f"caregiver_id{i}" for i in range(1, 6))
         assignments = self.caregiver_storage.find_all(
-            lambda c: str(c.get("caregiver_id")) == str(user_id) and c.get("is_active") is True
+            lambda c: c.get("is_active", True) is not False and any(str(c.get(f)) == uid for f in fields)
         )
-        assigned_resident_ids = [a.get("resident_id") for a in assignments]
+        return {str(a.get("resident_id")) for a in assignments if a.get("resident_id")}
+    
+    def _is_assigned_card(self, card: Dict[str, Any], assigned: Set[str],
+                          location_residents: Optional[Dict[str, Set[str]]] = None) -> bool:
+        """
+        卡片是否属于已分配的住户
         
+        参数:
+            card: 卡片数据
+            assigned: 分配给用户的住户ID
+            location_residents: 位置ID -> 住户ID（批量过滤时预先构建，为空时按需查询）
+        """
+        if not assigned:
+            return False
         card_type = card.get("card_type")
         
         # ActiveBed卡片：检查resident_id
         if card_type == "ActiveBed":
-            card_resident_id = card.get("resident_id")
-            return str(card_resident_id) in [str(r) for r in assigned_resident_ids]
+            return str(card.get("resident_id")) in assigned
         
         # Location卡片：检查是否有分配的住户在该位置
         if card_type == "Location":
-            card_location_id = card.get("location_id")
-            # 查找在该位置的住户
-            residents_at_location = self.resident_storage.find_all(
-                lambda r: str(r.get("location_id")) == str(card_location_id)
-            )
-            location_resident_ids = [r.get("resident_id") for r in residents_at_location]
-            
-            # 检查是否有交集
-            return any(
-                str(rid) in [str(r) for r in assigned_resident_ids]
-                for rid in location_resident_ids
-            )
+            card_location_id = str(card.get("location_id"))
+            if location_residents is not None:
+                residents = location_residents.get(card_location_id, set())
+            else:
+                residents = {
+                    str(r.get("resident_id")) for r in self.resident_storage.find_all(
+                        lambda r: str(r.get("location_id")) == card_location_id
+                    )
+                }
+            return not residents.isdisjoint(assigned)
         
         return False
     
@@ -284,12 +381,17 @@ class PermissionService:
         return filtered
     
     def _filter_cards_by_assignment(self, user_id: UUID, cards: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """按ASSIGNED_ONLY权限过滤卡片"""
-        filtered = []
-        for card in cards:
-            if self._check_assigned_permission(user_id, card):
-                filtered.append(card)
-        return filtered
+        """按ASSIGNED_ONLY权限过滤卡片（分配关系和位置住户只读取一次）"""
+        assigned = self._get_assigned_resident_ids(user_id)
+        if not assigned:
+            return []
+        location_residents: Dict[str, Set[str]] = {}
+        for resident in self.resident_storage.load_all():
+            if resident.get("location_id"):
+                location_residents.setdefault(str(resident["location_id"]), set()).add(
+                    str(resident.get("resident_id"))
+                )
+        return [card for card in cards if self._is_assigned_card(card, assigned, location_residents)]
     
     def _get_resident_location_cards(
         self, 
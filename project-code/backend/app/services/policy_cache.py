@@ -0,0 +1,235 @@
+"""
+告警策略缓存 - 按租户预编译的云端告警策略
+
+对齐源参考：
+- 14_cloud_alert_policies.sql - 云端策略表（每租户一条，报警类型 → DangerLevel）
+- 25_Alarm_Notification_Flow.md - 告警级别 = max(云端级别, IoT级别)；通知、升级、抑制、静默规则
+- models/alert_policy.py - EscalationRule / SuppressionRule / SilenceRule / VitalSignThreshold
+
+设计说明：
+- 首次使用时一次性读取 cloud_alert_policies 并逐租户编译，之后告警处理只做字典查找，不读磁盘
+- /alert-policies 创建、更新、删除、初始化后调用 refresh(tenant_id)，
+  在请求处理中重新编译该租户的策略（删除时移除缓存）
+- 编译内容：
+  * alert_types: 报警类型 → DangerLevel（DISABLE/L1/L2，未配置的类型不出现）
+  * vital_thresholds: 生理指标 → [(级别, 区间列表, 持续时间)]，按L1、L2顺序；
+    告警引擎按 classify_vital 对生理指标告警重新分级，报警类型为DISABLE时不产生告警
+  * notification_rules: 级别 → 通知规则（channels/immediate/repeat_interval_sec）
+  * escalation / suppression / silence: 解析为 alert_policy 中对应的规则模型
+  * silence_mask: 静默规则编译后的168位周位图（租户本地时间，见silence_calendar）
+- 策略格式兼容两种存储形态：CloudAlertPolicy（规则在 notification_rules 下）
+  与 AlertPolicy（alert_types / vital_thresholds / escalation 等为顶层字段）
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from uuid import UUID
+import threading
+from loguru import logger
+from pydantic import ValidationError
+
+from app.models.alert import CloudAlertPolicyBase
+from app.models.alert_policy import EscalationRule, SuppressionRule, SilenceRule
+from app.services.storage import StorageService
+from app.services.silence_calendar import compile_week_mask
+
+# CloudAlertPolicy中的报警类型字段（值为DangerLevel）
+POLICY_ALERT_TYPES = tuple(
+    name for name, field in CloudAlertPolicyBase.model_fields.items()
+    if name[0].isupper()
+)
+
+# 级别严重程度（数值越小越严重）
+_LEVEL_RANK = {"L1": 1, "L2": 2, "L3": 3, "L5": 5, "L8": 8, "L9": 9}
+
+# 未配置通知规则时的默认通道
+_DEFAULT_CHANNELS = {"L1": ["WEB", "APP", "PHONE", "EMAIL"]}
+_FALLBACK_CHANNELS = ["WEB", "APP"]
+
+
+def max_level(*levels: Optional[str]) -> Optional[str]:
+    """返回最严重的告警级别（忽略空值和DISABLE）"""
+    ranked = [level for level in levels if level in _LEVEL_RANK]
+    return min(ranked, key=_LEVEL_RANK.__getitem__) if ranked else None
+
+
+class CompiledPolicy:
+    """编译后的租户告警策略（只读）"""
+
+    __slots__ = (
+        "tenant_id", "is_active", "alert_types", "vital_thresholds",
+        "notification_rules", "escalation", "suppression", "silence", "silence_mask",
+        "alert_scope", "alert_user_ids", "alert_tags",
+    )
+
+    def __init__(self, policy: Dict[str, Any]):
+        """
+        编译策略记录
+
+        Args:
+            policy: cloud_alert_policies 中的策略记录
+        """
+        self.tenant_id = str(policy.get("tenant_id"))
+        self.is_active = policy.get("is_active", True)
+
+        alert_types: Dict[str, str] = {}
+        for name in POLICY_ALERT_TYPES:
+            if policy.get(name):
+                alert_types[name] = policy[name]
+        for name, config in (policy.get("alert_types") or {}).items():
+            if isinstance(config, dict):
+                enabled = config.get("enabled", True)
+                alert_types[name] = config.get("danger_level", "L2") if enabled else "DISABLE"
+        self.alert_types = alert_types
+
+        self.vital_thresholds = self._compile_thresholds(policy)
+
+        rules = policy.get("notification_rules") or {}
+        self.notification_rules: Dict[str, Dict[str, Any]] = {}
+        if isinstance(rules, dict):
+            for level in _LEVEL_RANK:
+                if isinstance(rules.get(level), dict):
+                    self.notification_rules[level] = rules[level]
+        elif isinstance(rules, list):
+            for rule in rules:
+                if isinstance(rule, dict) and rule.get("level"):
+                    self.notification_rules[rule["level"]] = rule
+            rules = {}
+
+        self.escalation = self._parse_rule(EscalationRule, policy.get("escalation") or rules.get("escalation"))
+        self.suppression = self._parse_rule(SuppressionRule, policy.get("suppression") or rules.get("suppression"))
+        self.silence = self._parse_rule(SilenceRule, policy.get("silence") or rules.get("silence"))
+        self.silence_mask = compile_week_mask(self.silence)
+
+        self.alert_scope = policy.get("alert_scope", "NURSE_ONLY")
+        self.alert_user_ids = list(policy.get("alert_user_ids") or [])
+        self.alert_tags = list(policy.get("alert_tags") or [])
+
+    def level_for(self, policy_type: Optional[str]) -> Optional[str]:
+        """获取报警类型的云端级别（未配置返回None）"""
+        return self.alert_types.get(policy_type) if policy_type else None
+
+    def channels_for(self, level: str) -> List[str]:
+        """获取告警级别的通知通道"""
+        rule = self.notification_rules.get(level)
+        if rule and rule.get("channels"):
+            return list(rule["channels"])
+        return list(_DEFAULT_CHANNELS.get(level, _FALLBACK_CHANNELS))
+
+    def classify_vital(self, vital_type: str, value: Optional[float]) -> Optional[Tuple[str, int]]:
+        """
+        按阈值判定生理指标级别
+
+        Returns:
+            (级别, 持续时间秒)，正常或未配置时返回None
+        """
+        if value is None:
+            return None
+        for level, ranges, duration in self.vital_thresholds.get(vital_type, ()):
+            for low, high in ranges:
+                if (low is None or value >= low) and (high is None or value <= high):
+                    return level, duration
+        return None
+
+    @staticmethod
+    def _compile_thresholds(policy: Dict[str, Any]) -> Dict[str, List[Tuple[str, List[Tuple], int]]]:
+        compiled: Dict[str, List[Tuple[str, List[Tuple], int]]] = {}
+
+        def ranges_of(items) -> List[Tuple]:
+            return [(r.get("min"), r.get("max")) for r in items or [] if isinstance(r, dict)]
+
+        for vital_type, levels in (policy.get("conditions") or {}).items():
+            if not isinstance(levels, dict):
+                continue
+            entries = []
+            for level in ("L1", "L2"):
+                config = levels.get(level)
+                if isinstance(config, dict):
+                    entries.append((level, ranges_of(config.get("ranges")), int(config.get("duration_sec", 0))))
+            if entries:
+                compiled[vital_type] = entries
+
+        for vital_type, threshold in (policy.get("vital_thresholds") or {}).items():
+            if isinstance(threshold, dict):
+                compiled[vital_type] = [
+                    ("L1", ranges_of(threshold.get("l1_ranges")), int(threshold.get("l1_duration_sec", 60))),
+                    ("L2", ranges_of(threshold.get("l2_ranges")), int(threshold.get("l2_duration_sec", 300))),
+                ]
+        return compiled
+
+    @staticmethod
+    def _parse_rule(model, data: Optional[Dict[str, Any]]):
+        if not isinstance(data, dict):
+            return None
+        try:
+            return model(**data)
+        except ValidationError as e:
+            logger.warning(f"Ignoring invalid {model.__name__}: {e}")
+            return None
+
+
+class PolicyCache:
+    """按租户缓存的编译后告警策略"""
+
+    def __init__(self):
+        """初始化策略缓存（首次访问时整体加载）"""
+        self.policy_storage = StorageService(collection="cloud_alert_policies")
+        self._lock = threading.Lock()
+        self._policies: Dict[str, CompiledPolicy] = {}
+        self._loaded = False
+
+    def get(self, tenant_id: UUID | str) -> Optional[CompiledPolicy]:
+        """
+        获取租户的编译策略（不读磁盘，首次访问除外）
+
+        Args:
+            tenant_id: 租户ID
+
+        Returns:
+            编译后的策略，租户无策略或策略未启用时返回None
+        """
+        if not self._loaded:
+            self._load_all()
+        policy = self._policies.get(str(tenant_id))
+        return policy if policy is not None and policy.is_active else None
+
+    def refresh(self, tenant_id: UUID | str) -> None:
+        """
+        重新编译租户策略（策略创建/更新/删除后调用）
+
+        Args:
+            tenant_id: 租户ID
+        """
+        key = str(tenant_id)
+        if not self._loaded:
+            self._load_all()
+            return
+        record = self.policy_storage.find_by_id("tenant_id", key)
+        with self._lock:
+            if record:
+                self._policies[key] = CompiledPolicy(record)
+            else:
+                self._policies.pop(key, None)
+        logger.info(f"Refreshed alert policy cache for tenant {key}")
+
+    def _load_all(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            policies = {}
+            for record in self.policy_storage.load_all():
+                if record.get("tenant_id"):
+                    policies[str(record["tenant_id"])] = CompiledPolicy(record)
+            self._policies = policies
+            self._loaded = True
+            logger.info(f"Compiled alert policies for {len(policies)} tenants")
+
+
+# 全局单例
+_policy_cache = None
+
+def get_policy_cache() -> PolicyCache:
+    """获取告警策略缓存单例"""
+    global _policy_cache
+    if _policy_cache is None:
+        _policy_cache = PolicyCache()
+    return _policy_cache
@@ -0,0 +1,367 @@
+"""
+实时推送背板 - 多worker部署时的跨进程分发
+
+对齐源参考：
+- services/realtime_bus.py - 进程内实时推送总线
+- start_server.sh - uvicorn 启动方式（--workers 多进程时需要背板）
+
+设计说明：
+- 背板可插拔（realtime_backplane 配置）：
+  * memory（默认）：单worker，发布只在本进程内分发
+  * unix：本机Unix域套接字代理，所有worker连接到同一个代理
+- 发布流程：发布方在本进程内直接分发，同时把已编码的帧发给代理一次；
+  代理转发给其他worker，其他worker收到后只做本进程分发（不再转发）——
+  每条消息只跨一次进程边界，然后在各进程内扇出
+- 线路格式：4字节大端长度 + 载荷；载荷 = orjson([消息类型, 主题列表]) + b"\\0" + 帧文本（UTF-8）
+- 代理：
+  * 独立进程运行：python -m app.services.realtime_backplane
+  * 或由第一个连接失败的worker在进程内托管，通过 {path}.lock 文件锁选举，
+    同一时刻只有一个进程绑定套接字；托管的worker退出后其他worker重连并重新选举
+- 与代理断开期间发布只在本进程分发（不阻塞、不缓存）
+- 写缓冲超过 _MAX_BUFFER 的连接（代理侧的慢worker、worker侧的代理）：
+  有损消息（溢出策略为丢弃的类型，如iot_data，以及可合并的 live_state 状态帧）丢弃并计数；
+  可靠消息（告警等）不静默丢弃，记录错误并断开该慢连接（单独计数），由worker重连
+- 本进程分发（deliver）抛出的异常只记录日志，不中断接收协程
+"""
+
+from typing import Dict, List, Any, Optional, Callable, Set, Tuple
+from pathlib import Path
+import asyncio
+import os
+import struct
+import orjson
+from loguru import logger
+
+from app.config import settings
+from app.services.realtime_connection import Frame, overflow_policy, KEEP
+from app.services.realtime_delta import LIVE_STATE
+
+_HEADER = struct.Struct(">I")
+# 单条消息上限与单个连接的写缓冲上限（字节）
+_MAX_PAYLOAD = 16 * 1024 * 1024
+_MAX_BUFFER = 8 * 1024 * 1024
+_RECONNECT_MAX_SEC = 5.0
+
+Deliver = Callable[[Frame, List[str]], Any]
+
+
+def pack(frame: Frame, topics: List[str]) -> bytes:
+    """编码一条背板消息（含长度前缀）"""
+    payload = orjson.dumps([frame.type, topics]) + b"\0" + frame.text.encode()
+    return _HEADER.pack(len(payload)) + payload
+
+
+def is_reliable_type(message_type: Optional[str]) -> bool:
+    """
+    背板上是否按可靠消息处理（溢出策略为KEEP）
+
+    live_state 状态帧频率最高且可合并（下一帧覆盖上一帧），不在溢出策略配置中也按有损处理
+    """
+    return message_type != LIVE_STATE and overflow_policy(message_type) == KEEP
+
+
+def _is_reliable(packet: bytes) -> bool:
+    """已编码的消息（含长度前缀）是否为可靠消息"""
+    head = packet[_HEADER.size:packet.index(b"\0", _HEADER.size)]
+    return is_reliable_type(orjson.loads(head)[0])
+
+
+def unpack(payload: bytes) -> Tuple[Frame, List[str]]:
+    """解码背板消息载荷（不含长度前缀）"""
+    head, _, body = payload.partition(b"\0")
+    message_type, topics = orjson.loads(head)
+    return Frame(message_type, body.decode()), topics
+
+
+async def _read_packet(reader: asyncio.StreamReader) -> bytes:
+    """读取一条完整的消息（含长度前缀）"""
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    if length > _MAX_PAYLOAD:
+        raise ConnectionError(f"Backplane payload too large: {length}")
+    return header + await reader.readexactly(length)
+
+
+def default_path() -> str:
+    """代理套接字路径（realtime_backplane_path，缺省为 {data_dir}/realtime.sock）"""
+    return settings.realtime_backplane_path or str(Path(settings.data_dir) / "realtime.sock")
+
+
+def acquire_broker_lock(path: str) -> Optional[Any]:
+    """
+    尝试获得代理选举锁（非阻塞）
+
+    Args:
+        path: 代理套接字路径
+
+    Returns:
+        锁文件对象（进程存活期间持有，进程退出时自动释放）；已被其他进程持有时返回None
+    """
+    import fcntl
+
+    lock_file = open(f"{path}.lock", "a")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class BackplaneBroker:
+    """本机代理：把每个worker发来的消息转发给其他worker"""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        初始化代理
+
+        Args:
+            path: 套接字路径（缺省取配置）
+        """
+        self.path = path or default_path()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._stats = {"relayed": 0, "dropped": 0, "dropped_reliable": 0, "slow_worker_disconnects": 0}
+
+    async def start(self) -> None:
+        """绑定套接字（调用方须持有选举锁，残留的套接字文件会被删除）"""
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"Realtime backplane broker listening on {self.path}")
+
+    async def stop(self) -> None:
+        """关闭代理"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for writer in list(self._clients):
+            writer.close()
+        self._clients.clear()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while True:
+                packet = await _read_packet(reader)
+                reliable = None
+                for other in self._clients:
+                    if other is writer or other.transport.is_closing():
+                        continue
+                    if other.transport.get_write_buffer_size() > _MAX_BUFFER:
+                        if reliable is None:
+                            reliable = _is_reliable(packet)
+                        if reliable:
+                            # 可靠消息不静默丢弃：断开慢worker，由其重连
+                            self._stats["dropped_reliable"] += 1
+                            self._stats["slow_worker_disconnects"] += 1
+                            logger.error("Disconnecting slow realtime backplane worker: "
+                                         "write buffer full while relaying a reliable message")
+                            other.transport.abort()
+                        else:
+                            self._stats["dropped"] += 1
+                        continue
+                    other.write(packet)
+                    self._stats["relayed"] += 1
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # 代理关闭时取消连接处理协程（start_unix_server 的回调任务不需要向上传播取消）
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取代理统计"""
+        return {**self._stats, "workers": len(self._clients)}
+
+
+class Backplane:
+    """背板基类（memory：单进程，不跨进程转发）"""
+
+    name = "memory"
+
+    @property
+    def remote(self) -> bool:
+        """是否已连接到其他进程（决定没有本地连接时是否仍需编码并转发）"""
+        return False
+
+    async def start(self, deliver: Deliver) -> None:
+        """
+        启动背板
+
+        Args:
+            deliver: 收到其他进程的消息时调用 deliver(frame, topics)（在事件循环中）
+        """
+
+    def forward(self, frame: Frame, topics: List[str]) -> None:
+        """把本进程发布的消息转发给其他进程（只入写缓冲，不等待）"""
+
+    async def stop(self) -> None:
+        """停止背板"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取背板统计"""
+        return {"backplane": self.name}
+
+
+class UnixSocketBackplane(Backplane):
+    """通过本机Unix域套接字代理跨进程转发"""
+
+    name = "unix"
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        初始化背板
+
+        Args:
+            path: 代理套接字路径（缺省取配置）
+        """
+        self.path = path or default_path()
+        self._deliver: Optional[Deliver] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._broker: Optional[BackplaneBroker] = None
+        self._lock_file = None
+        self._stats = {
+            "forwarded": 0, "received": 0, "dropped": 0, "dropped_reliable": 0,
+            "slow_broker_disconnects": 0, "deliver_errors": 0, "reconnects": 0,
+        }
+
+    @property
+    def remote(self) -> bool:
+        return self._writer is not None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def forward(self, frame: Frame, topics: List[str]) -> None:
+        writer = self._writer
+        if writer is None:
+            return
+        if writer.transport.get_write_buffer_size() > _MAX_BUFFER:
+            if not is_reliable_type(frame.type):
+                self._stats["dropped"] += 1
+                return
+            # 可靠消息不静默丢弃：断开代理连接（接收协程随后重连），断开期间只在本进程分发
+            self._stats["dropped_reliable"] += 1
+            self._stats["slow_broker_disconnects"] += 1
+            logger.error(f"Disconnecting from slow realtime backplane broker: write buffer full "
+                         f"while forwarding {frame.type}")
+            self._writer = None
+            writer.transport.abort()
+            return
+        writer.write(pack(frame, topics))
+        self._stats["forwarded"] += 1
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._broker is not None:
+            await self._broker.stop()
+            self._broker = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _run(self) -> None:
+        """连接代理并接收其他进程的消息；断开后重连（必要时接管代理）"""
+        delay = 0.1
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not await self._host_broker():
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, _RECONNECT_MAX_SEC)
+                continue
+            delay = 0.1
+            self._writer = writer
+            logger.info(f"Connected to realtime backplane at {self.path}")
+            try:
+                while True:
+                    packet = await _read_packet(reader)
+                    self._stats["received"] += 1
+                    try:
+                        frame, topics = unpack(packet[_HEADER.size:])
+                        self._deliver(frame, topics)
+                    except Exception as e:
+                        self._stats["deliver_errors"] += 1
+                        logger.error(f"Error delivering realtime backplane message: {e}")
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                logger.warning(f"Realtime backplane connection lost: {e}")
+            finally:
+                self._writer = None
+                writer.close()
+            self._stats["reconnects"] += 1
+
+    async def _host_broker(self) -> bool:
+        """代理不存在时尝试在本进程托管（文件锁选举）"""
+        if self._broker is not None:
+            return False
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        lock_file = acquire_broker_lock(self.path)
+        if lock_file is None:
+            return False
+        self._lock_file = lock_file
+        self._broker = BackplaneBroker(self.path)
+        await self._broker.start()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {"backplane": self.name, "path": self.path, "connected": self.remote, **self._stats}
+        if self._broker is not None:
+            stats["broker"] = self._broker.get_stats()
+        return stats
+
+
+BACKPLANES = {
+    Backplane.name: Backplane,
+    UnixSocketBackplane.name: UnixSocketBackplane,
+}
+
+
+def create_backplane(name: Optional[str] = None) -> Backplane:
+    """
+    按配置创建背板
+
+    Args:
+        name: 背板名称（memory/unix，缺省取 realtime_backplane 配置）
+
+    Returns:
+        背板实例（未知名称时使用memory）
+    """
+    name = (name or settings.realtime_backplane or "memory").lower()
+    backplane_cls = BACKPLANES.get(name)
+    if backplane_cls is None:
+        logger.warning(f"Unknown realtime backplane {name}, using memory")
+        backplane_cls = Backplane
+    return backplane_cls()
+
+
+async def _serve_forever() -> None:
+    path = default_path()
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    lock_file = acquire_broker_lock(path)
+    if lock_file is None:
+        logger.error(f"Another realtime backplane broker is already serving {path}")
+        return
+    broker = BackplaneBroker(path)
+    await broker.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await broker.stop()
+        lock_file.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_serve_forever())
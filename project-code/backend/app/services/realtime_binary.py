@@ -0,0 +1,221 @@
+"""
+实时推送二进制协议 - MessagePack子协议（字符串驻留、整数时间戳）
+
+对齐源参考：
+- api/v1/realtime.py - 租户WebSocket（/api/v1/realtime/ws/{tenant_id}）
+- RFC 6455 §1.9 - Sec-WebSocket-Protocol 子协议协商
+- MessagePack 规范 - ext 类型
+
+设计说明：
+- 客户端握手时请求子协议 owlrd.msgpack.v1 则使用二进制帧，否则（默认）仍为JSON文本帧；
+  服务端未安装 msgpack 时不接受该子协议，客户端回退到JSON
+- 每条二进制消息为 MessagePack 数组：
+  * [0, {编号: 字符串, ...}]  字典定义：该连接接下来要用到的新驻留字符串
+  * [1, 消息体]               消息
+- 消息体相对JSON的变化：
+  * 对象的键替换为整数编号（JSON对象的键总是字符串，整数键不会混淆）
+  * 实体ID（INTERNED_ID_KEYS）的值替换为 ext 类型1（编号，大端无符号1/2/4字节）
+  * 时间字段（timestamp、*_at）的ISO字符串替换为整数毫秒时间戳（无时区的按服务器本地时间）
+- 编号来自进程内共享的驻留表（只增不减，上限 _MAX_INTERNED，超过后按原字符串发送），
+  消息体与连接无关：每帧的二进制变体只编码一次，所有二进制连接共享；
+  每个连接只记录已定义过的编号，写协程发送消息前补发该连接尚未见过的定义
+- 只驻留有界的字符串（对象键和实体ID），告警ID等无界字符串按原样发送
+- 客户端发往服务端的命令可以是JSON文本，也可以是普通的 MessagePack 对象（字符串键）
+- 只在事件循环线程中使用，不加锁
+"""
+
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from datetime import datetime
+import json
+
+try:
+    import msgpack
+except ImportError:
+    # 未安装msgpack时只提供JSON协议
+    msgpack = None
+
+SUBPROTOCOL_MSGPACK = "owlrd.msgpack.v1"
+
+ENVELOPE_DEFINITIONS = 0
+ENVELOPE_MESSAGE = 1
+EXT_INTERNED = 1
+
+# 值需要驻留的实体ID字段（数量有界）
+INTERNED_ID_KEYS = frozenset((
+    "tenant_id", "device_id", "resident_id", "card_id", "location_id", "room_id", "bed_id",
+))
+
+_MAX_INTERNED = 65536
+
+
+def binary_available() -> bool:
+    """是否支持二进制子协议（已安装msgpack）"""
+    return msgpack is not None
+
+
+class StringTable:
+    """进程内共享的字符串驻留表"""
+
+    def __init__(self, limit: int = _MAX_INTERNED):
+        """
+        初始化驻留表
+
+        Args:
+            limit: 最多驻留的字符串数
+        """
+        self.limit = limit
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+
+    def intern(self, value: str) -> Optional[int]:
+        """
+        驻留字符串
+
+        Args:
+            value: 字符串
+
+        Returns:
+            编号；驻留表已满时返回None（按原字符串发送）
+        """
+        string_id = self._ids.get(value)
+        if string_id is None:
+            if len(self._strings) >= self.limit:
+                return None
+            string_id = len(self._strings)
+            self._ids[value] = string_id
+            self._strings.append(value)
+        return string_id
+
+    def lookup(self, string_id: int) -> str:
+        """编号对应的字符串"""
+        return self._strings[string_id]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+# 全局单例
+_string_table = None
+
+def get_string_table() -> StringTable:
+    """获取字符串驻留表单例"""
+    global _string_table
+    if _string_table is None:
+        _string_table = StringTable()
+    return _string_table
+
+
+def _ref(string_id: int) -> Any:
+    size = 1 if string_id < 0x100 else 2 if string_id < 0x10000 else 4
+    return msgpack.ExtType(EXT_INTERNED, string_id.to_bytes(size, "big"))
+
+
+def _epoch_ms(value: str) -> Optional[int]:
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+class _BodyEncoder:
+    """把JSON消息转换为驻留后的消息体，并记录用到的编号"""
+
+    def __init__(self, table: StringTable):
+        self.table = table
+        # 按首次出现顺序去重
+        self.refs: Dict[int, None] = {}
+
+    def key(self, key: str) -> Any:
+        string_id = self.table.intern(key)
+        if string_id is None:
+            return key
+        self.refs[string_id] = None
+        return string_id
+
+    def value(self, value: Any, key: Optional[str] = None) -> Any:
+        if isinstance(value, dict):
+            return {self.key(k): self.value(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.value(v, key) for v in value]
+        if isinstance(value, str) and key is not None:
+            if key in INTERNED_ID_KEYS:
+                string_id = self.table.intern(value)
+                if string_id is not None:
+                    self.refs[string_id] = None
+                    return _ref(string_id)
+            elif key == "timestamp" or key.endswith("_at"):
+                epoch_ms = _epoch_ms(value)
+                if epoch_ms is not None:
+                    return epoch_ms
+        return value
+
+
+def encode_message(message: Dict[str, Any]) -> Tuple[bytes, Tuple[int, ...]]:
+    """
+    编码二进制消息（与连接无关，每帧只编码一次）
+
+    Args:
+        message: 已解析的JSON消息
+
+    Returns:
+        (二进制消息, 用到的驻留编号)
+    """
+    encoder = _BodyEncoder(get_string_table())
+    body = encoder.value(message)
+    return msgpack.packb([ENVELOPE_MESSAGE, body]), tuple(encoder.refs)
+
+
+def encode_definitions(string_ids: Iterable[int]) -> bytes:
+    """
+    编码字典定义消息
+
+    Args:
+        string_ids: 连接尚未见过的编号
+
+    Returns:
+        二进制消息
+    """
+    table = get_string_table()
+    return msgpack.packb([ENVELOPE_DEFINITIONS, {i: table.lookup(i) for i in string_ids}])
+
+
+def decode_message(data: bytes, dictionary: Dict[int, str]) -> Optional[Dict[str, Any]]:
+    """
+    解码服务端发送的二进制消息（参考实现，客户端按同样规则解码）
+
+    Args:
+        data: 二进制消息
+        dictionary: 该连接的字典（收到定义时原地更新）
+
+    Returns:
+        还原键和实体ID后的消息（时间字段保持毫秒时间戳）；字典定义消息返回None
+    """
+    def restore(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {dictionary[k] if isinstance(k, int) else k: restore(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [restore(v) for v in value]
+        if isinstance(value, msgpack.ExtType) and value.code == EXT_INTERNED:
+            return dictionary[int.from_bytes(value.data, "big")]
+        return value
+
+    envelope, payload = msgpack.unpackb(data, strict_map_key=False)
+    if envelope == ENVELOPE_DEFINITIONS:
+        dictionary.update(payload)
+        return None
+    return restore(payload)
+
+
+def decode_client_message(data: bytes) -> Dict[str, Any]:
+    """
+    解码客户端发送的二进制命令
+
+    Args:
+        data: MessagePack对象（未安装msgpack时按JSON字节解析）
+
+    Returns:
+        命令
+    """
+    if msgpack is None:
+        return json.loads(data)
+    return msgpack.unpackb(data)
@@ -0,0 +1,582 @@
+"""
+实时推送总线 - 进程内发布/订阅
+
+对齐源参考：
+- api/v1/realtime.py - 租户WebSocket（/api/v1/realtime/ws/{tenant_id}，按设备/住户/卡片/位置订阅）
+- api/v1/websocket.py - 数据流WebSocket（/api/v1/realtime/ws，订阅 alerts/devices/iot_data/residents）
+- 25_Alarm_Notification_Flow.md - WEB通道告警推送
+
+设计说明：
+- 所有生产者（IoT接入、告警WEB通道、卡片变更、设备状态、住户变更）只调用本模块的
+  push_* / publish；两个WebSocket端点只负责接受连接和维护订阅，分发逻辑集中在这里
+- 路由主题：
+  * 实体主题 tenant/device/resident/card/location（见 realtime_topics）
+  * 数据流主题 stream:{流} 与 stream:{流}@{租户}（websocket.py 的 topic + filters.tenant_id）
+  一条消息投递到所有匹配主题订阅连接的并集：只编码一次，每个连接最多收到一次
+- 每个连接一个有界发送队列和写协程（见 realtime_connection），发布只做入队
+- publish 可在任意线程调用：不在事件循环线程时编码后通过 call_soon_threadsafe 转入事件循环
+- IoT数据：card / device 主题按节拍推送合并后的增量（见 realtime_delta），逐帧的 iot_data
+  只推送给 resident / location 主题和 iot_data 数据流；状态更新以 live_state 消息发布
+  （跨worker时同样经背板转发），在各进程的 _deliver 中合并而不是直接下发
+- 可靠消息（告警、设备/住户/卡片变更）在投递前按主题编号并写入重放环（见 realtime_replay），
+  即使没有连接也照常编号；客户端重连时按 last_seq 补发缺口或收到 resync_required
+- 已认证连接（见 realtime_session）按连接时预先计算的可见范围订阅路由主题，
+  订阅请求在 subscribe 时校验；可见范围相关数据变更后调用 refresh_sessions 重新计算：
+  按租户合并（realtime_session_refresh_debounce_sec 内的多次变更只重新计算一次），
+  可见范围在线程池中计算（读取存储，不阻塞事件循环），订阅的增减回到事件循环中执行
+- 心跳由总线统一调度（见 realtime_heartbeat）：连接分散到各时间槽，失联连接直接经 disconnect 回收
+- 多worker部署时通过背板（见 realtime_backplane）跨进程分发：本进程发布的消息本地分发并
+  转发给背板一次，从背板收到的消息只做本地分发（不再转发）
+"""
+
+from typing import Dict, Set, Any, Optional, Iterable, List, Tuple
+from datetime import datetime
+import asyncio
+import orjson
+from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+from loguru import logger
+
+from app.services.realtime_connection import (
+    RealtimeConnection, Frame, encode_frame, SLOW_CONSUMER_CLOSE_CODE
+)
+from app.services.realtime_session import RealtimeSession, build_session
+from app.services.realtime_heartbeat import HeartbeatScheduler, HEARTBEAT_TIMEOUT_CLOSE_CODE
+from app.services.realtime_replay import ReplayBuffer
+from app.services.realtime_backplane import Backplane, create_backplane, is_reliable_type
+from app.services.realtime_delta import LiveStateCoalescer, LIVE_STATE, live_fields, is_live_topic
+from app.services.realtime_topics import (
+    SubscriptionIndex, make_topic, TENANT, DEVICE, RESIDENT, CARD, LOCATION, STREAM
+)
+from app.services.alert_routing import get_alert_routing_index
+from app.config import settings
+
+# 会话被撤销时的关闭码（RFC 6455: 1008 Policy Violation）
+POLICY_VIOLATION_CLOSE_CODE = 1008
+
+# 数据流
+STREAM_ALERTS = "alerts"
+STREAM_DEVICES = "devices"
+STREAM_IOT_DATA = "iot_data"
+STREAM_RESIDENTS = "residents"
+STREAM_CARDS = "cards"
+
+STREAMS = (STREAM_ALERTS, STREAM_DEVICES, STREAM_IOT_DATA, STREAM_RESIDENTS, STREAM_CARDS)
+
+# 不推送给客户端的IoT记录字段（原始二进制帧）
+_IOT_PRIVATE_FIELDS = ("raw_original", "raw_format", "raw_compression")
+
+
+def stream_topic(stream: str, tenant_id: Optional[str] = None) -> str:
+    """
+    数据流主题
+
+    Args:
+        stream: 数据流（STREAMS之一）
+        tenant_id: 租户ID（为空时为全部租户）
+
+    Returns:
+        "stream:{流}" 或 "stream:{流}@{租户}"
+    """
+    return make_topic(STREAM, f"{stream}@{tenant_id}" if tenant_id else stream)
+
+
+class RealtimeBus:
+    """进程内实时推送总线"""
+
+    def __init__(self):
+        """初始化总线"""
+        self.index = SubscriptionIndex()
+        self.connections: Set[RealtimeConnection] = set()
+        self.deltas = LiveStateCoalescer(self.index)
+        self.replay = ReplayBuffer(has_subscribers=lambda topic: bool(self.index.subscribers(topic)))
+        self.heartbeats = HeartbeatScheduler(self.disconnect)
+        self.backplane: Backplane = Backplane()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 等待重新计算会话的租户（None表示全部租户）及其任务
+        self._refresh_pending: Set[Optional[str]] = set()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._stats = {"published": 0, "delivered": 0, "slow_consumer_disconnects": 0,
+                       "heartbeat_timeouts": 0, "session_refreshes": 0}
+
+    async def start(self, backplane: Optional[Backplane] = None) -> None:
+        """
+        启动总线（应用启动时调用）：记录事件循环并连接背板
+
+        Args:
+            backplane: 背板（缺省按 realtime_backplane 配置创建）
+        """
+        self._loop = asyncio.get_running_loop()
+        self.backplane = backplane or create_backplane()
+        await self.backplane.start(self._deliver)
+        self.deltas.start()
+        self.heartbeats.start()
+        logger.info(f"Realtime bus started (backplane={self.backplane.name})")
+
+    async def stop(self) -> None:
+        """停止背板、增量和心跳协程（应用关闭时调用）"""
+        await self.backplane.stop()
+        self.backplane = Backplane()
+        await self.deltas.stop()
+        await self.heartbeats.stop()
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        self._refresh_pending.clear()
+
+    def has_audience(self) -> bool:
+        """是否可能有接收者（有本地连接，或已连接到其他worker）"""
+        return bool(self.connections) or self.backplane.remote
+
+    async def connect(self, websocket: WebSocket, tenant_id: Optional[str] = None,
+                      subprotocol: Optional[str] = None,
+                      session: Optional[RealtimeSession] = None) -> RealtimeConnection:
+        """
+        接受新连接并启动写协程
+
+        Args:
+            websocket: WebSocket
+            tenant_id: 租户ID（未认证连接提供时自动订阅租户主题）
+            subprotocol: 协商的子协议（None为默认的JSON文本帧）
+            session: 已认证会话（与tenant_id同时提供时只订阅会话可见的路由主题；
+                     数据流连接不提供tenant_id，不自动订阅）
+
+        Returns:
+            连接
+        """
+        await websocket.accept(subprotocol=subprotocol)
+        self._loop = asyncio.get_running_loop()
+        connection = RealtimeConnection(websocket, tenant_id, subprotocol=subprotocol)
+        connection.session = session
+        connection.start()
+        self.deltas.start()
+        self.heartbeats.start()
+        self.connections.add(connection)
+        self.heartbeats.register(connection)
+        if session is not None:
+            if tenant_id:
+                for topic in session.routing_topics():
+                    self.index.subscribe(connection, topic)
+        elif tenant_id:
+            self.index.subscribe(connection, make_topic(TENANT, tenant_id))
+        logger.info(f"WebSocket connected: tenant={tenant_id}, total={len(self.connections)}")
+        return connection
+
+    async def disconnect(self, connection: RealtimeConnection) -> None:
+        """断开连接（只清理该连接自己的订阅）"""
+        if connection not in self.connections:
+            return
+        self.connections.discard(connection)
+        self.heartbeats.unregister(connection)
+        self.index.remove(connection)
+        self.deltas.forget(connection)
+        if connection.close_code == SLOW_CONSUMER_CLOSE_CODE:
+            self._stats["slow_consumer_disconnects"] += 1
+        elif connection.close_code == HEARTBEAT_TIMEOUT_CLOSE_CODE:
+            self._stats["heartbeat_timeouts"] += 1
+        await connection.close()
+        logger.info(f"WebSocket disconnected: tenant={connection.tenant_id}, total={len(self.connections)}")
+
+    @staticmethod
+    def authorized(connection: RealtimeConnection, topic: str) -> bool:
+        """连接是否可以订阅主题（未认证连接不限制）"""
+        return connection.session is None or connection.session.can_subscribe(topic)
+
+    def subscribe(self, connection: RealtimeConnection, topic: str) -> bool:
+        """订阅主题（返回是否为新订阅；新订阅卡片/设备时发送快照；会话不可见的主题不订阅）"""
+        if connection not in self.connections or not self.authorized(connection, topic):
+            return False
+        added = self.index.subscribe(connection, topic)
+        if added and is_live_topic(topic):
+            self.deltas.snapshot(connection, [topic])
+        return added
+
+    def unsubscribe(self, connection: RealtimeConnection, topic: str) -> bool:
+        """取消订阅主题（返回是否存在该订阅）"""
+        self.deltas.forget(connection, topic)
+        return self.index.unsubscribe(connection, topic)
+
+    def resync(self, connection: RealtimeConnection, topic: Optional[str] = None) -> bool:
+        """
+        重新发送卡片/设备的完整快照（客户端状态错乱或重连后调用）
+
+        Args:
+            connection: 连接
+            topic: 主题（为None时为该连接订阅的全部卡片/设备）
+
+        Returns:
+            是否入队
+        """
+        topics = [t for t in ([topic] if topic else self.index.topics_of(connection))
+                  if t in self.index.topics_of(connection) and is_live_topic(t)]
+        return self.deltas.snapshot(connection, topics)
+
+    def refresh_sessions(self, tenant_id: Optional[str] = None) -> None:
+        """
+        可见范围相关数据（护理分配、卡片、用户、住户、床位、位置、设备）变更后重新计算会话，可在任意线程调用
+
+        只登记，不等待：同一租户在防抖窗口内的多次调用合并为一次重新计算
+
+        Args:
+            tenant_id: 租户ID（为None时全部租户）
+        """
+        loop = self._loop
+        if loop is None:
+            return
+        tenant = str(tenant_id) if tenant_id else None
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._schedule_refresh(tenant)
+        else:
+            loop.call_soon_threadsafe(self._schedule_refresh, tenant)
+
+    def _schedule_refresh(self, tenant: Optional[str]) -> None:
+        if tenant in self._refresh_pending or None in self._refresh_pending:
+            return
+        self._refresh_pending.add(tenant)
+        task = asyncio.get_running_loop().create_task(self._refresh_later(tenant))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh_later(self, tenant: Optional[str]) -> None:
+        await asyncio.sleep(settings.realtime_session_refresh_debounce_sec)
+        # 计算期间的新变更重新登记，计算完成后再刷新一次
+        self._refresh_pending.discard(tenant)
+        keys = {
+            (connection.session.user_id, connection.session.tenant_id)
+            for connection in self.connections
+            if connection.session is not None and (not tenant or connection.session.tenant_id == tenant)
+        }
+        if not keys:
+            return
+        try:
+            sessions = await asyncio.get_running_loop().run_in_executor(None, self._build_sessions, keys)
+        except Exception as e:
+            logger.error(f"Error refreshing realtime sessions (tenant={tenant}): {e}")
+            return
+        self._apply_sessions(sessions)
+
+    @staticmethod
+    def _build_sessions(keys: Set[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[RealtimeSession]]:
+        """计算会话（线程池中执行，只读存储）"""
+        return {key: build_session(*key) for key in keys}
+
+    def _apply_sessions(self, sessions: Dict[Tuple[str, str], Optional[RealtimeSession]]) -> int:
+        """按重新计算的会话调整连接的订阅（事件循环中执行）"""
+        refreshed = 0
+        for connection in list(self.connections):
+            old = connection.session
+            if old is None:
+                continue
+            key = (old.user_id, old.tenant_id)
+            if key not in sessions:
+                continue
+            session = sessions[key]
+            if session is None:
+                # 用户被停用、删除或移出租户
+                connection.terminate("session revoked", POLICY_VIOLATION_CLOSE_CODE)
+                continue
+            connection.session = session
+            for topic in list(self.index.topics_of(connection)):
+                if not session.can_subscribe(topic):
+                    self.unsubscribe(connection, topic)
+            if connection.tenant_id:
+                for topic in session.routing_topics() - old.routing_topics():
+                    self.subscribe(connection, topic)
+            refreshed += 1
+        self._stats["session_refreshes"] += 1
+        if refreshed:
+            logger.info(f"Refreshed {refreshed} realtime sessions")
+        return refreshed
+
+    def resume(self, connection: RealtimeConnection, topic: str, last_seq: int,
+               epoch: Optional[str] = None) -> int:
+        """
+        补发连接断线期间错过的消息（须在订阅该主题之后调用）
+
+        Args:
+            connection: 连接
+            topic: 主题
+            last_seq: 客户端在该主题最后收到的序号
+            epoch: 客户端记录的epoch
+
+        Returns:
+            补发的消息数；缺口超出重放环时发送 resync_required 标记并返回-1
+        """
+        frames = self.replay.since(topic, last_seq, epoch)
+        if frames is None:
+            connection.send(self.replay.resync_marker(topic))
+            return -1
+        for frame in frames:
+            connection.send(frame)
+        return len(frames)
+
+    @staticmethod
+    def _sequenced(message_type: Optional[str]) -> bool:
+        """是否为需要编号的可靠消息"""
+        return is_reliable_type(message_type)
+
+    def publish(self, message: Dict[str, Any] | Frame, topics: Iterable[Optional[str]]) -> int:
+        """
+        向多个主题的订阅者发布同一条消息
+
+        Args:
+            message: 消息或已编码的帧
+            topics: 主题（None会被忽略）
+
+        Returns:
+            本进程入队的连接数（从其他线程发布时为0，投递在事件循环中完成）
+        """
+        message_type = message.type if isinstance(message, Frame) else message.get("type")
+        if not self.has_audience() and not self._sequenced(message_type):
+            return 0
+        topics = [t for t in topics if t]
+        self._stats["published"] += 1
+        loop = self._loop
+        if loop is not None:
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is not loop:
+                frame = message if isinstance(message, Frame) else encode_frame(message)
+                loop.call_soon_threadsafe(self._publish_frame, frame, topics)
+                return 0
+        if not self.backplane.remote:
+            return self._deliver(message, topics)
+        frame = message if isinstance(message, Frame) else encode_frame(message)
+        return self._publish_frame(frame, topics)
+
+    def publish_event(self, message: Dict[str, Any] | Frame, tenant_id: Optional[str] = None,
+                      device_id: Optional[str] = None, resident_id: Optional[str] = None,
+                      card_id: Optional[str] = None, location_id: Optional[str] = None,
+                      stream: Optional[str] = None) -> int:
+        """
+        按实体和数据流发布消息
+
+        Args:
+            message: 消息或已编码的帧
+            tenant_id: 租户ID（租户主题；同时决定数据流的租户过滤主题）
+            device_id: 设备ID
+            resident_id: 住户ID
+            card_id: 卡片ID
+            location_id: 位置ID
+            stream: 数据流（STREAMS之一）
+
+        Returns:
+            入队的连接数
+        """
+        topics: List[Optional[str]] = [
+            make_topic(kind, topic_id) if topic_id else None
+            for kind, topic_id in (
+                (TENANT, tenant_id), (DEVICE, device_id), (RESIDENT, resident_id),
+                (CARD, card_id), (LOCATION, location_id)
+            )
+        ]
+        if stream:
+            topics.append(stream_topic(stream))
+            if tenant_id:
+                topics.append(stream_topic(stream, tenant_id))
+        return self.publish(message, topics)
+
+    def _publish_frame(self, frame: Frame, topics: List[str]) -> int:
+        """本进程发布：转发给其他worker并本地分发"""
+        self.backplane.forward(frame, topics)
+        return self._deliver(frame, topics)
+
+    def _deliver(self, message: Dict[str, Any] | Frame, topics: List[str]) -> int:
+        if isinstance(message, Frame):
+            if message.type == LIVE_STATE:
+                self.deltas.merge(topics, orjson.loads(message.text)["fields"])
+                return 0
+        elif message.get("type") == LIVE_STATE:
+            self.deltas.merge(topics, message["fields"])
+            return 0
+        if self._sequenced(message.type if isinstance(message, Frame) else message.get("type")):
+            frame = message if isinstance(message, Frame) else encode_frame(message)
+            message = self.replay.stamp(frame, topics)
+        recipients = self.index.audience(topics)
+        if not recipients:
+            return 0
+        frame = message if isinstance(message, Frame) else encode_frame(message)
+        count = 0
+        for connection in recipients:
+            if connection.send(frame):
+                count += 1
+        self._stats["delivered"] += count
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取总线统计"""
+        index = self.index.get_stats()
+        return {
+            **self._stats,
+            "total_connections": len(self.connections),
+            "binary_connections": sum(1 for c in self.connections if c.binary),
+            "authenticated_connections": sum(1 for c in self.connections if c.session is not None),
+            "tenants": self.index.count(TENANT),
+            "device_subscriptions": self.index.count(DEVICE),
+            "resident_subscriptions": self.index.count(RESIDENT),
+            "card_subscriptions": self.index.count(CARD),
+            "location_subscriptions": self.index.count(LOCATION),
+            "stream_subscriptions": self.index.count(STREAM),
+            "topics": index["topics"],
+            "queued_messages": sum(c.pending() for c in self.connections),
+            "dropped_messages": sum(c.stats["dropped"] for c in self.connections),
+            "backplane": self.backplane.get_stats(),
+            "live": self.deltas.get_stats(),
+            "replay": self.replay.get_stats(),
+            "heartbeat": self.heartbeats.get_stats(),
+        }
+
+
+# 全局单例
+_realtime_bus = None
+
+def get_realtime_bus() -> RealtimeBus:
+    """获取实时推送总线单例"""
+    global _realtime_bus
+    if _realtime_bus is None:
+        _realtime_bus = RealtimeBus()
+    return _realtime_bus
+
+
+# ==================== 生产者接口 ====================
+
+def _message(message_type: str, data: Any, **extra: Any) -> Dict[str, Any]:
+    return {"type": message_type, **extra, "data": data, "timestamp": datetime.now().isoformat()}
+
+
+def _id(value: Any) -> Optional[str]:
+    return str(value) if value else None
+
+
+def push_iot_data(record: Dict[str, Any]) -> int:
+    """
+    推送IoT实时数据
+
+    设备及其所属卡片的订阅者按节拍收到合并后的增量；住户、位置订阅者以及
+    iot_data 数据流收到逐帧数据（租户主题不再逐帧推送IoT数据）
+
+    Args:
+        record: IoT时序记录（原始二进制字段不推送）
+
+    Returns:
+        逐帧数据入队的连接数
+    """
+    bus = get_realtime_bus()
+    if not bus.has_audience():
+        return 0
+    tenant_id = _id(record.get("tenant_id"))
+    device_id = _id(record.get("device_id"))
+    fields = live_fields(record)
+    if fields and device_id:
+        cards = get_alert_routing_index().cards_of(tenant_id, device_id, record.get("bed_id")) if tenant_id else ()
+        bus.publish(
+            {"type": LIVE_STATE, "fields": fields},
+            [make_topic(DEVICE, device_id)] + [make_topic(CARD, card_id) for card_id in cards]
+        )
+    data = {k: v for k, v in record.items() if k not in _IOT_PRIVATE_FIELDS}
+    resident_id = _id(record.get("resident_id"))
+    location_id = _id(record.get("location_id"))
+    return bus.publish(_message("iot_data", data), (
+        make_topic(RESIDENT, resident_id) if resident_id else None,
+        make_topic(LOCATION, location_id) if location_id else None,
+        stream_topic(STREAM_IOT_DATA),
+        stream_topic(STREAM_IOT_DATA, tenant_id) if tenant_id else None,
+    ))
+
+
+def push_alert(alert: Dict[str, Any]) -> int:
+    """
+    推送告警（租户、设备、住户、位置订阅者以及 alerts 数据流）
+
+    Args:
+        alert: 告警记录
+
+    Returns:
+        入队的连接数
+    """
+    alert = jsonable_encoder(alert)
+    return get_realtime_bus().publish_event(
+        _message("alert", alert, alert_type=alert.get("alert_type"), alert_level=alert.get("alert_level")),
+        tenant_id=_id(alert.get("tenant_id")), device_id=_id(alert.get("device_id")),
+        resident_id=_id(alert.get("resident_id")), location_id=_id(alert.get("location_id")),
+        stream=STREAM_ALERTS
+    )
+
+
+def push_alert_update(alert: Dict[str, Any]) -> int:
+    """
+    推送告警事件更新（关联合并了新的来源事件；订阅范围与 push_alert 相同）
+
+    Args:
+        alert: 更新后的告警记录
+
+    Returns:
+        入队的连接数
+    """
+    alert = jsonable_encoder(alert)
+    return get_realtime_bus().publish_event(
+        _message("alert_update", alert, alert_type=alert.get("alert_type"), alert_level=alert.get("alert_level")),
+        tenant_id=_id(alert.get("tenant_id")), device_id=_id(alert.get("device_id")),
+        resident_id=_id(alert.get("resident_id")), location_id=_id(alert.get("location_id")),
+        stream=STREAM_ALERTS
+    )
+
+
+def push_device_status(device: Dict[str, Any]) -> int:
+    """
+    推送设备状态更新（租户、设备订阅者以及 devices 数据流）
+
+    Args:
+        device: 设备记录
+
+    Returns:
+        入队的连接数
+    """
+    device = jsonable_encoder(device)
+    return get_realtime_bus().publish_event(
+        _message("device_status", device),
+        tenant_id=_id(device.get("tenant_id")), device_id=_id(device.get("device_id")),
+        stream=STREAM_DEVICES
+    )
+
+
+def push_resident_update(resident: Dict[str, Any]) -> int:
+    """
+    推送住户状态更新（租户、住户订阅者以及 residents 数据流）
+
+    Args:
+        resident: 住户记录
+
+    Returns:
+        入队的连接数
+    """
+    resident = jsonable_encoder(resident)
+    return get_realtime_bus().publish_event(
+        _message("resident_update", resident),
+        tenant_id=_id(resident.get("tenant_id")), resident_id=_id(resident.get("resident_id")),
+        stream=STREAM_RESIDENTS
+    )
+
+
+def push_card_update(card: Dict[str, Any], action: str = "updated") -> int:
+    """
+    推送卡片变更（租户、卡片订阅者以及 cards 数据流）
+
+    Args:
+        card: 卡片记录（至少包含 tenant_id、card_id）
+        action: created / updated / deleted
+
+    Returns:
+        入队的连接数
+    """
+    card = jsonable_encoder(card)
+    return get_realtime_bus().publish_event(
+        _message("card_update", card, action=action),
+        tenant_id=_id(card.get("tenant_id")), card_id=_id(card.get("card_id")),
+        stream=STREAM_CARDS
+    )
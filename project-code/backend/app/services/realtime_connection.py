@@ -0,0 +1,261 @@
+"""
+实时推送连接 - 每个WebSocket连接一个有界发送队列和独立的写协程
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - WEB通道告警推送（告警不可丢失）
+- api/v1/realtime.py - 实时数据WebSocket（IoT数据、告警、心跳）
+
+设计说明：
+- 广播只做入队（send() 为同步方法，不等待网络），由连接自己的写协程按顺序发送；
+  一个网络很差的平板只会积压自己的队列，不会拖慢同租户其他连接
+- 溢出策略按消息类型配置（ws_overflow_policy，如 "iot_data:drop_oldest,heartbeat:drop_newest"）：
+  * drop_oldest  有损队列已满时丢弃最旧的一条有损消息（IoT数据帧：新数据比旧数据更有价值）
+  * drop_newest  有损队列已满时丢弃新消息
+  * keep         从不丢弃（告警、订阅确认等控制消息，未配置的类型默认keep），进入可靠队列
+- 写协程先发送可靠队列再发送有损队列，告警不会排在积压的IoT数据之后
+- 消息在广播前只编码一次（orjson）为 Frame，同一个文本缓冲区入队到所有接收连接，
+  写协程直接 send_text，不再对每个接收者重复序列化
+- 协商了二进制子协议（见 realtime_binary）的连接发送帧的 MessagePack 变体：
+  变体在第一个二进制连接发送时编码并缓存在帧上，其余二进制连接共享；
+  连接记录已发送过的字典编号，发送前补发缺少的定义
+- 慢消费者断开：
+  * 可靠队列超过 ws_send_queue_size 时立即断开（告警积压过多，客户端重连后重新拉取）
+  * 有损队列从开始丢弃消息起持续 ws_slow_consumer_sec 秒仍未清空时断开
+  断开使用关闭码1013（Try Again Later）
+- 接收循环每收到一条客户端消息调用 touch() 记录存活时间，供心跳调度检测失联（见 realtime_heartbeat）
+"""
+
+from typing import Dict, Any, Optional, Union, Set, Tuple
+from collections import deque
+import asyncio
+import time
+import orjson
+from fastapi import WebSocket
+from loguru import logger
+
+from app.config import settings
+from app.services.realtime_binary import SUBPROTOCOL_MSGPACK, encode_message, encode_definitions
+
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+KEEP = "keep"
+
+# 慢消费者断开使用的关闭码（RFC 6455: 1013 Try Again Later）
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def _parse_overflow_policy(value: str) -> Dict[str, str]:
+    """解析 "iot_data:drop_oldest,heartbeat:drop_newest" 格式的溢出策略配置"""
+    result = {}
+    for item in (value or "").split(","):
+        if ":" in item:
+            message_type, policy = item.split(":", 1)
+            policy = policy.strip().lower()
+            if policy in (DROP_OLDEST, DROP_NEWEST, KEEP):
+                result[message_type.strip()] = policy
+            else:
+                logger.warning(f"Unknown WebSocket overflow policy {policy!r} for {message_type}")
+    return result
+
+
+_OVERFLOW_POLICY = _parse_overflow_policy(settings.ws_overflow_policy)
+
+
+def overflow_policy(message_type: Optional[str]) -> str:
+    """消息类型对应的溢出策略（未配置时为keep）"""
+    return _OVERFLOW_POLICY.get(message_type or "", KEEP)
+
+
+class Frame:
+    """已编码的消息帧（所有接收者共享同一个缓冲区）"""
+
+    __slots__ = ("type", "text", "binary")
+
+    def __init__(self, message_type: Optional[str], text: str):
+        self.type = message_type
+        self.text = text
+        # 二进制变体 (消息, 驻留编号)，首次需要时编码
+        self.binary: Optional[Tuple[bytes, Tuple[int, ...]]] = None
+
+
+def encode_frame(message: Dict[str, Any]) -> Frame:
+    """
+    将消息编码为帧（只编码一次）
+
+    Args:
+        message: 消息（datetime/UUID由orjson原生编码，其他未知类型转为字符串）
+
+    Returns:
+        帧
+    """
+    text = orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return Frame(message.get("type"), text)
+
+
+class RealtimeConnection:
+    """单个WebSocket连接的发送队列与写协程"""
+
+    def __init__(self, websocket: WebSocket, tenant_id: Optional[str] = None,
+                 queue_size: Optional[int] = None, slow_consumer_sec: Optional[float] = None,
+                 subprotocol: Optional[str] = None):
+        """
+        初始化连接（写协程在 start() 中启动）
+
+        Args:
+            websocket: 已accept的WebSocket
+            tenant_id: 租户ID
+            queue_size: 队列容量（缺省取配置）
+            slow_consumer_sec: 持续丢弃多少秒后判定为慢消费者（缺省取配置）
+            subprotocol: 协商的子协议（SUBPROTOCOL_MSGPACK 为二进制，否则为JSON）
+        """
+        self.websocket = websocket
+        self.tenant_id = tenant_id
+        self.binary = subprotocol == SUBPROTOCOL_MSGPACK
+        # 已向该连接发送过定义的驻留编号
+        self._known: Set[int] = set()
+        self.queue_size = queue_size or settings.ws_send_queue_size
+        self.slow_consumer_sec = (settings.ws_slow_consumer_sec
+                                  if slow_consumer_sec is None else slow_consumer_sec)
+        self._reliable: deque = deque()
+        self._lossy: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        # 有损队列开始丢弃消息的时间（写协程清空队列后重置）
+        self._dropping_since: Optional[float] = None
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        self.close_code: Optional[int] = None
+        # 已认证连接的会话（见 realtime_session，未启用认证时为None）
+        self.session: Optional[Any] = None
+        # 最后一次收到客户端消息的时间（monotonic）
+        self.last_seen = time.monotonic()
+        self.stats = {"sent": 0, "dropped": 0}
+
+    def start(self) -> None:
+        """启动写协程（须在事件循环中调用）"""
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: Union[Frame, Dict[str, Any]]) -> bool:
+        """
+        消息入队（不等待网络）
+
+        Args:
+            message: 已编码的帧，或待编码的消息（type字段决定溢出策略）
+
+        Returns:
+            是否入队；被丢弃或连接已关闭时返回False
+        """
+        if self.closed:
+            return False
+        frame = message if isinstance(message, Frame) else encode_frame(message)
+        policy = overflow_policy(frame.type)
+        if policy == KEEP:
+            if len(self._reliable) >= self.queue_size:
+                self._abort("reliable queue full")
+                return False
+            self._reliable.append(frame)
+        else:
+            if len(self._lossy) >= self.queue_size:
+                self.stats["dropped"] += 1
+                now = time.monotonic()
+                if self._dropping_since is None:
+                    self._dropping_since = now
+                elif now - self._dropping_since > self.slow_consumer_sec:
+                    self._abort(f"dropping frames for over {self.slow_consumer_sec}s")
+                    return False
+                if policy == DROP_NEWEST:
+                    return False
+                self._lossy.popleft()
+            self._lossy.append(frame)
+        self._wakeup.set()
+        return True
+
+    def touch(self) -> None:
+        """记录收到客户端消息（pong、ping或任意命令）"""
+        self.last_seen = time.monotonic()
+
+    def pending(self) -> int:
+        """待发送的消息数"""
+        return len(self._reliable) + len(self._lossy)
+
+    async def close(self) -> None:
+        """停止写协程（连接断开时调用）"""
+        self.closed = True
+        self._reliable.clear()
+        self._lossy.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def terminate(self, reason: str, code: int) -> None:
+        """
+        停止入队并以指定关闭码关闭连接（接收循环随之收到断开并清理）
+
+        Args:
+            reason: 原因
+            code: 关闭码
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        self.close_code = code
+        self._reliable.clear()
+        self._lossy.clear()
+        # 写协程可能正阻塞在发送上，直接取消后关闭连接
+        if self._writer is not None:
+            self._writer.cancel()
+        try:
+            asyncio.get_running_loop().create_task(self._close_socket(code, reason))
+        except RuntimeError:
+            pass
+
+    def _abort(self, reason: str) -> None:
+        """判定为慢消费者：停止入队并以1013关闭连接"""
+        if self.closed:
+            return
+        logger.warning(f"Disconnecting slow WebSocket consumer (tenant={self.tenant_id}): {reason}")
+        self.terminate(reason, SLOW_CONSUMER_CLOSE_CODE)
+
+    async def _close_socket(self, code: int, reason: str) -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    async def _send_binary(self, frame: Frame) -> None:
+        """发送帧的二进制变体（先补发该连接缺少的字典定义）"""
+        if frame.binary is None:
+            frame.binary = encode_message(orjson.loads(frame.text))
+        data, refs = frame.binary
+        missing = [i for i in refs if i not in self._known]
+        if missing:
+            self._known.update(missing)
+            await self.websocket.send_bytes(encode_definitions(missing))
+        await self.websocket.send_bytes(data)
+
+    async def _write_loop(self) -> None:
+        """按顺序发送队列中的消息（可靠队列优先）"""
+        try:
+            while not self.closed:
+                if not self._reliable and not self._lossy:
+                    self._dropping_since = None
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                frame = self._reliable.popleft() if self._reliable else self._lossy.popleft()
+                if self.binary:
+                    await self._send_binary(frame)
+                else:
+                    await self.websocket.send_text(frame.text)
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending to WebSocket connection: {e}")
+            self.closed = True
+            self.close_reason = self.close_reason or "send failed"
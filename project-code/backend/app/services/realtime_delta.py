@@ -0,0 +1,259 @@
+"""
+实时卡片增量推送 - 按卡片/设备合并IoT状态，按节拍推送变化字段
+
+对齐源参考：
+- 18_cards.sql / card_devices - 卡片与设备绑定（看板每张卡片一个磁贴）
+- 12_iot_timeseries.sql - 心率、呼吸率、姿态、睡眠状态、目标（是否有人）
+- RFC 7396 JSON Merge Patch - 增量格式（字段值为null表示该字段已清除）
+
+设计说明：
+- 雷达每秒上报多帧，而卡片磁贴每秒最多刷新一次、只需要变化的字段；
+  订阅了 card / device 主题的连接不再收到逐帧的 iot_data，改为：
+  * 订阅时（以及客户端 resync 时）收到一次完整快照：
+    {"type": "live_snapshot", "states": {"card:ID": {...}}}
+  * 之后每个节拍（realtime_delta_tick_sec）最多收到一帧增量，合并该连接所有卡片的变化：
+    {"type": "live_delta", "patches": {"card:ID": {"heart_rate": 72}}}
+- 状态：主题 → 最新字段值（同一卡片多个设备的字段按到达顺序覆盖）；
+  (连接, 主题) → 已发送给该连接的字段值，增量 = 最新状态中与已发送状态不同的字段
+- 目标离开（presence变为false）时清除人员相关字段（心率、呼吸率、姿态、睡眠状态），
+  增量中这些字段为null（RFC 7396 清除），快照中不再出现；其他帧中为空的字段不覆盖已有值
+- 节拍之间只合并状态、标记脏主题，不编码、不入队；每个节拍只遍历脏主题的订阅者
+- 每个节拍、每个主题按连接的已发送状态分组：已发送状态相同的连接（通常是全部订阅者）
+  共享同一个增量，增量只计算和编码一次，连接的增量帧由已编码片段拼接而成
+  （整个病区看板的连接订阅相同卡片时，所有连接共享同一批片段）
+- live_snapshot / live_delta 使用可靠队列（默认keep）：增量丢失会使客户端状态错乱，
+  而合并后的消息量已经很小
+- 只在事件循环线程中使用，不加锁
+"""
+
+from typing import Dict, List, Any, Optional, Iterable, Set
+from datetime import datetime
+import asyncio
+import orjson
+from loguru import logger
+
+from app.config import settings
+from app.services.realtime_connection import Frame
+from app.services.realtime_topics import SubscriptionIndex, topic_kind, CARD, DEVICE
+
+# 按增量推送的主题类型
+LIVE_KINDS = (CARD, DEVICE)
+
+# 消息类型
+LIVE_STATE = "live_state"
+LIVE_SNAPSHOT = "live_snapshot"
+LIVE_DELTA = "live_delta"
+
+# 人员相关字段（无人时清除）
+PERSON_FIELDS = (
+    "heart_rate", "respiratory_rate",
+    "posture_snomed_code", "posture_display",
+    "sleep_state_snomed_code", "sleep_state_display",
+)
+
+# 卡片磁贴使用的IoT字段（为空表示本帧未上报，不覆盖已有值）
+LIVE_FIELDS = PERSON_FIELDS + ("event_type", "event_display")
+
+
+def live_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    提取IoT记录中卡片磁贴使用的字段
+
+    Args:
+        record: IoT时序记录
+
+    Returns:
+        非空字段，以及 presence（tracking_id 为空表示无人）；
+        无人时人员相关字段为None（表示清除）
+    """
+    fields = {name: record[name] for name in LIVE_FIELDS if record.get(name) is not None}
+    if "tracking_id" in record:
+        fields["presence"] = record["tracking_id"] is not None
+        if not fields["presence"]:
+            for name in PERSON_FIELDS:
+                fields[name] = None
+    return fields
+
+
+def is_live_topic(topic: str) -> bool:
+    """是否为按增量推送的主题"""
+    return topic_kind(topic) in LIVE_KINDS
+
+
+class LiveStateCoalescer:
+    """按 (连接, 卡片/设备) 合并状态并按节拍推送增量"""
+
+    def __init__(self, index: SubscriptionIndex, tick_sec: Optional[float] = None):
+        """
+        初始化合并器
+
+        Args:
+            index: 订阅索引（查找脏主题的订阅者）
+            tick_sec: 节拍间隔秒数（缺省取配置）
+        """
+        self.index = index
+        self.tick_sec = tick_sec or settings.realtime_delta_tick_sec
+        # 主题 -> 最新状态
+        self._state: Dict[str, Dict[str, Any]] = {}
+        # 本节拍有变化的主题
+        self._dirty: Set[str] = set()
+        # 连接 -> 主题 -> 已发送的状态
+        self._sent: Dict[Any, Dict[str, Dict[str, Any]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"merged": 0, "ticks": 0, "deltas": 0, "snapshots": 0, "fragments_encoded": 0}
+
+    def start(self) -> None:
+        """启动节拍协程（须在事件循环中调用，可重复调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止节拍协程"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def merge(self, topics: Iterable[str], fields: Dict[str, Any]) -> None:
+        """
+        合并一帧IoT状态（只更新内存状态，节拍时统一推送）
+
+        Args:
+            topics: 卡片/设备主题
+            fields: live_fields() 提取的字段（值为None表示清除该字段）
+        """
+        self._stats["merged"] += 1
+        for topic in topics:
+            state = self._state.get(topic)
+            if state is None:
+                state = self._state[topic] = {}
+            changed = False
+            for name, value in fields.items():
+                if value is None:
+                    if name in state:
+                        del state[name]
+                        changed = True
+                elif state.get(name) != value:
+                    state[name] = value
+                    changed = True
+            if changed:
+                self._dirty.add(topic)
+
+    def snapshot(self, connection: Any, topics: Iterable[str]) -> bool:
+        """
+        向连接发送完整快照（订阅或resync时调用）
+
+        Args:
+            connection: 连接
+            topics: 卡片/设备主题
+
+        Returns:
+            是否入队
+        """
+        sent = self._sent.setdefault(connection, {})
+        states = {}
+        for topic in topics:
+            state = dict(self._state.get(topic, {}))
+            sent[topic] = state
+            states[topic] = state
+        if not states:
+            return False
+        self._stats["snapshots"] += 1
+        return connection.send({
+            "type": LIVE_SNAPSHOT,
+            "states": states,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    def forget(self, connection: Any, topic: Optional[str] = None) -> None:
+        """
+        清除连接的已发送状态（取消订阅或断开时调用）
+
+        Args:
+            connection: 连接
+            topic: 主题（为None时清除该连接全部主题）
+        """
+        if topic is None:
+            self._sent.pop(connection, None)
+            return
+        sent = self._sent.get(connection)
+        if sent is not None:
+            sent.pop(topic, None)
+            if not sent:
+                del self._sent[connection]
+
+    def flush(self) -> int:
+        """
+        推送本节拍的增量
+
+        Returns:
+            发送增量帧的连接数
+        """
+        self._stats["ticks"] += 1
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+
+        fragments: Dict[Any, List[bytes]] = {}
+        for topic in dirty:
+            state = self._state.get(topic)
+            if state is None:
+                continue
+            key = orjson.dumps(topic)
+            # 本节拍该主题已计算的 (发送前的已发送状态, 发送后的状态, 片段)；片段为None表示无变化
+            variants: List[tuple] = []
+            for connection in self.index.subscribers(topic):
+                sent_states = self._sent.get(connection)
+                sent = sent_states.get(topic) if sent_states else None
+                if sent is None:
+                    continue
+                for before, after, fragment in variants:
+                    if sent == before:
+                        break
+                else:
+                    before = dict(sent)
+                    patch = {name: value for name, value in state.items() if sent.get(name) != value}
+                    for name in sent:
+                        if name not in state:
+                            # 已清除的字段（RFC 7396：null表示删除）
+                            patch[name] = None
+                    after = dict(state)
+                    fragment = None
+                    if patch:
+                        fragment = key + b":" + orjson.dumps(patch, option=orjson.OPT_SORT_KEYS)
+                        self._stats["fragments_encoded"] += 1
+                    variants.append((before, after, fragment))
+                if fragment is None:
+                    continue
+                # 发送后已发送状态与最新状态一致；已发送状态只整体替换、不原地修改，可在连接间共享
+                sent_states[topic] = after
+                fragments.setdefault(connection, []).append(fragment)
+
+        prefix = b'{"type":"' + LIVE_DELTA.encode() + b'","patches":{'
+        count = 0
+        for connection, parts in fragments.items():
+            frame = Frame(LIVE_DELTA, (prefix + b",".join(parts) + b"}}").decode())
+            if connection.send(frame):
+                count += 1
+        self._stats["deltas"] += count
+        return count
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_sec)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing realtime deltas: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并器统计"""
+        return {
+            **self._stats,
+            "tick_sec": self.tick_sec,
+            "live_topics": len(self._state),
+            "dirty_topics": len(self._dirty),
+        }
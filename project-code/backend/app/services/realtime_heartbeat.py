@@ -0,0 +1,151 @@
+"""
+实时推送心跳调度 - 所有连接共享的分槽心跳与失联检测
+
+对齐源参考：
+- api/v1/realtime.py / api/v1/websocket.py - 两个WebSocket端点
+- RFC 6455 §5.5.2 / §5.5.3 - Ping / Pong
+
+设计说明：
+- 整个进程只有一个心跳协程：心跳周期（ws_heartbeat_interval_sec）分为 ws_heartbeat_slots 个时间槽，
+  连接注册时放入当前连接数最少的槽，每个节拍（周期/槽数）只处理一个槽，
+  每个连接仍然每个周期收到一次心跳，但发送均匀分布在整个周期内，不再集中爆发
+- 每个节拍只编码一次心跳帧 {"type": "heartbeat", "timestamp": ...}，该槽内所有连接共享同一个Frame
+  （二进制连接的MessagePack变体同样只编码一次）；按 heartbeat 的溢出策略入队
+- 失联检测：客户端收到心跳后回复 pong（租户端点 {"action": "pong"}，数据流端点 {"type": "pong"}），
+  任何客户端消息（包括ping和订阅命令）都视为存活（RealtimeConnection.touch）；
+  连续 ws_heartbeat_max_missed 个周期没有收到任何消息的连接判定为失联，以1001关闭，
+  并立即由总线回收其队列、订阅和增量状态，不必等待TCP超时（ws_heartbeat_max_missed=0 时不检测）
+- 写协程已失败（closed）但接收循环尚未退出的连接也在其槽被处理时回收
+- 只在事件循环线程中使用，不加锁
+"""
+
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Set
+from datetime import datetime
+import asyncio
+import time
+from loguru import logger
+
+from app.config import settings
+from app.services.realtime_connection import RealtimeConnection, encode_frame
+
+# 失联连接的关闭码（RFC 6455: 1001 Going Away）
+HEARTBEAT_TIMEOUT_CLOSE_CODE = 1001
+
+
+class HeartbeatScheduler:
+    """分槽心跳调度与失联检测"""
+
+    def __init__(self, reclaim: Callable[[RealtimeConnection], Awaitable[None]],
+                 interval_sec: Optional[float] = None, slots: Optional[int] = None,
+                 max_missed: Optional[int] = None):
+        """
+        初始化心跳调度
+
+        Args:
+            reclaim: 回收连接的协程函数（RealtimeBus.disconnect）
+            interval_sec: 每个连接的心跳周期秒数（缺省取配置）
+            slots: 时间槽数（缺省取配置）
+            max_missed: 判定失联的连续无响应周期数（缺省取配置，0为不检测）
+        """
+        self.reclaim = reclaim
+        self.interval_sec = interval_sec or settings.ws_heartbeat_interval_sec
+        self.max_missed = settings.ws_heartbeat_max_missed if max_missed is None else max_missed
+        self._slots: List[Set[RealtimeConnection]] = [set() for _ in range(max(1, slots or settings.ws_heartbeat_slots))]
+        self._slot_of: Dict[RealtimeConnection, int] = {}
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"ticks": 0, "heartbeats": 0, "dead_peers": 0, "reclaimed_closed": 0}
+
+    @property
+    def tick_sec(self) -> float:
+        """节拍间隔秒数"""
+        return self.interval_sec / len(self._slots)
+
+    def start(self) -> None:
+        """启动心跳协程（须在事件循环中调用，可重复调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止心跳协程"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def register(self, connection: RealtimeConnection) -> None:
+        """连接放入当前连接数最少的槽"""
+        if connection in self._slot_of:
+            return
+        slot = min(range(len(self._slots)), key=lambda i: len(self._slots[i]))
+        self._slots[slot].add(connection)
+        self._slot_of[connection] = slot
+
+    def unregister(self, connection: RealtimeConnection) -> None:
+        """移出连接（断开时调用）"""
+        slot = self._slot_of.pop(connection, None)
+        if slot is not None:
+            self._slots[slot].discard(connection)
+
+    def tick(self) -> int:
+        """
+        处理下一个槽：向存活连接发送心跳，回收失联和已关闭的连接
+
+        Returns:
+            发送心跳的连接数
+        """
+        self._stats["ticks"] += 1
+        slot = self._slots[self._cursor]
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        if not slot:
+            return 0
+
+        now = time.monotonic()
+        timeout = self.interval_sec * self.max_missed
+        frame = None
+        sent = 0
+        for connection in list(slot):
+            if connection.closed:
+                self._stats["reclaimed_closed"] += 1
+                self._reclaim(connection)
+                continue
+            if timeout and now - connection.last_seen >= timeout:
+                logger.warning(
+                    f"Disconnecting dead WebSocket peer (tenant={connection.tenant_id}): "
+                    f"no response for {now - connection.last_seen:.0f}s"
+                )
+                self._stats["dead_peers"] += 1
+                connection.terminate("heartbeat timeout", HEARTBEAT_TIMEOUT_CLOSE_CODE)
+                self._reclaim(connection)
+                continue
+            if frame is None:
+                frame = encode_frame({"type": "heartbeat", "timestamp": datetime.now().isoformat()})
+            if connection.send(frame):
+                sent += 1
+        self._stats["heartbeats"] += sent
+        return sent
+
+    def _reclaim(self, connection: RealtimeConnection) -> None:
+        self.unregister(connection)
+        asyncio.get_running_loop().create_task(self.reclaim(connection))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_sec)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error sending realtime heartbeats: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取心跳调度统计"""
+        return {
+            **self._stats,
+            "interval_sec": self.interval_sec,
+            "slots": len(self._slots),
+            "max_missed": self.max_missed,
+            "registered": len(self._slot_of),
+        }
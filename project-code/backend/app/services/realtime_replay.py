@@ -0,0 +1,169 @@
+"""
+实时推送重放缓冲 - 按主题的序号与有界重放环
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - WEB通道告警推送（告警不可丢失）
+- api/v1/realtime.py / api/v1/websocket.py - 断线重连
+
+设计说明：
+- 每条可靠消息（溢出策略为keep：告警、设备/住户/卡片变更等）发布时，为其每个主题分配
+  单调递增的序号，写入消息头部后只编码一次：
+  {"seq": {"tenant:T": 42, "resident:R": 7}, "epoch": "...", "type": "alert", ...}
+  （在已编码的JSON文本前拼接，不重新序列化）；逐帧IoT数据等有损消息不编号
+- 每个主题保留最近 realtime_replay_size 条消息的重放环（同一帧在多个主题的环中共享）；
+  即使发布时没有任何连接也照常编号入环，断线期间的消息可在重连后补发
+- 重放环按最近活动（写入或补发）排序：没有订阅者且超过 realtime_replay_ttl_sec 无活动的主题
+  连同其序号一并淘汰（之后按该主题重连的客户端收到 resync_required）；
+  主题数超过 realtime_replay_max_topics 时提前淘汰最久无活动、且没有订阅者的主题；
+  淘汰检查在写入时顺带进行，每秒最多一次，只从最旧的一端检查
+- 重连时客户端带上某主题最后收到的序号（last_seq）和 epoch：
+  * 缺口仍在重放环内：按顺序补发 seq > last_seq 的消息
+  * 缺口超出重放环、epoch不一致（服务重启或连到了另一个worker）或序号超前：
+    返回None，由调用方发送 resync_required 标记，客户端只重新拉取该主题
+  同一帧可能经多个主题补发，客户端按各主题序号去重
+- 序号按进程分配：多worker时从背板收到的消息由本进程重新编号，
+  重连到不同worker时epoch不同，按需要重新同步处理
+- 只在事件循环线程中使用，不加锁
+"""
+
+from typing import Dict, List, Any, Optional, Iterable, Callable
+from collections import deque, OrderedDict
+from uuid import uuid4
+import time
+import orjson
+
+from app.config import settings
+from app.services.realtime_connection import Frame
+
+RESYNC_REQUIRED = "resync_required"
+
+# 淘汰检查的最小间隔（秒）
+_SWEEP_INTERVAL_SEC = 1.0
+
+
+class ReplayBuffer:
+    """按主题的序号分配与重放环"""
+
+    def __init__(self, size: Optional[int] = None,
+                 has_subscribers: Optional[Callable[[str], bool]] = None,
+                 ttl_sec: Optional[float] = None, max_topics: Optional[int] = None):
+        """
+        初始化重放缓冲
+
+        Args:
+            size: 每个主题保留的消息数（缺省取配置）
+            has_subscribers: 判断主题是否仍有订阅者（有订阅者的主题不淘汰；缺省视为没有）
+            ttl_sec: 无订阅者主题的保留时间（缺省取配置）
+            max_topics: 保留的主题数上限（缺省取配置）
+        """
+        self.size = size or settings.realtime_replay_size
+        self.ttl_sec = settings.realtime_replay_ttl_sec if ttl_sec is None else ttl_sec
+        self.max_topics = max_topics or settings.realtime_replay_max_topics
+        self.has_subscribers = has_subscribers or (lambda topic: False)
+        # 本进程的序号空间标识（重启或换worker后不同）
+        self.epoch = uuid4().hex[:12]
+        self._seq: Dict[str, int] = {}
+        # 主题 -> 重放环，按最近活动排序（最旧的在前）
+        self._rings: "OrderedDict[str, deque]" = OrderedDict()
+        self._active: Dict[str, float] = {}
+        self._next_sweep = 0.0
+        self._stats = {"stamped": 0, "replayed": 0, "resyncs": 0, "evicted": 0}
+
+    def stamp(self, frame: Frame, topics: Iterable[str]) -> Frame:
+        """
+        为消息分配各主题的序号并写入重放环
+
+        Args:
+            frame: 已编码的帧
+            topics: 主题
+
+        Returns:
+            带序号的新帧（只在原文本前拼接序号，不重新序列化）
+        """
+        seqs = {}
+        for topic in topics:
+            seqs[topic] = self._seq[topic] = self._seq.get(topic, 0) + 1
+        if not seqs:
+            return frame
+        head = '{"seq":' + orjson.dumps(seqs).decode() + ',"epoch":"' + self.epoch + '"'
+        body = frame.text[1:]
+        stamped = Frame(frame.type, head + ("," + body if body != "}" else body))
+        now = time.monotonic()
+        for topic, seq in seqs.items():
+            ring = self._rings.get(topic)
+            if ring is None:
+                ring = self._rings[topic] = deque(maxlen=self.size)
+            else:
+                self._rings.move_to_end(topic)
+            ring.append((seq, stamped))
+            self._active[topic] = now
+        self._stats["stamped"] += 1
+        if now >= self._next_sweep or len(self._rings) > self.max_topics:
+            self._evict(now)
+        return stamped
+
+    def current(self, topic: str) -> int:
+        """主题当前的序号（尚无消息时为0）"""
+        return self._seq.get(topic, 0)
+
+    def since(self, topic: str, last_seq: int, epoch: Optional[str] = None) -> Optional[List[Frame]]:
+        """
+        查找客户端缺失的消息
+
+        Args:
+            topic: 主题
+            last_seq: 客户端最后收到的序号
+            epoch: 客户端记录的epoch（为空时视为与当前一致）
+
+        Returns:
+            按序号排列的缺失消息；需要重新同步时返回None
+        """
+        current = self._seq.get(topic, 0)
+        if (epoch and epoch != self.epoch) or last_seq > current:
+            self._stats["resyncs"] += 1
+            return None
+        if last_seq == current:
+            return []
+        ring = self._rings.get(topic)
+        if not ring or ring[0][0] > last_seq + 1:
+            self._stats["resyncs"] += 1
+            return None
+        frames = [frame for seq, frame in ring if seq > last_seq]
+        self._rings.move_to_end(topic)
+        self._active[topic] = time.monotonic()
+        self._stats["replayed"] += len(frames)
+        return frames
+
+    def resync_marker(self, topic: str) -> Dict[str, Any]:
+        """重新同步标记（客户端应通过REST重新拉取该主题的数据，并从返回的seq继续）"""
+        return {"type": RESYNC_REQUIRED, "topic": topic, "epoch": self.epoch, "seq": self.current(topic)}
+
+    def _evict(self, now: float) -> None:
+        """淘汰超过保留时间或超出主题上限的无订阅者主题（从最久无活动的一端检查）"""
+        self._next_sweep = now + _SWEEP_INTERVAL_SEC
+        for _ in range(len(self._rings)):
+            topic = next(iter(self._rings))
+            expired = now - self._active[topic] >= self.ttl_sec
+            if not expired and len(self._rings) <= self.max_topics:
+                break
+            if self.has_subscribers(topic):
+                # 仍有订阅者：视为活跃，移到最新一端
+                self._rings.move_to_end(topic)
+                self._active[topic] = now
+                continue
+            del self._rings[topic]
+            del self._active[topic]
+            self._seq.pop(topic, None)
+            self._stats["evicted"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重放缓冲统计"""
+        return {
+            **self._stats,
+            "epoch": self.epoch,
+            "replay_size": self.size,
+            "ttl_sec": self.ttl_sec,
+            "max_topics": self.max_topics,
+            "topics": len(self._rings),
+            "buffered": sum(len(ring) for ring in self._rings.values()),
+        }
@@ -0,0 +1,102 @@
+"""
+实时推送会话 - 已认证用户的可见范围与订阅授权
+
+对齐源参考：
+- 24_Card_Permission_Design.md - 卡片权限（alert_scope: ALL / LOCATION / ASSIGNED_ONLY）
+- services/permission_service.py - can_view_card / get_visible_scope
+- api/v1/realtime.py - 租户WebSocket
+
+设计说明：
+- 连接时（JWT认证之后）通过 PermissionService.get_visible_scope 一次性计算用户可见的
+  卡片/住户/设备/位置集合，保存在会话中；消息分发路径上不做任何权限判断
+- 路由主题（连接时自动订阅）：
+  * Admin / alert_scope=ALL：租户主题（与未启用认证时相同，接收租户全部事件）
+  * 其他用户：可见住户的 resident 主题 + 可见Location卡片的 location 主题，
+    不再订阅租户主题，看不到其他住户的告警和变更
+- 客户端主动订阅（card/device/resident/location）只允许可见集合内的ID，
+  同时防止订阅其他租户的对象；数据流（stream）只对租户全部可见的用户开放，且只能是本租户
+- 护理分配、卡片、用户、住户等变更后由 RealtimeBus.refresh_sessions 重新计算，
+  按新旧路由主题的差集增减订阅，并取消已不可见的订阅
+"""
+
+from typing import Dict, Any, Optional, Set, FrozenSet
+
+from app.services.permission_service import get_permission_service
+from app.services.realtime_topics import make_topic, TENANT, DEVICE, RESIDENT, CARD, LOCATION, STREAM
+
+
+class RealtimeSession:
+    """已认证连接的用户与可见范围"""
+
+    __slots__ = ("user_id", "tenant_id", "all_access", "visible")
+
+    def __init__(self, user_id: str, tenant_id: str, scope: Dict[str, Any]):
+        """
+        初始化会话
+
+        Args:
+            user_id: 用户ID
+            tenant_id: 租户ID
+            scope: PermissionService.get_visible_scope 的结果
+        """
+        self.user_id = str(user_id)
+        self.tenant_id = str(tenant_id)
+        self.all_access = bool(scope.get("all"))
+        self.visible: Dict[str, FrozenSet[str]] = {
+            CARD: frozenset(scope.get("cards", ())),
+            RESIDENT: frozenset(scope.get("residents", ())),
+            DEVICE: frozenset(scope.get("devices", ())),
+            LOCATION: frozenset(scope.get("locations", ())),
+        }
+
+    def routing_topics(self) -> Set[str]:
+        """连接时自动订阅的主题"""
+        if self.all_access:
+            return {make_topic(TENANT, self.tenant_id)}
+        return (
+            {make_topic(RESIDENT, r) for r in self.visible[RESIDENT]}
+            | {make_topic(LOCATION, l) for l in self.visible[LOCATION]}
+        )
+
+    def can_subscribe(self, topic: str) -> bool:
+        """
+        是否允许订阅主题
+
+        Args:
+            topic: 主题
+
+        Returns:
+            主题对象在可见集合内时为True
+        """
+        kind, _, topic_id = topic.partition(":")
+        if kind == TENANT:
+            return self.all_access and topic_id == self.tenant_id
+        if kind == STREAM:
+            return self.all_access and topic_id.endswith(f"@{self.tenant_id}")
+        ids = self.visible.get(kind)
+        return ids is not None and topic_id in ids
+
+    def get_stats(self) -> Dict[str, Any]:
+        """会话统计"""
+        return {
+            "user_id": self.user_id,
+            "all_access": self.all_access,
+            **{f"visible_{kind}s": len(ids) for kind, ids in self.visible.items()},
+        }
+
+
+def build_session(user_id: str, tenant_id: str) -> Optional[RealtimeSession]:
+    """
+    计算用户的可见范围并创建会话
+
+    Args:
+        user_id: 用户ID（已通过JWT认证）
+        tenant_id: 连接的租户ID
+
+    Returns:
+        会话；用户不存在、已停用或不属于该租户时返回None
+    """
+    scope = get_permission_service().get_visible_scope(user_id, tenant_id)
+    if scope is None:
+        return None
+    return RealtimeSession(user_id, tenant_id, scope)
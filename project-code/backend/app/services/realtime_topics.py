@@ -0,0 +1,165 @@
+"""
+实时推送订阅索引 - 主题 ↔ 订阅者的双向索引
+
+对齐源参考：
+- api/v1/realtime.py - WebSocket订阅协议（action=subscribe, type, id）
+- 18_cards.sql - 卡片（ActiveBed/Location），04_locations.sql - 位置
+
+设计说明：
+- 订阅类型统一为主题："{类型}:{ID}"，类型为 tenant / device / resident / card / location，
+  以及数据流 stream（如 stream:alerts，见 realtime_bus）；连接建立时自动订阅所在租户的 tenant 主题
+- 双向索引：主题 → 订阅者集合、订阅者 → 主题集合
+  * subscribe / unsubscribe 为 O(1)
+  * remove（连接断开）只遍历该订阅者自己的主题，O(该连接的主题数)，
+    不再扫描进程内全部设备/住户订阅
+  * 某个主题的最后一个订阅者离开时删除该主题
+- 订阅者可以是任意可哈希对象（realtime中为 RealtimeConnection）
+- 只在事件循环线程中使用，不加锁
+"""
+
+from typing import Dict, Set, Any, Iterable, Optional, FrozenSet
+
+TENANT = "tenant"
+DEVICE = "device"
+RESIDENT = "resident"
+CARD = "card"
+LOCATION = "location"
+STREAM = "stream"
+
+TOPIC_KINDS = (TENANT, DEVICE, RESIDENT, CARD, LOCATION, STREAM)
+
+_EMPTY: FrozenSet[Any] = frozenset()
+
+
+def make_topic(kind: str, topic_id: Any) -> str:
+    """
+    生成主题名
+
+    Args:
+        kind: 主题类型（TOPIC_KINDS之一）
+        topic_id: 对象ID
+
+    Returns:
+        "{类型}:{ID}"
+    """
+    return f"{kind}:{topic_id}"
+
+
+def topic_kind(topic: str) -> str:
+    """主题类型"""
+    return topic.split(":", 1)[0]
+
+
+class SubscriptionIndex:
+    """主题 ↔ 订阅者双向索引"""
+
+    def __init__(self):
+        """初始化索引"""
+        self._subscribers: Dict[str, Set[Any]] = {}
+        self._topics: Dict[Any, Set[str]] = {}
+        # 主题类型 -> 主题数
+        self._kind_counts: Dict[str, int] = {}
+
+    def subscribe(self, subscriber: Any, topic: str) -> bool:
+        """
+        订阅主题
+
+        Args:
+            subscriber: 订阅者
+            topic: 主题
+
+        Returns:
+            是否为新订阅
+        """
+        subscribers = self._subscribers.get(topic)
+        if subscribers is None:
+            subscribers = self._subscribers[topic] = set()
+            kind = topic_kind(topic)
+            self._kind_counts[kind] = self._kind_counts.get(kind, 0) + 1
+        elif subscriber in subscribers:
+            return False
+        subscribers.add(subscriber)
+        self._topics.setdefault(subscriber, set()).add(topic)
+        return True
+
+    def unsubscribe(self, subscriber: Any, topic: str) -> bool:
+        """
+        取消订阅
+
+        Args:
+            subscriber: 订阅者
+            topic: 主题
+
+        Returns:
+            是否存在该订阅
+        """
+        topics = self._topics.get(subscriber)
+        if not topics or topic not in topics:
+            return False
+        topics.discard(topic)
+        if not topics:
+            del self._topics[subscriber]
+        self._drop(subscriber, topic)
+        return True
+
+    def remove(self, subscriber: Any) -> Set[str]:
+        """
+        移除订阅者的全部订阅（连接断开时调用）
+
+        Args:
+            subscriber: 订阅者
+
+        Returns:
+            该订阅者原有的主题
+        """
+        topics = self._topics.pop(subscriber, set())
+        for topic in topics:
+            self._drop(subscriber, topic)
+        return topics
+
+    def subscribers(self, topic: str) -> Set[Any]:
+        """主题的订阅者（只读，不要修改返回的集合）"""
+        return self._subscribers.get(topic, _EMPTY)
+
+    def audience(self, topics: Iterable[Optional[str]]) -> Set[Any]:
+        """
+        多个主题订阅者的并集（同一订阅者只出现一次）
+
+        Args:
+            topics: 主题（None会被忽略）
+
+        Returns:
+            订阅者集合（只有一个主题有订阅者时直接返回该主题的集合，只读）
+        """
+        groups = [self._subscribers[t] for t in topics if t and t in self._subscribers]
+        if not groups:
+            return _EMPTY
+        if len(groups) == 1:
+            return groups[0]
+        return set().union(*groups)
+
+    def topics_of(self, subscriber: Any) -> Set[str]:
+        """订阅者当前的主题（只读）"""
+        return self._topics.get(subscriber, _EMPTY)
+
+    def count(self, kind: str) -> int:
+        """某类型的主题数"""
+        return self._kind_counts.get(kind, 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计"""
+        return {
+            "subscribers": len(self._topics),
+            "topics": len(self._subscribers),
+            "topics_by_kind": {kind: self.count(kind) for kind in TOPIC_KINDS},
+        }
+
+    def _drop(self, subscriber: Any, topic: str) -> None:
+        subscribers = self._subscribers.get(topic)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[topic]
+            kind = topic_kind(topic)
+            self._kind_counts[kind] -= 1
@@ -0,0 +1,218 @@
+"""
+静默日历 - 预编译的周静默位图
+
+对齐源参考：
+- 25_Alarm_Notification_Flow.md - 静默规则（silence），L1紧急告警无论何时都必须送达
+- models/alert_policy.py - SilenceRule（silence_hours, silence_days）
+- 01_tenants.sql - tenants.metadata.timezone（租户时区）
+
+设计说明：
+- 静默规则编译为168位的周位图（本地时间，第 weekday*24 + hour 位，周一0点为第0位）：
+  * silence_days 为空表示每天，silence_hours 为空表示全天；两者都为空时不静默
+  * 规则未启用时位图为0
+- 租户级位图随策略编译（CompiledPolicy.silence_mask），策略变更时由 PolicyCache 重新编译；
+  用户级位图来自 users.alert_silence（SilenceRule格式，可带timezone），
+  用户或租户变更后调用 invalidate(tenant_id)，下一次判定时只重建该租户
+- 时区换算：每个时区只缓存一个UTC偏移（分钟），UTC小时变化时刷新（夏令时切换在整点发生），
+  判定时 本地周小时 = (UTC周分钟 + 偏移) // 60，随后做一次位测试
+- 时区缺省取租户 metadata.timezone，再缺省为UTC；无法识别的时区按UTC处理
+"""
+
+from typing import Dict, Any, Optional, Set, Tuple
+from uuid import UUID
+from datetime import datetime, timezone
+import threading
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from loguru import logger
+
+from app.models.alert_policy import SilenceRule
+from app.services.storage import StorageService
+
+_WEEK_MINUTES = 7 * 24 * 60
+# epoch 0（1970-01-01）为周四，换算为以周一为起点的周分钟
+_EPOCH_WEEK_OFFSET = 3 * 24 * 60
+
+_DAY_NAMES = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+def _day_index(day: Any) -> Optional[int]:
+    if isinstance(day, int):
+        return day % 7
+    name = str(day).strip().lower()
+    for i, full in enumerate(_DAY_NAMES):
+        if name == full or name == full[:3]:
+            return i
+    return None
+
+
+def compile_week_mask(rule: Optional[SilenceRule | Dict[str, Any]]) -> int:
+    """
+    将静默规则编译为168位周位图（本地时间）
+
+    Args:
+        rule: 静默规则（SilenceRule或同格式的字典）
+
+    Returns:
+        周位图，第 weekday*24 + hour 位为1表示该小时静默
+    """
+    if isinstance(rule, dict):
+        rule = SilenceRule(**{k: v for k, v in rule.items() if k in SilenceRule.model_fields})
+    if rule is None or not rule.enabled or not (rule.silence_hours or rule.silence_days):
+        return 0
+    days = {_day_index(d) for d in rule.silence_days} - {None} if rule.silence_days else set(range(7))
+    hours = {h % 24 for h in rule.silence_hours} if rule.silence_hours else set(range(24))
+    mask = 0
+    for day in days:
+        for hour in hours:
+            mask |= 1 << (day * 24 + hour)
+    return mask
+
+
+class SilenceCalendar:
+    """租户/用户静默判定"""
+
+    def __init__(self):
+        """初始化静默日历（按租户在首次判定时构建）"""
+        self.tenant_storage = StorageService("tenants")
+        self.user_storage = StorageService("users")
+        self._lock = threading.Lock()
+        # tenant_id -> 时区名
+        self._tenant_tz: Dict[str, str] = {}
+        # tenant_id -> {user_id: (位图, 时区名)}
+        self._users: Dict[str, Dict[str, Tuple[int, str]]] = {}
+        # 待重建的租户（None表示全部）
+        self._dirty: Set[Optional[str]] = {None}
+        # 时区 -> UTC偏移（分钟），每个UTC小时刷新
+        self._offsets: Dict[str, int] = {}
+        self._offsets_hour = -1
+
+    def tenant_silenced(self, tenant_id: UUID | str, mask: int,
+                        now: Optional[float] = None) -> bool:
+        """
+        判定租户当前是否处于静默时段
+
+        Args:
+            tenant_id: 租户ID
+            mask: 租户策略的周位图（CompiledPolicy.silence_mask）
+            now: 当前时间（epoch秒，默认取系统时间）
+
+        Returns:
+            是否静默
+        """
+        if not mask:
+            return False
+        tenant = str(tenant_id)
+        self._ensure(tenant)
+        return self._test(mask, self._tenant_tz.get(tenant, "UTC"), now)
+
+    def user_silenced(self, tenant_id: UUID | str, user_id: UUID | str,
+                      now: Optional[float] = None) -> bool:
+        """
+        判定用户当前是否处于个人静默时段
+
+        Args:
+            tenant_id: 租户ID
+            user_id: 用户ID
+            now: 当前时间（epoch秒，默认取系统时间）
+
+        Returns:
+            是否静默
+        """
+        tenant = str(tenant_id)
+        self._ensure(tenant)
+        entry = self._users.get(tenant, {}).get(str(user_id))
+        return entry is not None and self._test(entry[0], entry[1], now)
+
+    def invalidate(self, tenant_id: Optional[UUID | str] = None) -> None:
+        """
+        标记租户待重建（用户或租户时区变更后调用）
+
+        Args:
+            tenant_id: 租户ID（为None时全部租户待重建）
+        """
+        with self._lock:
+            self._dirty.add(str(tenant_id) if tenant_id else None)
+
+    def _test(self, mask: int, tz_name: str, now: Optional[float]) -> bool:
+        now = time.time() if now is None else now
+        minute = int(now // 60)
+        hour = minute // 60
+        if hour != self._offsets_hour:
+            self._offsets.clear()
+            self._offsets_hour = hour
+        offset = self._offsets.get(tz_name)
+        if offset is None:
+            offset = self._offsets[tz_name] = self._utc_offset(tz_name, now)
+        index = ((minute + _EPOCH_WEEK_OFFSET + offset) % _WEEK_MINUTES) // 60
+        return bool(mask >> index & 1)
+
+    @staticmethod
+    def _utc_offset(tz_name: str, now: float) -> int:
+        if tz_name == "UTC":
+            return 0
+        try:
+            zone = ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Unknown timezone {tz_name!r}, silence windows use UTC")
+            return 0
+        offset = datetime.fromtimestamp(now, timezone.utc).astimezone(zone).utcoffset()
+        return int(offset.total_seconds() // 60) if offset else 0
+
+    def _ensure(self, tenant: str) -> None:
+        if self._dirty and (None in self._dirty or tenant in self._dirty):
+            self._rebuild(tenant)
+
+    def _rebuild(self, tenant: str) -> None:
+        with self._lock:
+            if None in self._dirty:
+                self._dirty.clear()
+                tenants = None
+            elif tenant in self._dirty:
+                self._dirty.discard(tenant)
+                tenants = {tenant}
+            else:
+                return
+
+            def of_tenants(record: Dict[str, Any]) -> bool:
+                return tenants is None or str(record.get("tenant_id")) in tenants
+
+            tenant_tz = {}
+            for record in self.tenant_storage.find_all(of_tenants):
+                tz_name = (record.get("metadata") or {}).get("timezone")
+                if tz_name:
+                    tenant_tz[str(record["tenant_id"])] = tz_name
+
+            users: Dict[str, Dict[str, Tuple[int, str]]] = {}
+            for user in self.user_storage.find_all(of_tenants):
+                rule = user.get("alert_silence")
+                if not isinstance(rule, dict) or not user.get("user_id"):
+                    continue
+                key = str(user.get("tenant_id"))
+                mask = compile_week_mask(rule)
+                if mask:
+                    tz_name = rule.get("timezone") or tenant_tz.get(key, "UTC")
+                    users.setdefault(key, {})[str(user["user_id"])] = (mask, tz_name)
+
+            if tenants is None:
+                self._tenant_tz = tenant_tz
+                self._users = users
+            else:
+                for key in tenants:
+                    self._tenant_tz.pop(key, None)
+                    self._users.pop(key, None)
+                self._tenant_tz.update(tenant_tz)
+                self._users.update(users)
+
+        logger.info(f"Compiled silence calendars for {sum(len(u) for u in users.values())} users")
+
+
+# 全局单例
+_silence_calendar = None
+
+def get_silence_calendar() -> SilenceCalendar:
+    """获取静默日历单例"""
+    global _silence_calendar
+    if _silence_calendar is None:
+        _silence_calendar = SilenceCalendar()
+    return _silence_calendar
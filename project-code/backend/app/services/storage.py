@@ -293,7 +293,8 @@ def init_storage(data_dir: str = "app/data") -> None:
         "iot_monitor_alerts",
         "cloud_alert_policies",
         "cards", "card_devices",
-        "config_versions", "posture_mapping", "event_mapping"
+        "config_versions", "posture_mapping", "event_mapping",
+        "fall_clips"
     ]
     
     for collection in collections:
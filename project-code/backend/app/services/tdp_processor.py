@@ -3,7 +3,7 @@ TDP协议处理器
 处理TDPv2协议数据报文，解析Person Matrix和Object Matrix
 """
 
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Iterable
 from datetime import datetime
 from uuid import UUID
 
@@ -15,6 +15,9 @@ from app.models.tdp import (
 )
 from app.models.iot_data import IOTTimeseries, IOTTimeseriesCreate
 from app.services.snomed_service import get_snomed_service
+from app.services.zone_index import get_zone_service
+from app.services.binding_index import get_binding_index
+from app.services.fall_capture import get_fall_capture_service
 
 
 class TDPProcessor:
@@ -23,8 +26,12 @@ class TDPProcessor:
     def __init__(self):
         """初始化TDP处理器"""
         self.snomed_service = get_snomed_service()
+        self.zone_service = get_zone_service()
+        self.binding_index = get_binding_index()
+        self.fall_capture = get_fall_capture_service()
     
-    def process_event(self, event: TDPEvent, tenant_id: UUID, device_id: UUID) -> Dict[str, Any]:
+    def process_event(self, event: TDPEvent, tenant_id: UUID, device_id: UUID,
+                      track_ids: Optional[Iterable[Optional[int]]] = None) -> Dict[str, Any]:
         """
         处理TDP事件数据报文
         
@@ -32,6 +39,8 @@ class TDPProcessor:
             event: TDP事件
             tenant_id: 租户ID
             device_id: 设备ID
+            track_ids: 本帧的全部tracking_id（去重后person_matrices只剩部分目标时由调用方提供，
+                       缺省取person_matrices），不在其中的目标视为已消失
             
         Returns:
             处理结果
@@ -42,23 +51,53 @@ class TDPProcessor:
             "person_matrices": [],
             "object_matrices": [],
             "alerts": [],
-            "iot_records": []
+            "iot_records": [],
+            "zone_events": []
         }
         
         # 处理Person Matrix
         if event.person_matrices:
+            frame_time = event.header.timestamp.seconds + event.header.timestamp.nanos / 1e9
             for person_matrix in event.person_matrices:
                 processed = self._process_person_matrix(person_matrix, event, tenant_id, device_id)
                 result["person_matrices"].append(processed)
                 
                 # 生成IoT时序数据
                 iot_record = self._create_iot_timeseries(person_matrix, event, tenant_id, device_id)
+                
+                # 区域占用检测（ENTER_AREA/LEAVE_AREA）：未标记在记录上的事件单独成记录
+                zone_events = self._apply_zone(iot_record, person_matrix, tenant_id, device_id)
+                result["zone_events"].extend(zone_events)
+                for zone_event in zone_events:
+                    if (zone_event["event_type"] != iot_record.get("event_type")
+                            or zone_event["area_id"] != iot_record.get("area_id")):
+                        result["iot_records"].append(
+                            self._create_zone_event_record(zone_event, event, tenant_id, device_id)
+                        )
                 result["iot_records"].append(iot_record)
+                self.fall_capture.record(device_id, frame_time, iot_record)
                 
                 # 检查是否需要告警
                 alerts = self._check_alerts(person_matrix)
+                for alert in alerts:
+                    # 跌倒：截取前后轨迹片段并关联到告警
+                    if alert["type"] == "fall" and alert["posture"]["code"] == "1912002":
+                        self.fall_capture.start_clip(
+                            tenant_id, device_id, person_matrix.tracking_id, frame_time, alert
+                        )
                 result["alerts"].extend(alerts)
         
+        # 本帧中已消失的目标：离开所在区域
+        if track_ids is None and event.person_matrices is not None:
+            track_ids = [person.tracking_id for person in event.person_matrices]
+        if track_ids is not None:
+            for zone_event in self.zone_service.end_missing_tracks(device_id, track_ids):
+                zone_event = {**zone_event, "device_id": str(device_id)}
+                record = self._create_zone_event_record(zone_event, event, tenant_id, device_id)
+                zone_event["timestamp"] = record["timestamp"]
+                result["zone_events"].append(zone_event)
+                result["iot_records"].append(record)
+        
         # 处理Object Matrix
         if event.object_matrices:
             for object_matrix in event.object_matrices:
@@ -223,8 +262,80 @@ class TDPProcessor:
             "metadata": {}
         }
         
+        # 按设备绑定关系填充位置/房间/床位/住户
+        self.binding_index.stamp(record, device_id, timestamp)
+        
+        return record
+    
+    def _create_zone_event_record(self, zone_event: Dict[str, Any], event: TDPEvent,
+                                  tenant_id: UUID, device_id: UUID) -> Dict[str, Any]:
+        """
+        创建只携带区域事件的IoT时序数据记录（同一帧内的另一个区域事件，或已消失目标的离开事件）
+        
+        Args:
+            zone_event: 区域事件（event_type/event_display/area_id/tracking_id）
+            event: TDP事件
+            tenant_id: 租户ID
+            device_id: 设备ID
+            
+        Returns:
+            IoT时序数据字典
+        """
+        timestamp = datetime.fromtimestamp(event.header.timestamp.seconds)
+        record = {
+            "tenant_id": str(tenant_id),
+            "device_id": str(device_id),
+            "timestamp": timestamp.isoformat(),
+            "tdp_tag_category": None,
+            "tracking_id": zone_event.get("tracking_id"),
+            "event_type": zone_event["event_type"],
+            "event_display": zone_event["event_display"],
+            "area_id": zone_event["area_id"],
+            "location_id": getattr(event.header, 'location_id', None),
+            "room_id": getattr(event.header, 'room_id', None),
+            "raw_original": b"",
+            "raw_format": "binary",
+            "raw_compression": None,
+            "metadata": {}
+        }
+        self.binding_index.stamp(record, device_id, timestamp)
         return record
     
+    def _apply_zone(self, record: Dict[str, Any], person: PersonMatrix,
+                    tenant_id: UUID, device_id: UUID) -> List[Dict[str, Any]]:
+        """
+        将人员位置分类到布局区域，并在区域变化时标记事件
+        
+        Args:
+            record: IoT时序数据记录（原地更新area_id/event_type）
+            person: 人员矩阵
+            tenant_id: 租户ID
+            device_id: 设备ID
+            
+        Returns:
+            区域事件列表
+        """
+        area_id, events = self.zone_service.classify(
+            tenant_id, device_id, person.tracking_id, person.pos_x, person.pos_y
+        )
+        record["area_id"] = area_id
+        
+        if not events:
+            return []
+        
+        # 设备自身上报的事件优先；否则以最后一个区域事件（进入优先于离开）标记记录
+        if not record.get("event_type"):
+            last = events[-1]
+            record["event_type"] = last["event_type"]
+            record["event_display"] = last["event_display"]
+            record["area_id"] = last["area_id"]
+        
+        return [
+            {**zone_event, "device_id": str(device_id), "tracking_id": person.tracking_id,
+             "timestamp": record["timestamp"]}
+            for zone_event in events
+        ]
+    
     def _determine_tag_category(self, person: PersonMatrix, header: Any) -> Optional[str]:
         """
         确定TDP Tag Category
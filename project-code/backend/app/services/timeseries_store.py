@@ -0,0 +1,618 @@
+"""
+IoT时序数据存储 - 按天分区、乱序写入与后台有序合并
+
+对齐源参考：
+- 12_iot_timeseries.sql - iot_timeseries表（BIGSERIAL主键，按timestamp查询）
+- TDPv2-0916.md - 设备断线重连后会补传离线期间的数据
+
+设计说明：
+- 数据按时间戳所在日期分区：
+  iot_timeseries/{YYYY-MM-DD}.json       已封存的有序数据块
+  iot_timeseries/{YYYY-MM-DD}.wal.jsonl  尚未封存的追加日志（异常退出后启动时重放）
+- 时间戳统一规范为定长ISO字符串（微秒精度，带时区的和epoch秒都按UTC），字符串顺序即时间顺序
+- 顺序到达的数据直接追加到分区尾部；早于分区尾部的迟到数据按批排序后
+  作为一个有序增量段挂在分区上，不改动已有数据
+- 后台任务定期（或增量段超过 timeseries_delta_max_records 时立即）在内存中将分区主体与
+  所有增量段做k路归并；当天（UTC）的分区只追加写追加日志，不重写封存文件，
+  日期结束后（或已结束日期收到补传数据时）才写回封存文件并清空追加日志
+- 读取时在分区主体与各增量段上二分定位时间范围，再做惰性k路归并，
+  结果天然按时间有序，查询侧无需排序
+- 早于 高水位 - timeseries_late_window_hours 的数据视为过期补传，拒绝写入并计数；
+  高水位不超过 当前时间 + ingest_max_clock_skew_sec，时钟超前的设备不会使正常数据被拒绝
+- 分区主体按 device_id/resident_id/bed_id/location_id 惰性建立倒排（值 -> 有序子序列），
+  按这些字段等值查询（match）时直接读取倒排，不再扫描整个分区
+"""
+
+from typing import Dict, List, Any, Optional, Callable, Iterable, Iterator, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from uuid import UUID
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from operator import itemgetter
+import asyncio
+import base64
+import heapq
+import json
+import os
+import threading
+from loguru import logger
+
+from app.config import settings
+
+_timestamp_key = itemgetter("timestamp")
+
+# 支持倒排索引的等值查询字段
+INDEXED_FIELDS = ("device_id", "resident_id", "bed_id", "location_id")
+
+
+def normalize_timestamp(value: datetime | str | float) -> str:
+    """
+    规范化时间戳为定长ISO字符串（YYYY-MM-DDTHH:MM:SS.ffffff）
+
+    Args:
+        value: datetime、ISO字符串或epoch秒（按UTC）
+
+    Returns:
+        规范化后的时间戳字符串
+    """
+    if isinstance(value, str):
+        if len(value) == 26 and value[19] == "." and value[25].isdigit():
+            return value
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    elif isinstance(value, (int, float)):
+        value = datetime.fromtimestamp(value, tz=timezone.utc)
+    elif not isinstance(value, datetime):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="microseconds")
+
+
+def _to_json_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """转换为可直接写入JSON的记录（处理datetime, UUID, bytes）"""
+    result = {}
+    for key, value in record.items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, UUID):
+            value = str(value)
+        elif isinstance(value, bytes):
+            value = base64.b64encode(value).decode("utf-8")
+        result[key] = value
+    return result
+
+
+class _Partition:
+    """单日分区：有序主体 + 若干有序增量段"""
+
+    __slots__ = ("day", "records", "keys", "runs", "delta_size", "dirty", "postings")
+
+    def __init__(self, day: str, records: List[Dict[str, Any]]):
+        self.day = day
+        self.records = records
+        self.keys = [r["timestamp"] for r in records]
+        # 增量段：(时间戳列表, 记录列表)，各自有序
+        self.runs: List[Tuple[List[str], List[Dict[str, Any]]]] = []
+        self.delta_size = 0
+        # 是否有尚未写入封存文件的数据
+        self.dirty = False
+        # 倒排索引：字段 -> 值 -> (时间戳列表, 记录列表)，仅覆盖分区主体
+        self.postings: Dict[str, Dict[str, Tuple[List[str], List[Dict[str, Any]]]]] = {}
+
+    def sources(self, field: Optional[str] = None,
+                value: Optional[str] = None) -> List[Tuple[List[str], List[Dict[str, Any]]]]:
+        """分区主体（或其倒排子序列）与各增量段"""
+        if field is None:
+            return [(self.keys, self.records)] + self.runs
+        return [self.posting(field, value)] + self.runs
+
+    def posting(self, field: str, value: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        index = self.postings.get(field)
+        if index is None:
+            index = {}
+            for record in self.records:
+                key = record.get(field)
+                if key is not None:
+                    keys, records = index.setdefault(str(key), ([], []))
+                    keys.append(record["timestamp"])
+                    records.append(record)
+            self.postings[field] = index
+        return index.get(value, ([], []))
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """顺序追加到分区主体（同步维护已建立的倒排）"""
+        self.records.append(record)
+        self.keys.append(record["timestamp"])
+        for field, index in self.postings.items():
+            key = record.get(field)
+            if key is not None:
+                keys, records = index.setdefault(str(key), ([], []))
+                keys.append(record["timestamp"])
+                records.append(record)
+
+    def replace(self, records: List[Dict[str, Any]]) -> None:
+        """替换分区主体（新列表，不影响进行中的读取）"""
+        self.records = records
+        self.keys = [r["timestamp"] for r in records]
+        self.postings = {}
+
+
+class TimeseriesStore:
+    """IoT时序数据分区存储"""
+
+    def __init__(self,
+                 data_dir: Optional[str] = None,
+                 late_window_hours: Optional[int] = None,
+                 merge_interval_sec: Optional[int] = None,
+                 delta_max_records: Optional[int] = None,
+                 cached_partitions: Optional[int] = None):
+        """
+        初始化时序存储（参数缺省时取配置）
+
+        Args:
+            data_dir: 数据目录（分区文件位于其下的 iot_timeseries/）
+            late_window_hours: 迟到数据可接受窗口（小时）
+            merge_interval_sec: 后台合并间隔（秒）
+            delta_max_records: 单个分区增量段累计超过该数量时立即合并
+            cached_partitions: 内存中保留的已封存分区数量
+        """
+        base_dir = Path(data_dir or settings.data_dir)
+        self.root = base_dir / "iot_timeseries"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.late_window = timedelta(hours=late_window_hours or settings.timeseries_late_window_hours)
+        self.merge_interval = merge_interval_sec or settings.timeseries_merge_interval_sec
+        self.delta_max_records = delta_max_records or settings.timeseries_delta_max_records
+        self.cached_partitions = cached_partitions or settings.timeseries_cached_partitions
+
+        self._lock = threading.RLock()
+        self._partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+        self._days: List[str] = sorted({
+            path.name[:10] for path in self.root.iterdir()
+            if path.name.endswith(".json") or path.name.endswith(".wal.jsonl")
+        })
+        self._next_id = 1
+        self._high_water: Optional[str] = None
+        self._late_cutoff: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "appended": 0,
+            "late": 0,
+            "rejected": 0,
+            "merges": 0,
+        }
+
+        self._load_meta()
+        self._recover_wal()
+        self._import_legacy(base_dir / "iot_timeseries.json")
+
+    # ==================== 写入 ====================
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        写入IoT记录（允许乱序）
+
+        Args:
+            records: IoT时序数据记录
+
+        Returns:
+            写入统计（appended: 顺序追加数, late: 迟到数, rejected: 拒绝数）
+        """
+        result = {"appended": 0, "late": 0, "rejected": 0}
+        wal_lines: Dict[str, List[str]] = {}
+        late_batches: Dict[str, List[Dict[str, Any]]] = {}
+
+        with self._lock:
+            for raw in records:
+                try:
+                    timestamp = normalize_timestamp(raw.get("timestamp"))
+                except (ValueError, TypeError):
+                    result["rejected"] += 1
+                    continue
+                if self._late_cutoff is not None and timestamp < self._late_cutoff:
+                    result["rejected"] += 1
+                    continue
+
+                record = _to_json_record(raw)
+                record["timestamp"] = timestamp
+                if not isinstance(record.get("id"), int):
+                    record["id"] = self._next_id
+                self._next_id = max(self._next_id, record["id"] + 1)
+                record.setdefault("created_at", datetime.utcnow().isoformat())
+
+                day = timestamp[:10]
+                partition = self._get_partition(day, create=True)
+                if not partition.keys or timestamp >= partition.keys[-1]:
+                    partition.append(record)
+                    result["appended"] += 1
+                else:
+                    late_batches.setdefault(day, []).append(record)
+                    result["late"] += 1
+                partition.dirty = True
+                wal_lines.setdefault(day, []).append(json.dumps(record, ensure_ascii=False, default=str))
+                self._advance_high_water(timestamp)
+
+            for day, batch in late_batches.items():
+                batch.sort(key=_timestamp_key)
+                partition = self._partitions[day]
+                partition.runs.append(([r["timestamp"] for r in batch], batch))
+                partition.delta_size += len(batch)
+                if partition.delta_size >= self.delta_max_records:
+                    self._merge(partition)
+
+            for day, lines in wal_lines.items():
+                with open(self._wal_path(day), "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+
+            for key, count in result.items():
+                self._stats[key] += count
+
+        if result["rejected"]:
+            logger.warning(f"Rejected {result['rejected']} IoT records outside late-data window")
+        return result
+
+    def delete_before(self, cutoff: datetime | str,
+                      filter_func: Optional[Callable[[Dict[str, Any]], bool]] = None) -> int:
+        """
+        删除早于指定时间的记录
+
+        Args:
+            cutoff: 截止时间
+            filter_func: 仅删除满足条件的记录（None表示全部）
+
+        Returns:
+            删除的记录数
+        """
+        cutoff_key = normalize_timestamp(cutoff)
+        deleted = 0
+        with self._lock:
+            for day in list(self._days):
+                if day > cutoff_key[:10]:
+                    break
+                partition = self._get_partition(day)
+                if partition is None:
+                    continue
+                self._merge(partition)
+                keep = [
+                    r for r in partition.records
+                    if r["timestamp"] >= cutoff_key or (filter_func is not None and not filter_func(r))
+                ]
+                removed = len(partition.records) - len(keep)
+                if not removed:
+                    continue
+                deleted += removed
+                if keep:
+                    partition.replace(keep)
+                    self._seal(partition)
+                else:
+                    self._drop_partition(day)
+        return deleted
+
+    # ==================== 读取 ====================
+
+    def iter_range(self,
+                   start: Optional[datetime | str] = None,
+                   end: Optional[datetime | str] = None,
+                   filter_func: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                   reverse: bool = False,
+                   match: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        按时间顺序惰性遍历记录
+
+        Args:
+            start: 开始时间（含）
+            end: 结束时间（含）
+            filter_func: 过滤函数
+            reverse: True表示从新到旧
+            match: 等值条件（如 {"resident_id": ...}），值为None的条件忽略
+
+        Returns:
+            记录迭代器
+        """
+        low = normalize_timestamp(start) if start is not None else None
+        high = normalize_timestamp(end) if end is not None else None
+        conditions = [(field, str(value)) for field, value in (match or {}).items() if value is not None]
+        indexed = next(((f, v) for f, v in conditions if f in INDEXED_FIELDS), (None, None))
+
+        with self._lock:
+            days = self._days
+            first = bisect_left(days, low[:10]) if low else 0
+            last = bisect_right(days, high[:10]) if high else len(days)
+            days = days[first:last]
+        if reverse:
+            days = days[::-1]
+
+        for day in days:
+            with self._lock:
+                partition = self._get_partition(day)
+                if partition is None:
+                    continue
+                slices = []
+                for keys, records in partition.sources(*indexed):
+                    i = bisect_left(keys, low) if low else 0
+                    j = bisect_right(keys, high) if high else len(keys)
+                    if i < j:
+                        slices.append(self._slice(records, i, j, reverse))
+
+            for record in heapq.merge(*slices, key=_timestamp_key, reverse=reverse):
+                if conditions and not all(str(record.get(f)) == v for f, v in conditions):
+                    continue
+                if filter_func is None or filter_func(record):
+                    yield record
+
+    def query(self,
+              start: Optional[datetime | str] = None,
+              end: Optional[datetime | str] = None,
+              filter_func: Optional[Callable[[Dict[str, Any]], bool]] = None,
+              reverse: bool = False,
+              limit: Optional[int] = None,
+              match: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        查询时间范围内的记录（结果按时间有序）
+
+        Args:
+            start: 开始时间（含）
+            end: 结束时间（含）
+            filter_func: 过滤函数
+            reverse: True表示按时间倒序
+            limit: 最大返回数量
+            match: 等值条件，索引字段走倒排查找
+
+        Returns:
+            记录列表
+        """
+        return list(islice(self.iter_range(start, end, filter_func, reverse, match), limit))
+
+    def find_all(self, filter_func: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Dict[str, Any]]:
+        """查找所有满足条件的记录（兼容StorageService接口，结果按时间升序）"""
+        return self.query(filter_func=filter_func)
+
+    def latest(self, filter_func: Optional[Callable[[Dict[str, Any]], bool]] = None,
+               match: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """获取满足条件的最新一条记录"""
+        return next(self.iter_range(filter_func=filter_func, reverse=True, match=match), None)
+
+    # ==================== 后台合并 ====================
+
+    def flush(self, seal_all: bool = False) -> int:
+        """
+        合并所有分区的增量段；已结束日期的分区写回封存文件
+
+        Args:
+            seal_all: 同时封存当天的分区（默认当天分区的数据只保留在追加日志中）
+
+        Returns:
+            封存的分区数量
+        """
+        sealed = 0
+        today = datetime.utcnow().date().isoformat()
+        with self._lock:
+            dirty = [p for p in self._partitions.values() if p.dirty]
+            for partition in dirty:
+                if seal_all or partition.day < today:
+                    self._seal(partition)
+                    sealed += 1
+                else:
+                    self._merge(partition)
+            if dirty:
+                self._save_meta()
+            self._evict()
+        return sealed
+
+    async def run_merge_loop(self) -> None:
+        """后台合并循环"""
+        while True:
+            await asyncio.sleep(self.merge_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error merging timeseries partitions: {e}")
+
+    def start(self) -> None:
+        """启动后台合并任务（需在事件循环中调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_merge_loop())
+
+    async def stop(self) -> None:
+        """停止后台合并任务并封存剩余数据"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取存储统计"""
+        with self._lock:
+            return {
+                **self._stats,
+                "partitions": len(self._days),
+                "loaded_partitions": len(self._partitions),
+                "dirty_partitions": sum(1 for p in self._partitions.values() if p.dirty),
+                "delta_records": sum(p.delta_size for p in self._partitions.values()),
+                "high_water": self._high_water,
+                "late_window_hours": self.late_window.total_seconds() / 3600,
+            }
+
+    # ==================== 内部实现 ====================
+
+    @staticmethod
+    def _slice(records: List[Dict[str, Any]], i: int, j: int, reverse: bool) -> Iterator[Dict[str, Any]]:
+        indexes = range(j - 1, i - 1, -1) if reverse else range(i, j)
+        return (records[k] for k in indexes)
+
+    def _merge(self, partition: _Partition) -> None:
+        """k路归并分区主体与增量段（归并结果替换为新列表，不影响进行中的读取）"""
+        if not partition.runs:
+            return
+        merged = list(heapq.merge(
+            partition.records,
+            *(records for _, records in partition.runs),
+            key=_timestamp_key
+        ))
+        partition.replace(merged)
+        partition.runs = []
+        partition.delta_size = 0
+        self._stats["merges"] += 1
+
+    def _seal(self, partition: _Partition) -> None:
+        """合并并写回封存文件，清空追加日志"""
+        self._merge(partition)
+        path = self._sealed_path(partition.day)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(partition.records, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+        self._wal_path(partition.day).unlink(missing_ok=True)
+        partition.dirty = False
+
+    def _get_partition(self, day: str, create: bool = False) -> Optional[_Partition]:
+        partition = self._partitions.get(day)
+        if partition is not None:
+            self._partitions.move_to_end(day)
+            return partition
+
+        if self._sealed_path(day).exists() or self._wal_path(day).exists():
+            partition = self._load_partition(day)
+        elif create:
+            partition = _Partition(day, [])
+            insort(self._days, day)
+        else:
+            return None
+
+        self._partitions[day] = partition
+        self._evict(keep=day)
+        return partition
+
+    def _load_partition(self, day: str) -> _Partition:
+        records = []
+        sealed_path = self._sealed_path(day)
+        if sealed_path.exists():
+            with open(sealed_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        partition = _Partition(day, records)
+
+        wal_path = self._wal_path(day)
+        if wal_path.exists():
+            pending = []
+            with open(wal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        pending.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # 异常退出时最后一行可能不完整
+                        continue
+            if pending:
+                pending.sort(key=_timestamp_key)
+                partition.runs.append(([r["timestamp"] for r in pending], pending))
+                partition.delta_size = len(pending)
+                partition.dirty = True
+                for record in pending:
+                    if isinstance(record.get("id"), int):
+                        self._next_id = max(self._next_id, record["id"] + 1)
+                self._advance_high_water(pending[-1]["timestamp"])
+        return partition
+
+    def _drop_partition(self, day: str) -> None:
+        self._partitions.pop(day, None)
+        index = bisect_left(self._days, day)
+        if index < len(self._days) and self._days[index] == day:
+            del self._days[index]
+        self._sealed_path(day).unlink(missing_ok=True)
+        self._wal_path(day).unlink(missing_ok=True)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """淘汰最久未访问的已封存分区（未封存分区保留在内存中）"""
+        excess = len(self._partitions) - self.cached_partitions
+        if excess <= 0:
+            return
+        clean = [d for d, p in self._partitions.items() if not p.dirty and d != keep]
+        for day in clean[:excess]:
+            del self._partitions[day]
+
+    def _advance_high_water(self, timestamp: str) -> None:
+        if self._high_water is not None and timestamp <= self._high_water:
+            return
+        limit = (datetime.utcnow() + timedelta(seconds=settings.ingest_max_clock_skew_sec)).isoformat(
+            timespec="microseconds"
+        )
+        timestamp = min(timestamp, limit)
+        if self._high_water is None or timestamp > self._high_water:
+            self._high_water = timestamp
+            cutoff = datetime.fromisoformat(timestamp) - self.late_window
+            self._late_cutoff = cutoff.isoformat(timespec="microseconds")
+
+    def _sealed_path(self, day: str) -> Path:
+        return self.root / f"{day}.json"
+
+    def _wal_path(self, day: str) -> Path:
+        return self.root / f"{day}.wal.jsonl"
+
+    def _meta_path(self) -> Path:
+        return self.root / "_meta"
+
+    def _load_meta(self) -> None:
+        path = self._meta_path()
+        if not path.exists():
+            return
+        try:
+            meta = json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            return
+        self._next_id = meta.get("next_id", 1)
+        if meta.get("high_water"):
+            self._advance_high_water(meta["high_water"])
+
+    def _save_meta(self) -> None:
+        self._meta_path().write_text(
+            json.dumps({"next_id": self._next_id, "high_water": self._high_water}),
+            encoding="utf-8"
+        )
+
+    def _recover_wal(self) -> None:
+        """重放未封存的追加日志"""
+        days = [path.name[:10] for path in self.root.glob("*.wal.jsonl")]
+        for day in days:
+            self._get_partition(day)
+        if days:
+            logger.info(f"Recovered {len(days)} unsealed timeseries partitions")
+            self.flush()
+
+    def _import_legacy(self, legacy_path: Path) -> None:
+        """一次性导入旧版单文件存储（iot_timeseries.json）"""
+        if self._days or not legacy_path.exists():
+            return
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except json.JSONDecodeError:
+            return
+
+        valid = []
+        for record in records:
+            try:
+                record["timestamp"] = normalize_timestamp(record.get("timestamp"))
+                valid.append(record)
+            except (ValueError, TypeError):
+                continue
+        # 按时间顺序导入，避免被迟到窗口拒绝
+        valid.sort(key=_timestamp_key)
+        self.append(valid)
+        self.flush()
+        legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+        logger.info(f"Imported {len(valid)} legacy IoT records into time partitions")
+
+
+# 全局单例
+_timeseries_store = None
+
+def get_timeseries_store() -> TimeseriesStore:
+    """获取时序存储单例"""
+    global _timeseries_store
+    if _timeseries_store is None:
+        _timeseries_store = TimeseriesStore()
+    return _timeseries_store
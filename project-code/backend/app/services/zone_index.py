@@ -0,0 +1,357 @@
+"""
+区域占用检测服务 - 预编译的房间布局几何索引
+
+对齐源参考：
+- 12_iot_timeseries.sql - area_id字段（ENTER_AREA/LEAVE_AREA时有效）
+- 16_mapping_tables.sql - ENTER_AREA/LEAVE_AREA事件定义
+- 15_config_versions.sql - room_layout配置版本
+
+设计说明：
+- 每个设备的room_layout只在首次使用或配置变更时编译一次
+- 编译结果为均匀网格：每个网格单元预存可能命中的区域（按面积从小到大）
+- 人员坐标分类 = 一次整数除法定位网格 + 少量包围盒比较，与区域数量无关
+- 每个(设备, tracking_id)只保存上一次所在区域，用于生成进入/离开事件；
+  目标从设备的帧中消失时生成其所在区域的离开事件；布局失效时重置该设备的占用状态
+
+room_layout config_data 约定（坐标单位：厘米）：
+    {
+        "layout": {
+            "zones":   [{"area_id": 1, "name": "Bathroom", "x": 0, "y": 0, "width": 200, "height": 150}],
+            "objects": [{"type": "bed", "x": 100, "y": 100, "width": 200, "height": 100}]
+        },
+        "params": {"radar_position": {"x": 400, "y": 50}}
+    }
+- zones与objects都会编译为区域，area_id缺省时按出现顺序从1编号；
+  zones/objects 也可以直接放在 config_data 顶层（与 layout 内的合并）
+- 人员布局坐标 = radar_position + (pos_x, pos_y)；未配置radar_position时直接使用雷达坐标
+"""
+
+from typing import Dict, List, Any, Optional, Tuple, Iterable
+from uuid import UUID
+from datetime import datetime
+from loguru import logger
+
+from app.config import settings
+from app.services.storage import StorageService
+
+
+class Zone:
+    """布局中的单个矩形区域"""
+
+    __slots__ = ("area_id", "name", "zone_type", "x_min", "y_min", "x_max", "y_max")
+
+    def __init__(self, area_id: int, name: str, zone_type: str,
+                 x_min: int, y_min: int, x_max: int, y_max: int):
+        self.area_id = area_id
+        self.name = name
+        self.zone_type = zone_type
+        self.x_min = x_min
+        self.y_min = y_min
+        self.x_max = x_max
+        self.y_max = y_max
+
+    @property
+    def area(self) -> int:
+        return (self.x_max - self.x_min) * (self.y_max - self.y_min)
+
+    def contains(self, x: int, y: int) -> bool:
+        return self.x_min <= x < self.x_max and self.y_min <= y < self.y_max
+
+
+class ZoneIndex:
+    """编译后的区域网格索引（只读，可在多个设备间共享）"""
+
+    def __init__(self, zones: List[Zone], cell_size: int,
+                 origin: Tuple[int, int] = (0, 0)):
+        """
+        编译区域网格
+
+        Args:
+            zones: 区域列表
+            cell_size: 网格单元边长（厘米）
+            origin: 雷达在布局中的位置（厘米），用于雷达坐标→布局坐标转换
+        """
+        self.zones = zones
+        self.cell_size = max(1, int(cell_size))
+        self.origin_x, self.origin_y = origin
+        self.cells: List[Tuple[Zone, ...]] = []
+        self.cols = 0
+        self.rows = 0
+        self.x0 = 0
+        self.y0 = 0
+
+        if not zones:
+            return
+
+        self.x0 = min(z.x_min for z in zones)
+        self.y0 = min(z.y_min for z in zones)
+        x1 = max(z.x_max for z in zones)
+        y1 = max(z.y_max for z in zones)
+        self.cols = (x1 - self.x0 + self.cell_size - 1) // self.cell_size
+        self.rows = (y1 - self.y0 + self.cell_size - 1) // self.cell_size
+
+        # 小区域优先（如床位在房间区域内时优先命中床位）
+        ordered = sorted(zones, key=lambda z: z.area)
+        buckets: List[List[Zone]] = [[] for _ in range(self.cols * self.rows)]
+        for zone in ordered:
+            c0 = (zone.x_min - self.x0) // self.cell_size
+            c1 = (zone.x_max - 1 - self.x0) // self.cell_size
+            r0 = (zone.y_min - self.y0) // self.cell_size
+            r1 = (zone.y_max - 1 - self.y0) // self.cell_size
+            for row in range(r0, r1 + 1):
+                base = row * self.cols
+                for col in range(c0, c1 + 1):
+                    buckets[base + col].append(zone)
+
+        # 相同候选集合共享同一个元组，控制大量设备时的内存占用
+        interned: Dict[Tuple[int, ...], Tuple[Zone, ...]] = {}
+        for bucket in buckets:
+            key = tuple(id(z) for z in bucket)
+            if key not in interned:
+                interned[key] = tuple(bucket)
+            self.cells.append(interned[key])
+
+    def classify(self, pos_x: int, pos_y: int) -> Optional[int]:
+        """
+        将雷达坐标分类到区域
+
+        Args:
+            pos_x: 雷达坐标X（厘米）
+            pos_y: 雷达坐标Y（厘米）
+
+        Returns:
+            区域ID，不在任何区域内返回None
+        """
+        if not self.cells:
+            return None
+
+        x = pos_x + self.origin_x
+        y = pos_y + self.origin_y
+        col = (x - self.x0) // self.cell_size
+        row = (y - self.y0) // self.cell_size
+        if col < 0 or row < 0 or col >= self.cols or row >= self.rows:
+            return None
+
+        for zone in self.cells[row * self.cols + col]:
+            if zone.contains(x, y):
+                return zone.area_id
+        return None
+
+    @classmethod
+    def compile(cls, config_data: Dict[str, Any], cell_size: int) -> "ZoneIndex":
+        """
+        从room_layout配置编译区域索引
+
+        Args:
+            config_data: config_versions.config_data
+            cell_size: 网格单元边长（厘米）
+
+        Returns:
+            区域索引
+        """
+        layout = config_data.get("layout") or {}
+        params = config_data.get("params") or {}
+        radar_position = params.get("radar_position") or layout.get("radar_position") or {}
+        origin = (int(radar_position.get("x", 0)), int(radar_position.get("y", 0)))
+
+        shapes = [
+            shape
+            for source in (layout, config_data)
+            for key in ("zones", "objects")
+            for shape in (source.get(key) or [])
+        ]
+        zones: List[Zone] = []
+        for index, shape in enumerate(shapes, start=1):
+            try:
+                x = int(shape["x"])
+                y = int(shape["y"])
+                width = int(shape["width"])
+                height = int(shape["height"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if width <= 0 or height <= 0:
+                continue
+
+            area_id = shape.get("area_id", shape.get("id"))
+            if not isinstance(area_id, int):
+                area_id = index
+            zones.append(Zone(
+                area_id=area_id,
+                name=shape.get("name") or shape.get("type") or f"Area{area_id}",
+                zone_type=shape.get("type", "zone"),
+                x_min=x, y_min=y, x_max=x + width, y_max=y + height
+            ))
+
+        return cls(zones, cell_size, origin)
+
+
+# 空索引（设备无布局配置时的负缓存）
+_EMPTY_INDEX = ZoneIndex([], 1)
+
+
+class ZoneService:
+    """区域占用检测服务"""
+
+    def __init__(self, cell_size: Optional[int] = None):
+        """
+        初始化区域服务
+
+        Args:
+            cell_size: 网格单元边长（厘米），默认取配置 zone_grid_cell_cm
+        """
+        self.cell_size = cell_size or settings.zone_grid_cell_cm
+        self.device_storage = StorageService("devices")
+        self.config_storage = StorageService("config_versions")
+        # device_id -> (布局来源实体ID, 编译后的索引)
+        self._indexes: Dict[str, Tuple[Optional[str], ZoneIndex]] = {}
+        # device_id -> tracking_id -> 当前所在区域ID
+        self._occupancy: Dict[str, Dict[int, Optional[int]]] = {}
+
+    def get_index(self, tenant_id: UUID | str, device_id: UUID | str) -> ZoneIndex:
+        """获取设备的区域索引（首次访问时编译并缓存）"""
+        key = str(device_id)
+        cached = self._indexes.get(key)
+        if cached is not None:
+            return cached[1]
+
+        entity_id, config_data = self._load_layout(str(tenant_id), key)
+        index = ZoneIndex.compile(config_data, self.cell_size) if config_data else _EMPTY_INDEX
+        self._indexes[key] = (entity_id, index)
+        if index.zones:
+            logger.info(f"Compiled zone index for device {key}: {len(index.zones)} zones, "
+                        f"{index.cols}x{index.rows} cells")
+        return index
+
+    def classify(self, tenant_id: UUID | str, device_id: UUID | str,
+                 tracking_id: Optional[int], pos_x: int, pos_y: int) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+        """
+        分类人员位置并生成进入/离开区域事件
+
+        Args:
+            tenant_id: 租户ID
+            device_id: 设备ID
+            tracking_id: 目标跟踪ID
+            pos_x: 雷达坐标X（厘米）
+            pos_y: 雷达坐标Y（厘米）
+
+        Returns:
+            (当前区域ID, 事件列表)
+        """
+        index = self.get_index(tenant_id, device_id)
+        if not index.zones:
+            return None, []
+
+        area_id = index.classify(pos_x, pos_y)
+        tracks = self._occupancy.setdefault(str(device_id), {})
+        track_key = -1 if tracking_id is None else tracking_id
+        previous = tracks.get(track_key)
+        if track_key in tracks and area_id == previous:
+            return area_id, []
+
+        tracks[track_key] = area_id
+        events = []
+        if previous is not None:
+            events.append({"event_type": "LEAVE_AREA", "event_display": "离开区域", "area_id": previous})
+        if area_id is not None:
+            events.append({"event_type": "ENTER_AREA", "event_display": "进入区域", "area_id": area_id})
+        return area_id, events
+
+    def clear_track(self, device_id: UUID | str, tracking_id: Optional[int]) -> Optional[int]:
+        """清除目标的区域状态（目标丢失时调用），返回目标最后所在的区域ID"""
+        tracks = self._occupancy.get(str(device_id))
+        if not tracks:
+            return None
+        area_id = tracks.pop(-1 if tracking_id is None else tracking_id, None)
+        if not tracks:
+            del self._occupancy[str(device_id)]
+        return area_id
+
+    def end_missing_tracks(self, device_id: UUID | str,
+                           present: Iterable[Optional[int]]) -> List[Dict[str, Any]]:
+        """
+        清除本帧中已消失的目标，并为仍在区域内的目标生成离开事件
+
+        Args:
+            device_id: 设备ID
+            present: 本帧中的全部tracking_id
+
+        Returns:
+            离开事件列表（含tracking_id）
+        """
+        tracks = self._occupancy.get(str(device_id))
+        if not tracks:
+            return []
+        present_keys = {-1 if tid is None else tid for tid in present}
+        events = []
+        for track_key in [key for key in tracks if key not in present_keys]:
+            tracking_id = None if track_key == -1 else track_key
+            area_id = self.clear_track(device_id, tracking_id)
+            if area_id is not None:
+                events.append({"event_type": "LEAVE_AREA", "event_display": "离开区域",
+                               "area_id": area_id, "tracking_id": tracking_id})
+        return events
+
+    def invalidate(self, entity_id: Optional[UUID | str] = None) -> None:
+        """
+        使区域索引失效
+
+        Args:
+            entity_id: 设备ID或布局关联的实体ID（房间/设备）；为None时全部失效
+        """
+        if entity_id is None:
+            self._indexes.clear()
+            self._occupancy.clear()
+            return
+
+        key = str(entity_id)
+        stale = [
+            device_id for device_id, (source_id, _) in self._indexes.items()
+            if device_id == key or source_id == key
+        ]
+        for device_id in stale:
+            del self._indexes[device_id]
+            # 区域编号可能已变化，旧的占用状态不再有效
+            self._occupancy.pop(device_id, None)
+        self._occupancy.pop(key, None)
+
+    def _load_layout(self, tenant_id: str, device_id: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        查找设备当前生效的room_layout
+
+        优先使用直接关联设备的布局，其次是设备绑定房间的布局
+        """
+        device = self.device_storage.find_by_id("device_id", device_id) or {}
+        candidates = [device_id]
+        if device.get("bound_room_id"):
+            candidates.append(str(device["bound_room_id"]))
+
+        now = datetime.utcnow().isoformat()
+        versions = self.config_storage.find_all(
+            lambda cv: (
+                str(cv.get("tenant_id")) == tenant_id and
+                cv.get("config_type") == "room_layout" and
+                cv.get("is_active", True) and
+                str(cv.get("entity_id")) in candidates and
+                (cv.get("valid_from") or "") <= now and
+                (not cv.get("valid_to") or cv["valid_to"] > now)
+            )
+        )
+
+        for entity_id in candidates:
+            matches = [cv for cv in versions if str(cv.get("entity_id")) == entity_id]
+            if matches:
+                latest = max(matches, key=lambda cv: cv.get("valid_from", ""))
+                return entity_id, latest.get("config_data") or {}
+
+        return (candidates[-1] if len(candidates) > 1 else None), None
+
+
+# 全局单例
+_zone_service = None
+
+def get_zone_service() -> ZoneService:
+    """获取区域服务单例"""
+    global _zone_service
+    if _zone_service is None:
+        _zone_service = ZoneService()
+    return _zone_service
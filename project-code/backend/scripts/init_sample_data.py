@@ -25,6 +25,8 @@ from datetime import datetime, timedelta
 import hashlib
 import random
 from app.services.storage import StorageService
+from app.services.timeseries_store import get_timeseries_store
+from app.services.alert_store import get_alert_store
 
 
 def hash_contact(value: str) -> str:
@@ -561,7 +563,7 @@ async def init_iot_data():
     严格对齐: 12_iot_timeseries.sql
     """
     print("\n📊 Creating sample IoT timeseries data...")
-    storage = StorageService("iot_timeseries")
+    storage = get_timeseries_store()
     
     # 生成最近24小时的数据
     now = datetime.now()
@@ -636,7 +638,7 @@ async def init_iot_data():
             
             "created_at": timestamp.isoformat()
         }
-        storage.create(iot_data)
+        storage.append([iot_data])
         count += 1
     
     # 生成一条异常数据（高心率）
@@ -674,8 +676,9 @@ async def init_iot_data():
         "metadata": {"alert_triggered": True, "alert_type": "HEART_RATE_HIGH"},
         "created_at": timestamp_alert.isoformat()
     }
-    storage.create(alert_data)
+    storage.append([alert_data])
     count += 1
+    storage.flush()
     
     print(f"✅ Created {count} IoT timeseries records (对齐 12_iot_timeseries.sql)")
 
@@ -838,7 +841,7 @@ async def init_alerts():
     注意: 源SQL中没有alerts表定义，这是基于协议和Model的扩展实现
     """
     print("\n🚨 Creating sample alerts...")
-    storage = StorageService("alerts")
+    store = get_alert_store()
     
     # 严格对齐 models/alert.py 和源参考协议
     alerts = [
@@ -891,7 +894,7 @@ async def init_alerts():
     ]
     
     for alert in alerts:
-        storage.create(alert)
+        store.add(alert)
         print(f"✅ Created alert: {alert['alert_type']}")
 
 
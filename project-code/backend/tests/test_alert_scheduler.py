@@ -0,0 +1,51 @@
+"""
+告警计时调度测试 - 分层时间轮到期边界
+
+运行方式：
+    cd project-code/backend && python -m pytest tests/test_alert_scheduler.py
+"""
+
+import pytest
+
+from app.services.alert_scheduler import TimerWheel, Timer
+
+pytestmark = pytest.mark.unit
+
+
+def _ticks(timers):
+    return [timer.tick for timer in timers]
+
+
+@pytest.mark.parametrize("deadline", [64, 128, 4096, 4096 * 2])
+def test_cascade_boundary_deadline_fires_on_time(deadline):
+    """截止刻度恰好是下放边界的计时器在该刻度触发，而不是晚一个刻度"""
+    wheel = TimerWheel(1.0, now=0)
+    wheel.add(Timer(deadline, deadline, "a", "escalate"))
+    # 另一个更远的计时器，避免空时间轮直接跳到目标刻度
+    wheel.add(Timer(10 ** 6, 10 ** 6, "b", "renotify"))
+
+    assert _ticks(wheel.advance(deadline - 1)) == []
+    assert _ticks(wheel.advance(deadline)) == [deadline]
+    assert _ticks(wheel.advance(deadline + 1)) == []
+    assert wheel.count == 1
+
+
+def test_timers_fire_in_deadline_order_across_levels():
+    """不同层的计时器在一次追赶中按截止时间顺序返回"""
+    wheel = TimerWheel(1.0, now=0)
+    for tick in (4096, 5, 64, 70):
+        wheel.add(Timer(tick, tick, f"alert-{tick}", "escalate"))
+
+    assert _ticks(wheel.advance(5000)) == [5, 64, 70, 4096]
+    assert wheel.count == 0
+
+
+def test_removed_timer_does_not_fire():
+    """取消的计时器不会触发"""
+    wheel = TimerWheel(1.0, now=0)
+    timer = Timer(64, 64, "a", "escalate")
+    wheel.add(timer)
+    wheel.add(Timer(100, 100, "b", "escalate"))
+    wheel.remove(timer)
+
+    assert _ticks(wheel.advance(100)) == [100]
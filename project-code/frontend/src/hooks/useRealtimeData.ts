@@ -1,4 +1,5 @@
 import { useEffect, useRef, useState } from 'react'
+import { getAuthToken } from './usePermissions'
 
 interface WebSocketMessage {
   type: string
@@ -32,7 +33,8 @@ export default function useRealtimeData({
 
   const connect = () => {
     try {
-      const ws = new WebSocket(url)
+      const token = getAuthToken()
+      const ws = new WebSocket(token ? `${url}${url.includes('?') ? '&' : '?'}token=${encodeURIComponent(token)}` : url)
 
       ws.onopen = () => {
         console.log('WebSocket connected')
@@ -47,6 +49,11 @@ export default function useRealtimeData({
       ws.onmessage = (event) => {
         try {
           const message: WebSocketMessage = JSON.parse(event.data)
+          if (message.type === 'heartbeat') {
+            // 回复服务端心跳，否则连接会被判定为失联
+            ws.send(JSON.stringify({ type: 'pong' }))
+            return
+          }
           setLastMessage(message)
           
           if (onMessage) {
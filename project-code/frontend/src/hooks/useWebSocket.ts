@@ -40,6 +40,11 @@ export function useWebSocket(url: string, options: UseWebSocketOptions = {}) {
       ws.onmessage = (event) => {
         try {
           const message = JSON.parse(event.data)
+          if (message.type === 'heartbeat') {
+            // Answer server heartbeats, otherwise the server treats the socket as dead
+            ws.send(JSON.stringify({ action: 'pong' }))
+            return
+          }
           setLastMessage(message)
           onMessage?.(message)
         } catch (error) {
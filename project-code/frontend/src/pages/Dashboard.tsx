@@ -4,23 +4,29 @@ import { useState } from 'react'
 import { LineChart, Line, PieChart, Pie, Cell, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts'
 import api from '../services/api'
 import { useWebSocket } from '../hooks/useWebSocket'
+import { getAuthToken } from '../hooks/usePermissions'
 import { Alert, Device, Resident } from '../types'
 
 const TENANT_ID = '10000000-0000-0000-0000-000000000001'
-const WS_URL = `ws://localhost:8000/api/v1/realtime/ws/${TENANT_ID}`
+const WS_BASE_URL = `ws://localhost:8000/api/v1/realtime/ws/${TENANT_ID}`
 
 export default function Dashboard() {
   const queryClient = useQueryClient()
   const [realtimeAlerts, setRealtimeAlerts] = useState<Alert[]>([])
   
-  // WebSocket connection
-  const { isConnected } = useWebSocket(WS_URL, {
+  // WebSocket connection (browsers cannot set headers on WebSocket, so the JWT goes in the query)
+  const wsUrl = `${WS_BASE_URL}?token=${encodeURIComponent(getAuthToken() ?? '')}`
+  const { isConnected } = useWebSocket(wsUrl, {
     onMessage: (message) => {
       if (message.type === 'alert') {
         // Add new alert to the top
         setRealtimeAlerts(prev => [message.data, ...prev].slice(0, 10))
         // Invalidate alerts query to refresh
         queryClient.invalidateQueries({ queryKey: ['alerts'] })
+      } else if (message.type === 'alert_update') {
+        // Correlated event merged into an open incident: replace it in place
+        setRealtimeAlerts(prev => prev.map(alert => alert.alert_id === message.data.alert_id ? message.data : alert))
+        queryClient.invalidateQueries({ queryKey: ['alerts'] })
       } else if (message.type === 'device_status') {
         // Invalidate devices query to refresh
         queryClient.invalidateQueries({ queryKey: ['devices'] })